@@ -0,0 +1,214 @@
+import sys
+import os
+import csv
+import json
+import time
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+import main as core
+
+DEFAULT_MAX_STEPS = 1000000  # instructions per run before it is stopped
+ENGINES = core.ENGINES + ("vector",)  # vector: NumPy lockstep engine, needs numpy
+REPORT_FIELDS = ["program", "inputs", "halt_reason", "accumulator", "program_counter",
+                 "steps", "wall_time", "outputs", "error"]
+
+
+# --- Single run (executed in a worker process) ---
+def run_job(job):
+    """
+    Run one program against one input set. job is a tuple
+    (program_name, words, inputs_name, inputs, max_steps, timeout, engine,
+    max_reads, detect_loops, memory_size) and the result is a dict with the
+    REPORT_FIELDS keys.
+    """
+    program_name, words, inputs_name, inputs, max_steps, timeout, engine, max_reads, detect_loops, memory_size = job
+    machine = core.machine_class(engine)(memory_size=memory_size)
+    machine.load_program(words)
+    channel = core.InputChannel(inputs)
+    outputs = []
+    errors = []
+
+    def next_input():
+        """Valid integers only, like the console; None once the input set is used up."""
+        candidate = channel.get(timeout=0)
+        while candidate is not None and not candidate.lstrip("+-").isdigit():
+            candidate = channel.get(timeout=0)
+        return candidate
+
+    def message(text):
+        if text.startswith(("Runtime Error", "Parse Error", "Program stopped")):
+            errors.append(text)
+
+    start = time.perf_counter()
+    reason = machine.execute(next_input, outputs.append, message, max_steps=max_steps, timeout=timeout,
+                             max_reads=max_reads, detect_loops=detect_loops)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "program": program_name,
+        "inputs": inputs_name,
+        "halt_reason": reason,
+        "accumulator": machine.accumulator,
+        "program_counter": machine.program_counter,
+        "steps": machine.steps,
+        "wall_time": round(wall_time, 6),
+        "outputs": outputs,
+        "error": errors[0] if errors else "",
+    }
+
+
+def run_lanes_job(jobs):
+    """
+    Run jobs that share one program together on the NumPy lockstep engine
+    (vector.py). Results are the same as run_job's; wall_time is the run's
+    time divided by the number of jobs.
+    """
+    import vector  # NumPy is only needed for the vector engine
+    _, words, _, _, max_steps, timeout, _, max_reads, detect_loops, memory_size = jobs[0]
+    start = time.perf_counter()
+    lanes = vector.run_lanes(words, [job[3] for job in jobs], max_steps, timeout, max_reads, detect_loops,
+                             memory_size)
+    wall_time = round((time.perf_counter() - start) / len(jobs), 6)
+    results = []
+    for job, lane in zip(jobs, lanes):
+        result = dict(lane, program=job[0], inputs=job[2], wall_time=wall_time)
+        results.append({field: result[field] for field in REPORT_FIELDS})
+    return results
+
+
+# --- Batch API ---
+def _txt_files(path, suffixes=(".txt",)):
+    """A single file, or every file in a directory ending in one of suffixes (sorted by name)."""
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(suffixes)]
+    return [path]
+
+
+def load_input_set(path):
+    """Read an input file: one READ value per non-blank line."""
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def make_jobs(program_paths, input_paths, max_steps=DEFAULT_MAX_STEPS, timeout=None, engine="interpreter",
+              max_reads=None, detect_loops=True, memory_size=core.MEMORY_SIZE):
+    """
+    Build a job for every program x input set. Each program is loaded once
+    here: text programs become word lists, binary images are passed on as
+    their bytes and checked. Programs that fail validation are returned
+    separately as (position, result) pairs: a ready-made result dict and the
+    number of jobs before it. Returns (jobs, load_failures).
+    """
+    input_sets = [(os.path.basename(path), load_input_set(path)) for path in input_paths] or [("", [])]
+    jobs = []
+    failures = []
+    for path in program_paths:
+        name = os.path.basename(path)
+        try:
+            if path.lower().endswith(core.IMAGE_SUFFIX):
+                with open(path, "rb") as f:
+                    words, errors = f.read(), []
+                core.unpack_image(words, core.Memory(memory_size))
+            else:
+                loaded = core.load_source(path, memory_size)
+                words, errors = loaded.program, loaded.errors
+        except Exception as e:
+            errors = [str(e)]
+        if errors:
+            failures.append((len(jobs), dict({field: "" for field in REPORT_FIELDS}, program=name,
+                                              halt_reason="load_error", outputs=[], error=errors[0])))
+            continue
+        for inputs_name, inputs in input_sets:
+            jobs.append((name, words, inputs_name, inputs, max_steps, timeout, engine, max_reads, detect_loops,
+                         memory_size))
+    return jobs, failures
+
+
+def run_batch(program_paths, input_paths=(), workers=None, max_steps=DEFAULT_MAX_STEPS, timeout=None,
+              engine="interpreter", max_reads=None, detect_loops=True, memory_size=core.MEMORY_SIZE):
+    """
+    Run every program against every input file and return the list of
+    result dicts, in program/input order. Runs are spread over a
+    ProcessPoolExecutor with `workers` processes (default: one per core);
+    workers=1 runs everything in this process. engine is one of ENGINES;
+    with "vector" each worker runs all input sets of a program at once.
+    Each run is stopped by max_steps, timeout and max_reads, and when
+    detect_loops is on, as soon as it is caught in an endless loop. Every
+    machine has memory_size cells.
+    """
+    jobs, failures = make_jobs(program_paths, input_paths, max_steps, timeout, engine, max_reads, detect_loops,
+                               memory_size)
+    task, tasks = run_job, jobs
+    if engine == "vector":
+        task, tasks = run_lanes_job, [list(group) for _, group in groupby(jobs, key=lambda job: job[1])]
+
+    if workers == 1 or len(tasks) <= 1:
+        done = map(task, tasks)
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    results = []
+    for result in done:
+        if engine == "vector":
+            results.extend(result)
+        else:
+            results.append(result)
+    for position, failure in reversed(failures):  # back where the program was listed
+        results.insert(position, failure)
+    return results
+
+
+def write_report(results, path):
+    """Write results as JSON, or as CSV when path ends in .csv (outputs joined by spaces)."""
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(dict(result, outputs=" ".join(result["outputs"])))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main batch",
+                                     description="Run many BasicML programs against many input files.")
+    parser.add_argument("programs", help=f"program file or directory of .txt programs and {core.IMAGE_SUFFIX} images")
+    parser.add_argument("--inputs", help="input file or directory of input files (one READ value per line)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="instruction limit per run")
+    parser.add_argument("--timeout", type=float, default=None, help="wall time limit per run in seconds")
+    parser.add_argument("--max-reads", type=int, default=None, help="READ limit per run")
+    parser.add_argument("--no-loop-detection", dest="detect_loops", action="store_false",
+                        help="let endless loops run until a limit stops them")
+    parser.add_argument("--memory-size", type=core._memory_size, default=core.MEMORY_SIZE, metavar="CELLS",
+                        help=f"memory cells of every machine (default {core.MEMORY_SIZE})")
+    parser.add_argument("--engine", choices=ENGINES, default="interpreter",
+                        help="interpreter, blocks to run compiled basic blocks, or vector to run all "
+                             "input files of a program in lockstep with NumPy")
+    parser.add_argument("--report", default="report.json", help="report file (.json or .csv)")
+    args = parser.parse_args(argv)
+
+    program_paths = _txt_files(args.programs, (".txt", core.IMAGE_SUFFIX))
+    input_paths = _txt_files(args.inputs) if args.inputs else []
+    start = time.perf_counter()
+    try:
+        results = run_batch(program_paths, input_paths, args.workers, args.max_steps, args.timeout, args.engine,
+                            args.max_reads, args.detect_loops, args.memory_size)
+    except ImportError as e:
+        print(f"The {args.engine} engine is not available: {e}", file=sys.stderr)
+        return 2
+    write_report(results, args.report)
+
+    failed = sum(1 for result in results if result["halt_reason"] not in ("halted", "finished"))
+    print(f"{len(results)} run(s) in {time.perf_counter() - start:.2f}s, {failed} did not finish normally. "
+          f"Report: {args.report}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from collections import namedtuple
+from itertools import cycle
+import main as core
+
+DEFAULT_REPEAT = 5  # rounds per benchmark; the fastest one is reported
+DEFAULT_THRESHOLD = 0.10  # slowdown against the baseline that counts as a regression
+ENGINE_CHECKS = ("tight_loop", "self_modifying")  # programs where blocks must keep up with the interpreter
+
+# A benchmark: make(scale) prepares its data and returns a function that does
+# one round of work and returns how many units (calls, lines, instructions) it did.
+Benchmark = namedtuple("Benchmark", "name unit make")
+
+_WORDS_4 = [f"{sign}{opcode:02d}{operand:02d}" for sign in "+-" for opcode in (10, 11, 20, 21, 30, 31, 32, 33, 40, 43)
+            for operand in range(0, 100, 4)]
+_WORDS_6 = [f"{sign}0{opcode:02d}{operand:03d}" for sign in "+-" for opcode in (10, 11, 20, 21, 30, 31, 32, 33, 40, 43)
+            for operand in range(0, 250, 10)]
+
+# acc = mem[10] + 1 is stored back into 10 forever
+TIGHT_LOOP = ["+020010", "+030011", "+021010", "+040000"] + ["+000000"] * 7 + ["+000001"]
+# Rewrites the LOAD at 05 to walk cells 20-29 over and over
+SELF_MODIFYING = ["+2005", "+3010", "+2105", "+3111", "+4207", "+2020", "+4000", "+2012", "+2105", "+4000",
+                  "+0001", "+2030", "+2020"]
+# Echoes every input: READ 20, WRITE 20, BRANCH 00
+IO_HEAVY = ["+1020", "+1120", "+4000"]
+
+
+def _calls(function, arguments):
+    def work():
+        for argument in arguments:
+            function(argument)
+        return len(arguments)
+    return work
+
+
+def _parse(scale):
+    return _calls(core.parse, (_WORDS_4 + _WORDS_6) * scale)
+
+
+def _encode(scale):
+    return _calls(core.encode_word, (_WORDS_4 + _WORDS_6) * scale)
+
+
+def _convert(scale):
+    return _calls(core.convert_4_to_6_digit, _WORDS_4 * scale)
+
+
+def _overflow_value(scale):
+    return _calls(core._overflow_value, list(range(-99999, 99999, 97)) * scale)
+
+
+def _opcode(code):
+    def make(scale):
+        machine = core.Machine()
+        machine.memory[5] = "+0007"
+        handler = core.OPCODES[code].handler
+        count = 1000 * scale
+
+        def work():
+            machine.accumulator = "+1234"
+            for _ in range(count):
+                handler(machine, 5)
+            return count
+        return work
+    return make
+
+
+def _load(scale):
+    lines = (_WORDS_6 * 2)[:250]
+
+    def work():
+        for _ in range(scale):
+            core.load_source(lines)
+        return len(lines) * scale
+    return work
+
+
+def _load_image(scale):
+    memory = core.Memory()
+    for i, word in enumerate((_WORDS_6 * 2)[:250]):
+        memory[i] = word
+    image = core.pack_image(memory)
+
+    def work():
+        for _ in range(scale):
+            core.load_image(image, memory)
+        return 250 * scale
+    return work
+
+
+def _program(words, engine, inputs=False):
+    def make(scale):
+        machine = core.machine_class(engine)()
+        max_steps = 100000 * scale
+
+        def work():
+            machine.load_program(words)
+            read_input = cycle(["17", "-42", "+123456"]).__next__ if inputs else None
+            machine.execute(read_input, lambda word: None, lambda text: None, max_steps=max_steps)
+            return machine.steps
+        return work
+    return make
+
+
+BENCHMARKS = [
+    Benchmark("parse", "calls", _parse),
+    Benchmark("encode_word", "calls", _encode),
+    Benchmark("convert_4_to_6_digit", "calls", _convert),
+    Benchmark("_overflow_value", "calls", _overflow_value),
+    *(Benchmark(f"opcode.{core.OPCODES[code].mnemonic}", "calls", _opcode(code))
+      for code in (core.ADD, core.SUBTRACT, core.MULTIPLY, core.DIVIDE)),
+    Benchmark("load_source", "lines", _load),
+    Benchmark("load_image", "words", _load_image),
+    *(Benchmark(f"run.{program}.{engine}", "instructions", _program(words, engine, program == "io_heavy"))
+      for program, words in (("tight_loop", TIGHT_LOOP), ("self_modifying", SELF_MODIFYING), ("io_heavy", IO_HEAVY))
+      for engine in core.ENGINES),
+]
+
+
+def measure(benchmark, repeat=DEFAULT_REPEAT, scale=1):
+    """
+    Time the fastest of `repeat` rounds of benchmark and the peak memory
+    traced during one more round. Returns a result dict.
+    """
+    work = benchmark.make(scale)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = work()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        work()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"unit": benchmark.unit, "units": units, "seconds": round_to(best),
+            "rate": round_to(units / best if best else float("inf")), "peak_bytes": peak}
+
+
+def round_to(value, digits=6):
+    return float(f"{value:.{digits}g}")
+
+
+def run_benchmarks(names=None, repeat=DEFAULT_REPEAT, scale=1, report=None):
+    """
+    Run the benchmarks whose name starts with one of names (default: all)
+    and return {name: result}. report(name, result) is called after each.
+    """
+    results = {}
+    for benchmark in BENCHMARKS:
+        if names and not benchmark.name.startswith(tuple(names)):
+            continue
+        results[benchmark.name] = measure(benchmark, repeat, scale)
+        if report:
+            report(benchmark.name, results[benchmark.name])
+    return results
+
+
+def save_baseline(results, path):
+    """Write results as a baseline JSON file, with the Python version they were taken on."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare rates against a baseline. Returns one (name, baseline_rate, rate,
+    change, regressed) tuple per benchmark in both; change is the relative
+    speed difference and regressed is true when it is a slowdown of more
+    than threshold.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["rate"]
+        change = result["rate"] / old - 1 if old else 0.0
+        rows.append((name, old, result["rate"], change, change < -threshold))
+    return rows
+
+
+def slower_engines(results):
+    """Programs of ENGINE_CHECKS on which the blocks engine ran slower than the interpreter."""
+    slower = []
+    for program in ENGINE_CHECKS:
+        interpreter, blocks = results.get(f"run.{program}.interpreter"), results.get(f"run.{program}.blocks")
+        if interpreter and blocks and blocks["rate"] < interpreter["rate"]:
+            slower.append(program)
+    return slower
+
+
+def _print_result(name, result):
+    print(f"{name:<34} {result['rate']:>14,.0f} {result['unit'] + '/s':<15} "
+          f"{result['peak_bytes'] / 1024:>10,.1f} KiB peak")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main bench", description="Benchmark the UVSim interpreter core.")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name starts with one of these")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="rounds per benchmark (fastest is kept)")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the work done per round")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown that counts as a regression (default 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare)
+        except Exception as e:
+            print(f"Baseline Error: {str(e)}", file=sys.stderr)
+            return 2
+
+    results = run_benchmarks(args.names, max(1, args.repeat), max(1, args.scale), _print_result)
+    if args.save:
+        save_baseline(results, args.save)
+    slower = slower_engines(results)
+    for program in slower:
+        print(f"run.{program}.blocks is slower than run.{program}.interpreter", file=sys.stderr)
+
+    if baseline is not None:
+        regressions = 0
+        print()
+        for name, old, new, change, regressed in compare(results, baseline, args.threshold):
+            regressions += regressed
+            print(f"{name:<34} {old:>14,.0f} -> {new:>14,.0f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+        return 1 if regressions or slower else 0
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
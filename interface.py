@@ -1,11 +1,146 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog, colorchooser
 import threading
+import queue
 import time
+import math
 import json
 import os
 import main as core
 
+RUN_MODES = ("Turbo", "Throttled", "Step")
+TURBO_REFRESH_HZ = 20  # max UI refreshes per second while running in turbo mode
+FRAME_MS = 33  # how often the mainloop drains events from the run thread
+HEAT_COLORS = ("#fff3d6", "#ffdfa3", "#ffc06b", "#ff9a45", "#ff6f2e")  # profile heatmap, coolest first
+WHEEL_ROWS = 3  # rows the memory table scrolls per mouse wheel notch
+
+
+class MemoryTable(ttk.Treeview):
+    """
+    Memory table of one tab that only has rows for the addresses in view
+    (the last one may be cut off). Scrolling shows other addresses in the
+    same rows, so drawing, scrolling and reset cost the same for any memory
+    size. render(machine, address) gives a row's (values, tags).
+
+    The selection is kept by address, so it survives scrolling; row items
+    map to addresses with address() and item_for().
+    """
+
+    def __init__(self, master, machine, render, scrollbar, **options):
+        super().__init__(master, **options)
+        self.machine = machine
+        self.render = render
+        self.scrollbar = scrollbar
+        self.top = 0  # address shown in the first row
+        self.rows = []  # row item ids, top row first
+        self.selected = set()  # selected addresses, also those scrolled out of view
+        self._make_rows(int(options.get("height", 10)))
+
+        self.bind("<Configure>", self._fit)
+        self.bind("<<TreeviewSelect>>", self._remember_selection)
+        self.bind("<ButtonPress-1>", lambda e: self.selected.clear())  # a plain click starts a new selection
+        self.bind("<Control-Button-1>", lambda e: None)
+        self.bind("<Shift-Button-1>", lambda e: None)
+        self.bind("<MouseWheel>", lambda e: self._scroll_rows(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.bind("<Button-4>", lambda e: self._scroll_rows(-WHEEL_ROWS))
+        self.bind("<Button-5>", lambda e: self._scroll_rows(WHEEL_ROWS))
+        self.bind("<Up>", lambda e: self._move_focus(-1))
+        self.bind("<Down>", lambda e: self._move_focus(1))
+        self.bind("<Prior>", lambda e: self._move_focus(1 - len(self.rows)))
+        self.bind("<Next>", lambda e: self._move_focus(len(self.rows) - 1))
+
+    # --- Rows ---
+
+    def _make_rows(self, count):
+        """Keep count rows (at most one per address) and redraw them."""
+        count = max(0, min(count, len(self.machine.memory)))
+        while len(self.rows) < count:
+            self.rows.append(self.insert("", "end"))
+        while len(self.rows) > count:
+            self.delete(self.rows.pop())
+        self.scroll_to(self.top)
+
+    def _fit(self, event=None):
+        """Make as many rows as the table's height shows."""
+        rowheight = int(ttk.Style().lookup(self.cget("style") or "Treeview", "rowheight") or 20)
+        box = self.bbox(self.rows[0]) if self.rows else ""
+        heading = box[1] if box else rowheight
+        self._make_rows(max(1, -(-(self.winfo_height() - heading) // rowheight)))
+
+    def redraw(self, addresses=None):
+        """Redraw the rows of addresses (default: every row) that are in view."""
+        in_view = range(self.top, self.top + len(self.rows))
+        if addresses is None:
+            addresses = in_view
+        elif len(addresses) > len(self.rows):
+            addresses = [address for address in in_view if address in addresses]
+        for address in addresses:
+            if address in in_view:
+                values, tags = self.render(self.machine, address)
+                self.item(self.rows[address - self.top], values=values, tags=tags)
+
+    def address(self, item):
+        """Address shown in the row item."""
+        return self.top + self.rows.index(item)
+
+    def item_for(self, address):
+        """Row item showing address, or None when it is out of view."""
+        if self.top <= address < self.top + len(self.rows):
+            return self.rows[address - self.top]
+        return None
+
+    # --- Scrolling ---
+
+    def scroll_to(self, top):
+        """Show the addresses from top on, keeping the selection."""
+        self.top = max(0, min(top, len(self.machine.memory) - len(self.rows)))
+        self.redraw()
+        self.selection_set([self.rows[a - self.top] for a in self.selected if self.item_for(a)])
+        super().yview_moveto(0)  # rows never scroll themselves
+        self.scrollbar.set(*self.yview())
+
+    def show_address(self, address):
+        """Scroll address into view (to the middle) unless it is already in a fully shown row."""
+        if not self.top <= address < self.top + len(self.rows) - 1:
+            self.scroll_to(address - len(self.rows) // 2)
+
+    def yview(self, *args):
+        """Scrollbar protocol, scrolling through the addresses instead of the rows."""
+        size = max(1, len(self.machine.memory))
+        if not args:
+            return self.top / size, min(1.0, (self.top + len(self.rows)) / size)
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * size))
+        elif args[0] == "scroll":
+            self._scroll_rows(int(args[1]) * (max(1, len(self.rows) - 1) if args[2] == "pages" else 1))
+
+    def _scroll_rows(self, count):
+        self.scroll_to(self.top + count)
+        return "break"
+
+    def _move_focus(self, count):
+        """Move the focused (and selected) row by count addresses, scrolling as needed."""
+        if not self.rows:
+            return "break"
+        focus = self.focus()
+        address = self.address(focus) + count if focus else self.top
+        address = max(0, min(address, len(self.machine.memory) - 1))
+        self.show_address(address)
+        self.selected = {address}
+        self.selection_set(self.item_for(address))
+        self.focus(self.item_for(address))
+        return "break"
+
+    # --- Selection ---
+
+    def _remember_selection(self, event=None):
+        in_view = range(self.top, self.top + len(self.rows))
+        self.selected = {a for a in self.selected if a not in in_view} | {self.address(i) for i in self.selection()}
+
+    def selected_addresses(self):
+        """Selected addresses in ascending order, also those scrolled out of view."""
+        return sorted(self.selected)
+
 
 class Window:
     def __init__(self, name="UVsim", size="1280x720"):
@@ -40,6 +175,9 @@ class Window:
                                    command=self.open_theme_settings)
         self.theme_btn.grid(row=3, column=0, padx=20, pady=20)
 
+        self.stop_btn = tk.Button(self.root, text="Stop Program", width=12, height=4, command=self.stop_program)
+        self.stop_btn.grid(row=4, column=0, padx=20, pady=20)
+
         self.help_btn = tk.Button(
             self.root,
             text="?",
@@ -84,6 +222,11 @@ class Window:
                                      font=("Helvetica", 12), bd=1, relief="solid")
         self.system_output.pack(fill="both", expand=True)
         self.systemState = self.system_output
+        self.log = core.MessageLog(self.load_setting('log_lines', core.LOG_LINES))
+        self.log_flush_pending = False
+
+        self.log_file_btn = tk.Button(self.log_frame, text="Log to File...", command=self.toggle_log_file)
+        self.log_file_btn.place(in_=self.log_label, relx=1.0, rely=0.5, anchor="e")
 
         # --- System Variables ---
         self.vars_label = tk.Label(self.root, text="System Variables", bg=self.primary_color, font=("Helvetica", 18))
@@ -100,14 +243,48 @@ class Window:
         self.userInput = tk.Entry(self.root, width=45, font=("Courier New", 12), state="disabled")
         self.userInput.place(x=200, y=405)
         self.userInput.bind("<Return>", self._submit_input)
-        self.userQueue = []
+        self.input_channel = core.InputChannel()  # READ values typed in the console
+
+        # --- Run Mode ---
+        self.mode_label = tk.Label(self.root, text="Run Mode", bg=self.primary_color, font=("Helvetica", 18))
+        self.mode_label.place(x=200, y=445)
+        self.profile_var = tk.BooleanVar(value=False)  # count executions per address while running
+        self.profile_check = tk.Checkbutton(self.root, text="Profile", variable=self.profile_var,
+                                            bg=self.primary_color, font=("Helvetica", 12))
+        self.profile_check.place(x=330, y=450)
+
+        # Throttled: instructions per second, Step: instructions per click
+        self.run_mode = tk.StringVar(value="Throttled")
+        self.run_rate = tk.StringVar(value="100")
+        self.mode_menu = tk.OptionMenu(self.root, self.run_mode, *RUN_MODES)
+        self.mode_menu.config(width=9)
+        self.mode_menu.place(x=200, y=480)
+        self.rate_entry = tk.Spinbox(self.root, from_=1, to=1000000, width=8, textvariable=self.run_rate,
+                                     font=("Helvetica", 12))
+        self.rate_entry.place(x=330, y=485)
+        self.step_btn = tk.Button(self.root, text="Step", width=8, command=self.step_program)
+        self.step_btn.place(x=440, y=481)
+        self.step_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.paused = False  # a Step mode run waits for the Step button
+
+        # Reverse execution: undo steps of the current/last run
+        self.back_btn = tk.Button(self.root, text="Back", width=8, command=self.step_back)
+        self.back_btn.place(x=530, y=481)
+        self.goto_btn = tk.Button(self.root, text="Go to Step", width=8, command=self.goto_step)
+        self.goto_btn.place(x=610, y=481)
 
         # --- Memory ---
         self.memory_label = tk.Label(self.root, text="Memory", bg=self.primary_color, font=("Helvetica", 18))
         self.memory_label.place(x=725, y=25)
 
-        self.initial_memory = {}
+        self.initial_snapshot = None
+        self.memory_size = self.load_setting('memory_size', core.MEMORY_SIZE)  # cells of every tab's memory
+        self.machine = core.Machine(memory_size=self.memory_size)  # machine of the selected tab
+        self.memoryState = None  # MemoryTable of the selected tab
+        self.heat_peak = 0  # most runs of one address in the profile shown, measured before each redraw
         self.run_thread = None
+        self.run_machine = None  # machine of the current/last run
         self.file_valid = False
         self.current_filepath = None
 
@@ -124,9 +301,14 @@ class Window:
         self.notebook.place(x=700, y=60, width=550, height=620)
         self.close_tab_btn.place(x=1124, y=32)
 
+        # Events from the run thread, drained on the Tk thread every frame
+        self.events = queue.Queue()
+        self.root.after(FRAME_MS, self._drain_events)
+
         # Apply initial theme
         self.apply_theme()
         self.root.mainloop()
+        self.log.close()
 
     # --- Color Theme Management ---
 
@@ -142,16 +324,31 @@ class Window:
         return '#4C721D', '#FFFFFF'  # UVU defaults
 
     def save_colors(self):
-        """Save current colors to config.json."""
+        """Save current colors to config.json, keeping its other settings."""
+        config = {}
+        if os.path.exists('config.json'):
+            try:
+                with open('config.json', 'r') as f:
+                    config = json.load(f)
+            except:
+                pass
+        config.update(primary_color=self.primary_color, secondary_color=self.secondary_color)
         try:
             with open('config.json', 'w') as f:
-                json.dump({
-                    'primary_color': self.primary_color,
-                    'secondary_color': self.secondary_color
-                }, f, indent=2)
+                json.dump(config, f, indent=2)
         except:
             pass
 
+    def load_setting(self, name, default):
+        """Whole-number setting from config.json (log_lines, memory_size) or default."""
+        if os.path.exists('config.json'):
+            try:
+                with open('config.json', 'r') as f:
+                    return max(1, int(json.load(f).get(name, default)))
+            except:
+                pass
+        return default
+
     def get_text_color(self, bg_color):
         """Code obtained using Claude AI. Return 'black' or 'white' based on background brightness."""
         hex_color = bg_color.lstrip('#')
@@ -174,10 +371,14 @@ class Window:
         self.log_label.config(bg=self.primary_color, fg=primary_text)
         self.vars_label.config(bg=self.primary_color, fg=primary_text)
         self.console_label.config(bg=self.primary_color, fg=primary_text)
+        self.mode_label.config(bg=self.primary_color, fg=primary_text)
+        self.profile_check.config(bg=self.primary_color, fg=primary_text, activebackground=self.primary_color,
+                                  selectcolor=self.primary_color)
         self.memory_label.config(bg=self.primary_color, fg=primary_text)
 
         # Buttons
-        for btn in [self.load_btn, self.run_btn, self.reset_btn, self.theme_btn, self.help_btn]: btn.config(
+        for btn in [self.load_btn, self.run_btn, self.reset_btn, self.theme_btn, self.stop_btn, self.help_btn,
+                    self.step_btn, self.back_btn, self.goto_btn, self.mode_menu, self.log_file_btn]: btn.config(
             bg=self.secondary_color, fg=secondary_text)
 
     def open_theme_settings(self):
@@ -282,9 +483,24 @@ class Window:
 
 4. Monitor Execution:
    - System Variables shows Accumulator and Program Counter
-   - Memory table shows all 250 memory locations
-
-5. Other Options:
+   - Memory table shows all memory locations (250 unless memory_size
+     is set in config.json)
+
+5. Run Mode:
+   - Turbo: run at full speed, display refreshed a few times a second
+   - Throttled: run the number of instructions per second set next to it
+   - Step: run that many instructions per click of the Step button
+   - Back: undo that many instructions (Step mode pause or after a run)
+   - Go to Step: return to an earlier step number of the run
+
+6. Breakpoints (right-click a memory row, or double-click its Location):
+   - Toggle Breakpoint: pause before that instruction runs
+   - Toggle Watchpoint: pause after an instruction reads or writes the cell
+   - Break If Accumulator: pause when the accumulator comes to meet a
+     condition such as < 0
+   - Click Step to continue; changes apply from the next Run or continue
+
+7. Other Options:
    - Reset Program: Clear memory and restart
    - Theme Settings: Customize colors
 
@@ -293,7 +509,8 @@ BasicML Instruction Formats:
 4-digit format: +XXYY (opcode XX, address 00-99)
 Example: +1007 = READ into location 07
 
-6-digit format: +0XXYYY (opcode 0XX, address 000-249)
+6-digit format: +0XXYYY (opcode 0XX, address 000-249, or up to 999
+with a larger memory_size)
 Example: +010025 = READ into location 025
 """
         text1.insert(1.0, instructions)
@@ -347,88 +564,33 @@ Invalid instructions shown with red background
         try:
             filepath = filedialog.askopenfilename(
                 title="Select a Program File",
-                filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+                filetypes=[("Text Files", "*.txt"), ("Program Images", "*" + core.IMAGE_SUFFIX), ("All Files", "*.*")]
             )
 
             if not filepath:
                 return  # User cancelled
 
+            # Each tab runs on its own machine; images load straight into its memory
+            machine = core.Machine(memory_size=self.memory_size)
             try:
-                with open(filepath, "r") as f:
-                    raw_lines = f.readlines()
-            except Exception as e:
+                if filepath.lower().endswith(core.IMAGE_SUFFIX):
+                    machine.load_image(filepath)
+                    errors = []
+                    empty = machine.memory.used_length() == 0
+                else:
+                    loaded = core.load_source(filepath, self.memory_size)
+                    machine.load_program(loaded.program)
+                    errors = loaded.errors
+                    empty = len(loaded.program) == 0
+            except (OSError, UnicodeError) as e:
                 messagebox.showerror("Load File Error", f"Unable to read file:\n{str(e)}")
                 return
-
-            parsed_program = []
-            errors = []
-            detected_format = None
-
-            # Detect format
-            for raw in raw_lines:
-                line = raw.strip()
-                if not line or line.startswith("#"):
-                    continue
-
-                if "#" in line:
-                    line = line.split("#")[0].strip()
-
-                if not line:
-                    continue
-
-                test = line if line[0] in "+-" else "+" + line
-
-                if len(test) == 5:
-                    detected_format = "4d"
-                    break
-                elif len(test) == 7:
-                    detected_format = "6d"
-                    break
-
-            if detected_format is None:
-                messagebox.showerror(
-                    "Invalid File Format",
-                    "No valid instructions found.\nExpected +XXXX or +XXXXXX."
-                )
+            except ValueError as e:
+                messagebox.showerror("Invalid File Format", str(e))
                 return
 
-            convert_to_6 = detected_format == "4d"
-            mem_index = 0
-
-            for i, raw in enumerate(raw_lines):
-                if mem_index >= 250:
-                    errors.append(f"Line {i + 1}: Exceeds 250 memory slots.")
-                    break
-
-                line = raw.strip()
-                if not line or line.startswith("#"):
-                    continue
-
-                if "#" in line:
-                    line = line.split("#")[0].strip()
-                if not line:
-                    continue
-
-                # Convert 4-digit → 6-digit
-                if convert_to_6:
-                    try:
-                        line = core.convert_4_to_6_digit(line)
-                    except Exception as e:
-                        errors.append(f"Line {i + 1}: {str(e)}")
-                        line = "+000000"  # Fail-safe
-
-                # Validate instruction format using core.parse
-                try:
-                    core.parse(line)
-                except Exception as e:
-                    errors.append(f"Line {i + 1}: {str(e)}")
-                    line = "+000000" 
-
-                parsed_program.append(line)
-                mem_index += 1
-
             # If nothing valid, abort
-            if len(parsed_program) == 0:
+            if empty:
                 messagebox.showerror(
                     "Invalid File",
                     "The file does not contain any valid instructions."
@@ -440,15 +602,19 @@ Invalid instructions shown with red background
             self.notebook.add(tab, text=filename)
             self.notebook.select(tab)
 
-            # Scrollbar + treeview
+            self.machine = machine
+
+            # Scrollbar + treeview; the table only has rows for the addresses in view
             scrollbar = tk.Scrollbar(tab, orient=tk.VERTICAL)
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-            self.memoryState = ttk.Treeview(
+            self.memoryState = MemoryTable(
                 tab,
-                columns=("Location", "Item"),
+                self.machine,
+                self._memory_row,
+                scrollbar,
+                columns=("Location", "Item", "Runs"),
                 show="headings",
-                yscrollcommand=scrollbar.set,
                 selectmode="extended",
                 height=35
             )
@@ -465,27 +631,22 @@ Invalid instructions shown with red background
 
             self.memoryState.heading("Location", text="Location")
             self.memoryState.heading("Item", text="Memory Item")
+            self.memoryState.heading("Runs", text="Runs")
+            self.memoryState.column("Runs", width=90, anchor="e")
 
-            # Pre-fill UI memory
-            for i in range(250):
-                tag = "even" if i % 2 == 0 else "odd"
-                self.memoryState.insert("", "end", values=(f"{i:03d}", "+000000"), tags=(tag,))
             self.memoryState.tag_configure("even", background="#f7f7f7")
             self.memoryState.tag_configure("odd", background="#f0f0f0")
+            for level, color in enumerate(HEAT_COLORS):
+                self.memoryState.tag_configure(f"heat{level}", background=color)
+            self.memoryState.tag_configure("watch", background="#fff2b3")
+            self.memoryState.tag_configure("breakpoint", background="#ffc8c8")
 
-            core._programMemory = {f"{i:03d}": "+000000" for i in range(250)}
-
-            for i, line in enumerate(parsed_program):
-                core._programMemory[f"{i:03d}"] = line
-
-            # Sync memory to tab
-            try:
-                self.memory_manager.add_mem_helper(tab, core._programMemory)
-            except:
-                self.memory_manager.mem_dict[tab] = core._programMemory
+            # Sync memory to tab; its snapshot is what Reset returns to
+            self.memory_manager.add_mem_helper(tab, self.machine)
+            self.initial_snapshot = self.memory_manager.initial_dict[tab]
 
             # Build displayed memory
-            self.build_memory_table(core._programMemory, save_initial=True)
+            self.build_memory_table(self.machine.memory)
 
 
             if errors:
@@ -528,6 +689,13 @@ Invalid instructions shown with red background
         self.memory_menu.add_command(label="Cut", command=self._cut_selection)
         self.memory_menu.add_command(label="Copy", command=self._copy_selection)
         self.memory_menu.add_command(label="Paste", command=self._paste_selection)
+        self.memory_menu.add_separator()
+        self.memory_menu.add_command(label="Rewind to Last Write", command=self._rewind_selection)
+        self.memory_menu.add_separator()
+        self.memory_menu.add_command(label="Toggle Breakpoint", command=self._toggle_breakpoint)
+        self.memory_menu.add_command(label="Toggle Watchpoint", command=self._toggle_watchpoint)
+        self.memory_menu.add_command(label="Break If Accumulator...", command=self._add_condition)
+        self.memory_menu.add_command(label="Clear Breakpoints", command=self._clear_breakpoints)
         self.memoryState.bind("<Button-3>", self._show_context_menu)
 
         self.write_system("Memory editing enabled. Double-click to edit or right-click for options.")
@@ -540,9 +708,14 @@ Invalid instructions shown with red background
         item = self.memoryState.identify_row(event.y)
         column = self.memoryState.identify_column(event.x)
 
+        if column == "#1":  # the address column toggles a breakpoint
+            self._toggle_breakpoint(item)
+            return
+
         if column == "#2":  # only allow editing memory value
             x, y, width, height = self.memoryState.bbox(item, column)
-            value = self.memoryState.item(item, "values")[1]
+            index = self.memoryState.address(item)
+            value = self.machine.memory[index]
 
             edit_box = tk.Entry(self.memoryState, width=10, font=("Courier New", 12))
             edit_box.place(x=x, y=y, width=width, height=height)
@@ -551,12 +724,11 @@ Invalid instructions shown with red background
 
             def save_edit(event=None):
                 new_val = edit_box.get().strip()
-                index = int(self.memoryState.item(item, "values")[0])
                 if not self._validate_instruction(new_val):
                     messagebox.showerror("Invalid Entry", f"'{new_val}' is not a valid instruction format.")
                 else:
-                    self.memoryState.item(item, values=(f"{index:03d}", new_val))
-                    core._programMemory[f"{index:03d}"] = new_val
+                    self.machine.memory[index] = new_val
+                    self.update_memory(self.machine.memory)
                 edit_box.destroy()
 
             edit_box.bind("<Return>", save_edit)
@@ -567,23 +739,121 @@ Invalid instructions shown with red background
         if not value:
             return False
         try:
-            core.parse(value)
+            core.encode_word(value)
             return True
         except Exception:
             return False
 
+    # --- Breakpoints and watchpoints ---
+
+    def _breakpoints(self):
+        """Breakpoints of the selected tab's machine, created on first use."""
+        if self.machine.breakpoints is None:
+            self.machine.breakpoints = core.Breakpoints()
+        return self.machine.breakpoints
+
+    def _marker_tags(self, machine, address):
+        """Row tags showing the profile heat of address and a breakpoint or watchpoint on it."""
+        tags = ()
+        profile = machine.profile
+        if profile is not None and profile.executions[address]:
+            # log scale, so loops and straight-line code stay apart
+            runs = profile.executions[address]
+            level = math.log1p(runs) / math.log1p(max(runs, self.heat_peak))
+            tags += (f"heat{min(len(HEAT_COLORS) - 1, int(level * len(HEAT_COLORS)))}",)
+        breakpoints = machine.breakpoints
+        if not breakpoints:
+            return tags
+        if address in breakpoints.reads or address in breakpoints.writes:
+            tags += ("watch",)
+        if address in breakpoints.pcs:
+            tags += ("breakpoint",)
+        return tags
+
+    def _run_count(self, machine, address):
+        """Runs column text: how often the profiled instruction at address ran."""
+        profile = machine.profile
+        return profile.executions[address] if profile is not None and profile.executions[address] else ""
+
+    def _memory_row(self, machine, address):
+        """(values, tags) of the memory table row for address."""
+        memory = machine.memory
+        tag = "invalid" if address in memory.invalid else ("even" if address % 2 == 0 else "odd")
+        return ((f"{address:0{memory.address_width}d}", memory[address], self._run_count(machine, address)),
+                (tag,) + self._marker_tags(machine, address))
+
+    def show_profile(self):
+        """Redraw every row with its profile count and heat, and summarize the hotspots."""
+        profile = self.machine.profile
+        self.build_memory_table(self.machine.memory)
+        hotspots = ", ".join(f"{address:03d} ({runs})" for address, runs in profile.hottest(3))
+        self.write_system(f"Profile: {profile.steps} instructions run; hottest lines {hotspots or 'none'}")
+
+    def _selected_address(self, item=None):
+        item = item or next(iter(self.memoryState.selection()), None)
+        return int(self.memoryState.item(item, "values")[0]) if item else None
+
+    def _toggle_breakpoint(self, item=None):
+        """Stop runs before the instruction in the selected row (or item) runs, or stop doing so."""
+        address = self._selected_address(item)
+        if address is not None:
+            state = "set" if self._breakpoints().toggle(address) else "cleared"
+            self.write_system(f"Breakpoint {state} at {address:03d}")
+            self.update_memory(self.machine.memory, dirty={address})
+
+    def _toggle_watchpoint(self):
+        """Stop runs after any instruction reads or writes the selected cell, or stop doing so."""
+        address = self._selected_address()
+        if address is None:
+            return
+        breakpoints = self._breakpoints()
+        watched = address in breakpoints.reads or address in breakpoints.writes
+        breakpoints.watch(address, read=not watched, write=not watched)
+        self.write_system(f"Watchpoint {'cleared' if watched else 'set'} on {address:03d}")
+        self.update_memory(self.machine.memory, dirty={address})
+
+    def _add_condition(self):
+        """Ask for an accumulator condition such as < 0 that stops runs when it comes true."""
+        text = simpledialog.askstring("Break If Accumulator", "Condition (e.g. < 0, == 100, >= +0050):",
+                                      parent=self.root)
+        if not text:
+            return
+        try:
+            operator, value = self._breakpoints().add_condition(text)
+        except ValueError as e:
+            messagebox.showerror("Break If Accumulator", str(e))
+            return
+        self.write_system(f"Break when accumulator {operator} {value}")
+
+    def _clear_breakpoints(self):
+        breakpoints = self.machine.breakpoints
+        if breakpoints:
+            marked = breakpoints.pcs | breakpoints.reads | breakpoints.writes
+            breakpoints.clear()
+            self.update_memory(self.machine.memory, dirty=marked)
+            self.write_system("All breakpoints, watchpoints and conditions cleared")
+
+    def tree_for_tab(self, tab_widget):
+        """Return the memory Treeview that lives inside the given notebook tab."""
+        for child in tab_widget.winfo_children():
+            if isinstance(child, ttk.Treeview):
+                return child
+        return self.memoryState
+
     def close_tab(self):
         selected = self.notebook.select()
         if not selected:
             return
         tab_widget = self.notebook.nametowidget(selected)
+        if self.run_machine is self.memory_manager.mem_dict.get(tab_widget):
+            self.stop_program()
         self.memory_manager.remove_mem_helper(tab_widget)
         self.notebook.forget(selected)
 
 
     def _copy_selection(self, event=None):
         """Copy selected rows to clipboard."""
-        selection = [self.memoryState.item(i, "values")[1] for i in self.memoryState.selection()]
+        selection = [self.machine.memory[i] for i in self.memoryState.selected_addresses()]
         if selection:
             self.root.clipboard_clear()
             self.root.clipboard_append("\n".join(selection))
@@ -591,43 +861,41 @@ Invalid instructions shown with red background
     def _cut_selection(self, event=None):
         """Cut selected rows (copy then clear)."""
         self._copy_selection()
-        for i in self.memoryState.selection():
-            index = int(self.memoryState.item(i, "values")[0])
-            self.memoryState.item(i, values=(f"{index:03d}", "+000000"))
-            core._programMemory[f"{index:03d}"] = "+000000"
+        for index in self.memoryState.selected_addresses():
+            self.machine.memory[index] = "+000000"
+        self.update_memory(self.machine.memory)
 
     def _paste_selection(self, event=None):
         """Paste clipboard contents starting from first selected row."""
-        if not self.memoryState.selection():
+        if not self.memoryState.selected:
             return
-        start_index = int(self.memoryState.item(self.memoryState.selection()[0], "values")[0])
+        start_index = self.memoryState.selected_addresses()[0]
         pasted = self.root.clipboard_get().splitlines()
 
         for offset, line in enumerate(pasted):
             idx = start_index + offset
-            if idx >= 250:
-                messagebox.showwarning("Paste Limit", "Reached max memory size (250).")
+            if idx >= len(self.machine.memory):
+                messagebox.showwarning("Paste Limit", f"Reached max memory size ({len(self.machine.memory)}).")
                 break
             if self._validate_instruction(line):
-                self.memoryState.item(self.memoryState.get_children()[idx], values=(f"{idx:03d}", line))
-                core._programMemory[f"{idx:03d}"] = line
+                self.machine.memory[idx] = line
+        self.update_memory(self.machine.memory)
 
     def _delete_selection(self, event=None):
         """Delete (clear) selected memory rows."""
-        for i in self.memoryState.selection():
-            index = int(self.memoryState.item(i, "values")[0])
-            self.memoryState.item(i, values=(f"{index:03d}", "+000000"))
-            core._programMemory[f"{index:03d}"] = "+000000"
+        for index in self.memoryState.selected_addresses():
+            self.machine.memory[index] = "+000000"
+        self.update_memory(self.machine.memory)
 
     def _add_entry(self):
         """Add a blank new memory line if space allows."""
-        current_count = len(self.memoryState.get_children())
-        if current_count >= 250:
-            messagebox.showwarning("Memory Full", "Maximum of 250 entries allowed.")
+        current_count = len(self.machine.memory)
+        if current_count >= self.memory_size:
+            messagebox.showwarning("Memory Full", f"Maximum of {self.memory_size} entries allowed.")
             return
         new_index = current_count
-        self.memoryState.insert("", "end", values=(f"{new_index:03d}", "+000000"))
-        core._programMemory[f"{new_index:03d}"] = "+000000"
+        self.machine.memory[new_index] = "+000000"
+        self.memoryState.show_address(new_index)
         self.write_system(f"Added new memory entry at {new_index:03d}.")
 
     def _show_context_menu(self, event):
@@ -654,120 +922,142 @@ Invalid instructions shown with red background
         if self.run_thread and self.run_thread.is_alive():
             messagebox.showinfo("Run Program", "Program is already running.")
             return
-        self.run_thread = threading.Thread(target=self._run_program_thread, daemon=True)
+        self.step_event.clear()
+        self.stop_event.clear()
+        self.input_channel.clear()
+        self.run_machine = self.machine
+        self.run_machine.history = core.History(inputs=self.input_channel)
+        self.run_machine.profile = core.Profile(len(self.run_machine.memory)) if self.profile_var.get() else None
+        self.run_thread = threading.Thread(target=self._run_program_thread,
+                                           args=(self.run_mode.get(), self._get_run_rate()), daemon=True)
         self.run_thread.start()
 
     # --- System messages / memory ---
 
     def write_system(self, message):
-        """Writes to the system_ouput, clears output in clear_system"""
+        """Adds a line to the log; system_output shows new lines in one batch when Tk is idle"""
+        self.log.append(message)
+        if not self.log_flush_pending:
+            self.log_flush_pending = True
+            self.root.after_idle(self.flush_system)
+
+    def flush_system(self):
+        """Appends the lines written since the last flush, dropping the oldest past the log's cap"""
+        self.log_flush_pending = False
+        lines, drop = self.log.take_pending()
+        if not lines:
+            return
         self.system_output.config(state="normal")
-        self.system_output.insert("end", message + "\n")
+        if drop:
+            self.system_output.delete("1.0", f"{drop + 1}.0")
+        self.system_output.insert("end", "\n".join(lines) + "\n")
         self.system_output.see("end")  # auto-scroll to bottom
         self.system_output.config(state="disabled")
 
+    def toggle_log_file(self):
+        """Start copying every System Messages line to a file, or stop if already doing so"""
+        if self.log.spill is not None:
+            self.log.spill_to(None)
+            self.log_file_btn.config(text="Log to File...")
+            self.write_system("Stopped logging to file")
+            return
+        path = filedialog.asksaveasfilename(title="Log System Messages to File", defaultextension=".log",
+                                            filetypes=[("Log Files", "*.log"), ("Text Files", "*.txt")])
+        if not path:
+            return
+        try:
+            self.log.spill_to(path)
+        except Exception as e:
+            self.write_system(f"ERROR opening log file: {str(e)}")
+            return
+        self.log_file_btn.config(text="Stop Logging")
+        self.write_system(f"Logging System Messages to {path}")
+
     def clear_system(self):
         """Clear all messages from the system messages"""
+        self.log.clear()
         self.system_output.config(state="normal")
         self.system_output.delete("1.0", "end")  # delete everything
         self.system_output.config(state="disabled")
 
-    def build_memory_table(self, memory_dict, save_initial=False):
-        """Full rebuild of memory table (used on file load or reset), parameters are memory_dict and save_initial (preset to False)"""
-        if save_initial:
-            self.initial_memory = memory_dict.copy()
-
-        for row in self.memoryState.get_children():
-            self.memoryState.delete(row)
-        for i in range(250):
-            loc = f"{i:03d}"
-            item = memory_dict.get(loc, "+000000")
-            tag = "even" if i % 2 == 0 else "odd"
-            # if invalid instruction, mark invalid tag
-            try:
-                core.parse(item)
-            except Exception:
-                self.memoryState.insert("", "end", values=(loc, item), tags=("invalid",))
-                continue
-            self.memoryState.insert("", "end", values=(loc, item), tags=(tag,))
-
-    def update_memory(self, memory_dict, save_initial=False):
-        """Updates the changed values in memory. Take parameters memory_dict and save_initial (preset to False)"""
-        if save_initial:
-            self.initial_memory = memory_dict.copy()
-
-        # only update rows that changed
-        children = self.memoryState.get_children()
-        for i in range(250):
-            loc = f"{i:03d}"
-            new_val = memory_dict.get(loc, "+000000")
-
-            # get current value in Treeview
-            item_id = children[i]
-            old_val = self.memoryState.item(item_id, "values")[1]
-
-            if new_val != old_val:  # update only if different
-                # validate new value to set correct tag
-                try:
-                    core.parse(new_val)
-                    tag = "even" if i % 2 == 0 else "odd"
-                    self.memoryState.item(item_id, values=(loc, new_val), tags=(tag,))
-                except Exception:
-                    self.memoryState.item(item_id, values=(loc, new_val), tags=("invalid",))
+    def build_memory_table(self, memory):
+        """Redraw every row of the memory table in view (used on file load and edits), parameter is memory"""
+        memory.take_dirty()  # every row is redrawn below
+        if self.memoryState is not None:
+            self._measure_heat()
+            self.memoryState.redraw()
+
+    def update_memory(self, memory, dirty=None):
+        """Redraw only the rows in dirty (default: memory.take_dirty()). Take parameters memory and dirty"""
+        if dirty is None:
+            dirty = memory.take_dirty()
+        if self.memoryState is not None:
+            self._measure_heat()
+            self.memoryState.redraw(dirty)  # rows out of view are drawn when scrolled to
+
+    def _measure_heat(self):
+        """Update heat_peak once per redraw instead of once per row."""
+        profile = self.memoryState.machine.profile
+        hottest = profile.hottest(1) if profile is not None else []
+        self.heat_peak = hottest[0][1] if hottest else 0
 
     def update_vars(self):
-        """Update the Accumulator / Program Counter label from core variables."""
+        """Update the Accumulator / Program Counter label from the current machine."""
 
-        acc = getattr(core, "_accumulator", "+000000")
-        pc = getattr(core, "_programCounter", 0)
+        acc = self.machine.accumulator
+        pc = self.machine.program_counter
         self.varsState.config(text=f"Accumulator: {acc}\nProgram Counter: {pc:03d}")
 
     def reset_memory(self):
         """Resets all aspects of memory and system. Interacts with core (main module) and changes protected variables. Calls update_vars and clear_system"""
-        if not self.initial_memory:
+        if self.run_machine is self.machine:
+            self.stop_program()
+        if not self.initial_snapshot:
             messagebox.showinfo("Reset Memory", "No saved memory snapshot to restore.")
             return
 
-        # Restore memory
-        core._programMemory = self.initial_memory.copy()
-        self.build_memory_table(core._programMemory, save_initial=False)
-
-        # Reset Accumulator and Program Counter
-        core._accumulator = "+000000"
-        core._programCounter = 0
+        # Restore memory, Accumulator and Program Counter; only cells written since loading are redrawn
+        self.machine.restore(self.initial_snapshot)
+        self.machine.history = None  # its steps no longer lead to this state
+        if self.machine.profile is not None:
+            self.machine.profile = None
+            self.build_memory_table(self.machine.memory)  # drop the heatmap
+        self.update_memory(self.machine.memory)
         self.update_vars()
         # self.clear_system()
 
     # --- Input handling ---
 
     def _submit_input(self, event):
-        value = self.userInput.get()
-        if value:
-            self.userQueue.append(value)
+        """Queue the typed value(s); several can be entered at once, separated by spaces or commas."""
+        values = self.userInput.get().replace(",", " ").split()
+        if values:
+            self.input_channel.put(*values)
+            self.userInput.delete(0, tk.END)
+
+    def _set_input_enabled(self, enabled):
+        """Unlock the User Console while the program waits for a READ."""
+        if enabled:
+            self.userInput.config(state="normal")  # allow typing
+            self.userInput.focus_set()
+        else:
+            self.userInput.delete(0, tk.END)
+            self.userInput.config(state="disabled")  # lock input again
 
     def get_input(self):
-        """Enable the input box, wait for integer input, then disable again."""
-        self.userInput.config(state="normal")  # allow typing
-        self.userInput.focus_set()
-
-        value = None
-        while value is None:
-            while not self.userQueue:  # wait for Enter
-                time.sleep(0.01)
-
-            candidate = self.userQueue.pop(0).strip()
-
-            if candidate.lstrip("+-").isdigit():  # valid integer
-                value = candidate
-            else:
+        """Wait for the next integer from the User Console (values typed ahead are used first). Runs on the run thread."""
+        if not self.input_channel.pending():
+            self.events.put(("input", True))
+        try:
+            while True:
+                candidate = self.input_channel.get().strip()  # blocks until Enter or Stop
+                if candidate.lstrip("+-").isdigit():  # valid integer
+                    return candidate
                 # Invalid → show error, keep waiting
-                self.write_system("Invalid input: please enter an integer.")
-                self.userInput.delete(0, tk.END)
-
-        # clean up after valid input
-        self.userInput.delete(0, tk.END)
-        self.userInput.config(state="disabled")  # lock input again
-        return value
+                self.events.put((core.MESSAGE, "Invalid input: please enter an integer."))
+                self.events.put(("input", True))
+        finally:
+            self.events.put(("input", False))
 
     # --- Editing helpers ---
 
@@ -777,25 +1067,22 @@ Invalid instructions shown with red background
         col = self.memoryState.identify_column(event.x)
         if not item_id or col != '#2':
             return
-        loc, old_val = self.memoryState.item(item_id, 'values')
-        new_val = simpledialog.askstring("Edit Memory", f"Edit value at {loc}", initialvalue=str(old_val))
+        index = self.memoryState.address(item_id)
+        new_val = simpledialog.askstring("Edit Memory", f"Edit value at {index:03d}",
+                                         initialvalue=self.machine.memory[index])
         if new_val is None:
             return
         new_val = new_val.strip()
         # accept empty to be treated as +000000
         if new_val == '':
             new_val = "+000000"
-        # update core memory and the treeview with validation
-        core._programMemory[loc] = new_val
+        # update core memory; the row is redrawn from it (invalid text is marked)
+        self.machine.memory[index] = new_val
+        self.update_memory(self.machine.memory)
         try:
-            core.parse(new_val)
-            # valid
-            idx = int(loc)
-            tag = 'even' if idx % 2 == 0 else 'odd'
-            self.memoryState.item(item_id, values=(loc, new_val), tags=(tag,))
+            core.encode_word(new_val)
         except Exception as e:
-            self.memoryState.item(item_id, values=(loc, new_val), tags=('invalid',))
-            self.write_system(f"Validation error at {loc}: {str(e)}")
+            self.write_system(f"Validation error at {index:03d}: {str(e)}")
 
     def show_context_menu(self, event):
         try:
@@ -804,28 +1091,15 @@ Invalid instructions shown with red background
             self.context_menu.grab_release()
 
     def get_selected_indices(self):
-        """Return list of (index, item_id) tuples for selected rows in ascending index order."""
-        selected = self.memoryState.selection()
-        children = list(self.memoryState.get_children())
-        pairs = []
-        for item in selected:
-            try:
-                idx = children.index(item)
-                pairs.append((idx, item))
-            except ValueError:
-                continue
-        pairs.sort()
-        return pairs
+        """Return list of (index, item_id) tuples for selected rows in view in ascending index order."""
+        return sorted((self.memoryState.address(item), item) for item in self.memoryState.selection())
 
     def copy_selection(self):
         sel = self.get_selected_indices()
         if not sel:
             messagebox.showinfo("Copy", "No selection to copy.")
             return
-        self.clipboard = []
-        for idx, item_id in sel:
-            loc, val = self.memoryState.item(item_id, 'values')
-            self.clipboard.append(val)
+        self.clipboard = [self.machine.memory[idx] for idx, _ in sel]
         self.write_system(f"Copied {len(self.clipboard)} item(s) to clipboard")
 
     def cut_selection(self):
@@ -834,15 +1108,12 @@ Invalid instructions shown with red background
             messagebox.showinfo("Cut", "No selection to cut.")
             return
         self.clipboard = []
-        children = list(self.memoryState.get_children())
-        for idx, item_id in sel:
-            loc, val = self.memoryState.item(item_id, 'values')
-            self.clipboard.append(val)
-            # remove and shift everything below up
-            # set this location to +000000 and shift subsequent down to keep 250 entries
-            core._programMemory[loc] = "+000000"
-        # Rebuild view from core memory
-        self.build_memory_table(core._programMemory)
+        for idx, _ in sel:
+            self.clipboard.append(self.machine.memory[idx])
+            # set this location to +000000 to keep the memory size
+            self.machine.memory[idx] = "+000000"
+        # Redraw the cut rows from core memory
+        self.update_memory(self.machine.memory)
         self.write_system(f"Cut {len(self.clipboard)} item(s)")
 
     def paste_at_selection(self):
@@ -855,35 +1126,36 @@ Invalid instructions shown with red background
         else:
             # if nothing selected, paste at first free or at 0
             start_idx = 0
-        # ensure we do not exceed 250 entries
-        available = 250 - start_idx
+        # ensure we do not exceed the memory size
+        size = len(self.machine.memory)
+        available = size - start_idx
         data_to_paste = list(self.clipboard)
         if len(data_to_paste) > available:
             data_to_paste = data_to_paste[:available]
-            messagebox.showwarning("Paste", "Pasted data was truncated to fit memory (250 entries max).")
+            messagebox.showwarning("Paste", f"Pasted data was truncated to fit memory ({size} entries max).")
         # shift existing entries down to make room
         # work from bottom up to avoid overwriting
-        for i in range(249, start_idx + len(data_to_paste) - 1, -1):
-            src = f"{max(0, i - len(data_to_paste)):03d}"
-            dst = f"{i:03d}"
-            core._programMemory[dst] = core._programMemory.get(src, "+000000")
+        for i in range(size - 1, start_idx + len(data_to_paste) - 1, -1):
+            src = max(0, i - len(data_to_paste))
+            self.machine.memory[i] = self.machine.memory[src]
         # insert pasted data
         for offset, val in enumerate(data_to_paste):
-            core._programMemory[f"{start_idx + offset:03d}"] = val
-        self.build_memory_table(core._programMemory)
+            self.machine.memory[start_idx + offset] = val
+        self.build_memory_table(self.machine.memory)
         self.write_system(f"Pasted {len(data_to_paste)} item(s) at {start_idx:03d}")
 
     def add_instruction(self):
         # append at end (first +000000 from top)
-        children = list(self.memoryState.get_children())
-        for i, item_id in enumerate(children):
-            loc, val = self.memoryState.item(item_id, 'values')
-            if val == "+000000":
+        memory = self.machine.memory
+        for i in range(len(memory)):
+            if memory[i] == "+000000":
                 # edit this one
+                self.memoryState.show_address(i)
+                item_id = self.memoryState.item_for(i)
                 self.memoryState.selection_set(item_id)
                 self.on_double_click(type('E', (), {'x': 0, 'y': self.memoryState.bbox(item_id)[1]}))
                 return
-        messagebox.showinfo("Add", "Memory is full (250 entries).")
+        messagebox.showinfo("Add", f"Memory is full ({len(memory)} entries).")
 
     def insert_instruction(self):
         # insert before selected row, shift others down
@@ -893,21 +1165,23 @@ Invalid instructions shown with red background
         else:
             idx = sel[0][0]
         # if no space to shift
-        if idx >= 250:
+        last = len(self.machine.memory) - 1
+        if idx > last:
             messagebox.showinfo("Insert", "Cannot insert beyond memory limit.")
             return
         # check space
         # if last cell non-empty and would be pushed out, warn
-        if core._programMemory.get('249', '+000000') != '+000000':
+        if self.machine.memory[last] != '+000000':
             if not messagebox.askyesno("Insert", "Inserting will drop the last memory entry. Continue?"):
                 return
         # shift down from bottom to idx
-        for i in range(249, idx, -1):
-            core._programMemory[f"{i:03d}"] = core._programMemory.get(f"{i - 1:03d}", "+000000")
-        core._programMemory[f"{idx:03d}"] = "+000000"
-        self.build_memory_table(core._programMemory)
+        for i in range(last, idx, -1):
+            self.machine.memory[i] = self.machine.memory[i - 1]
+        self.machine.memory[idx] = "+000000"
+        self.build_memory_table(self.machine.memory)
         # let user edit the new slot
-        item_id = self.memoryState.get_children()[idx]
+        self.memoryState.show_address(idx)
+        item_id = self.memoryState.item_for(idx)
         self.memoryState.selection_set(item_id)
         self.on_double_click(type('E', (), {'x': 0, 'y': self.memoryState.bbox(item_id)[1]}))
 
@@ -919,39 +1193,24 @@ Invalid instructions shown with red background
         children = list(self.memoryState.get_children())
         # set selected indices to +000000 and shift subsequent up
         indices = [i for i, _ in sel]
+        last = len(self.machine.memory) - 1
         for idx in sorted(indices):
-            for j in range(idx, 249):
-                core._programMemory[f"{j:03d}"] = core._programMemory.get(f"{j + 1:03d}", "+000000")
-            core._programMemory['249'] = "+000000"
-        self.build_memory_table(core._programMemory)
+            for j in range(idx, last):
+                self.machine.memory[j] = self.machine.memory[j + 1]
+            self.machine.memory[last] = "+000000"
+        self.build_memory_table(self.machine.memory)
         self.write_system(f"Deleted {len(indices)} row(s)")
 
     def validate_memory_from_editor(self):
-        """Read all items from the Treeview (editor) into core._programMemory and validate each. Returns list of error strings."""
-        errors = []
-        children = list(self.memoryState.get_children())
-        for i, item_id in enumerate(children):
-            loc = f"{i:03d}"
-            val = self.memoryState.item(item_id, 'values')[1]
-            # empty treat as +000000
-            if val == '' or val is None:
-                val = "+000000"
-            core._programMemory[loc] = val
-            # skip default +000000
-            if val in ("+000000", "000000"):
-                continue
-            try:
-                core.parse(val)
-            except Exception as e:
-                errors.append(f"{loc}: {str(e)}")
-                # mark invalid
-                self.memoryState.item(item_id, tags=('invalid',))
-        return errors
+        """Return the validation errors of the machine's memory (edits are written to it directly)."""
+        memory = self.machine.memory
+        self.update_memory(memory, dirty=memory.invalid.keys())  # invalid rows are marked
+        return memory.errors()
 
     # -------- SAVE PROGRAM ------
 
     def save_file(self, event):
-        # validate editor contents into core._programMemory
+        # validate editor contents into the machine's memory
         errors = self.validate_memory_from_editor()
         if errors:
             # ask user whether to proceed despite validation errors
@@ -961,15 +1220,15 @@ Invalid instructions shown with red background
             if not proceed:
                 return
 
-        # run save function
-        return self.save_file_as()
+        # run save function (memory was just validated)
+        return self.save_file_as(validated=True)
 
-    def save_file_as(self):
+    def save_file_as(self, validated=False):
         """
         Prompt the user for save location (ask for filename)
         """
-        # validate editor contents
-        errors = self.validate_memory_from_editor()
+        # validate editor contents unless save_file already did
+        errors = [] if validated else self.validate_memory_from_editor()
         if errors:
             proceed = messagebox.askyesno(
                 "Save As - Validation issues",
@@ -980,19 +1239,17 @@ Invalid instructions shown with red background
         path = filedialog.asksaveasfilename(
             title="Save Program As",
             defaultextension=".txt",
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
+            filetypes=[("Text Files", "*.txt"), ("Program Images", "*" + core.IMAGE_SUFFIX), ("All Files", "*.*")])
         if not path:
             return
         try:
-            lines = [core._programMemory.get(f"{i:03d}", "+000000") for i in range(250)]
-            last = -1
-            for i, val in enumerate(lines):
-                if val != "+000000":
-                    last = i
-            write_lines = [] if last == -1 else lines[: last + 1]
-            with open(path, "w", encoding="utf-8") as f:
-                for ln in write_lines:
-                    f.write(str(ln).strip() + "\n")
+            if path.lower().endswith(core.IMAGE_SUFFIX):
+                with open(path, "wb") as f:
+                    f.write(core.pack_image(self.machine.memory))
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    for ln in core.program_words(self.machine.memory):
+                        f.write(str(ln).strip() + "\n")
             self.current_filepath = path
             self.file_valid = True
             self.write_system(f"Saved program to {path}")
@@ -1003,79 +1260,167 @@ Invalid instructions shown with red background
 
     # -------- RUN PROGRAM -------
 
-    def _run_program_thread(self):
-        """Runs all instructions/code in memory. Calls class definitions and definitions from main.py."""
-        self.write_system("Running program...")
-        core._programCounter = 0
+    def step_program(self):
+        """Let a run in Step mode execute its next batch of instructions."""
+        self.step_event.set()
+
+    def stop_program(self):
+        """Stop the running program, also waking it from a READ or a Step pause."""
+        if not (self.run_thread and self.run_thread.is_alive()):
+            return
+        self.stop_event.set()
+        self.input_channel.cancel()
+        self.step_event.set()
+        self.run_thread.join(timeout=1)
+
+    def _time_travel(self, move):
+        """
+        Apply move(machine) to the machine of the last run and redraw. Only
+        allowed while that run is finished or paused in Step mode.
+        """
+        machine = self.run_machine
+        if machine is None or machine.history is None:
+            messagebox.showinfo("Reverse Execution", "Run a program first.")
+            return
+        if self.run_thread and self.run_thread.is_alive() and not self.paused:
+            messagebox.showinfo("Reverse Execution", "Pause the program in Step mode or stop it first.")
+            return
+        try:
+            move(machine)
+        except ValueError as e:
+            messagebox.showerror("Reverse Execution", str(e))
+            return
+        if machine is self.machine:
+            self.update_memory(machine.memory)
+            self.update_vars()
+        self.write_system(f"Back at step {machine.history.end} (line {machine.program_counter:03d})")
+
+    def step_back(self):
+        """Undo the last instructions of the run, as many as Step would run."""
+        rate = self._get_run_rate()
+        self._time_travel(lambda machine: machine.step_back(min(rate, len(machine.history))))
+
+    def goto_step(self):
+        """Ask for a step number and return the run to it."""
+        history = self.run_machine.history if self.run_machine else None
+        if history is None or not len(history):
+            messagebox.showinfo("Reverse Execution", "No steps to go back to.")
+            return
+        step = simpledialog.askinteger("Go to Step", f"Step number ({history.start}-{history.end}):",
+                                       minvalue=history.start, maxvalue=history.end, parent=self.root)
+        if step is not None:
+            self._time_travel(lambda machine: machine.goto_step(step))
+
+    def _rewind_selection(self):
+        """Go back to just before the last instruction that wrote the selected cell."""
+        selection = self.memoryState.selection()
+        if selection:
+            address = int(self.memoryState.item(selection[0], "values")[0])
+            self._time_travel(lambda machine: machine.rewind_to_write(address))
+
+    def _get_run_rate(self):
+        """Instructions per second (Throttled) or per click (Step); at least 1."""
+        try:
+            return max(1, int(self.run_rate.get()))
+        except ValueError:
+            return 1
 
+    def _drain_events(self):
+        """
+        Handle everything the run thread published since the last frame.
+        Output and messages are written in order; register/memory changes are
+        merged into a single redraw per frame.
+        """
+        state = None
+        dirty = set()
+        halted = False
         try:
-            while core._programCounter < 250:
-                instr = core._programMemory.get(f"{core._programCounter:03d}", "+0000")
-
-                # Skip empty memory
-                if instr == "+000000" or instr == "000000":
-                    core._programCounter += 1
-                    continue
-
-                # Parse instruction
-                try:
-                    tuple_instr = core.parse(instr)
-                    opcode = tuple_instr[0]
-                except Exception as e:
-                    self.write_system(f"Parse Error at line {core._programCounter:03d}: {str(e)}")
-                    self.write_system("Program halted")
-                    return
-
-                opcode = tuple_instr[0]
-                jumped = False
-
-                # Execute instruction with error handling
-                try:
-                    if opcode == '10':  # read
-                        self.write_system("Please enter a number...: ")
-                        core.read(tuple_instr, self.get_input())
-                    elif opcode == '11':  # write
-                        self.write_system(core.write(tuple_instr))
-                    elif opcode == '20':  # load
-                        core.load(tuple_instr)
-                    elif opcode == '21':  # store
-                        core.store(tuple_instr)
-                    elif opcode == '30':  # add
-                        core.add(tuple_instr)
-                    elif opcode == '31':  # subtract
-                        core.subtract(tuple_instr)
-                    elif opcode == '32':  # divide
-                        core.divide(tuple_instr)
-                    elif opcode == '33':  # multiply
-                        core.multiply(tuple_instr)
-                    elif opcode == '40':  # branch
-                        core.branch(tuple_instr)
-                        jumped = True
-                    elif opcode == '41':  # branchneg
-                        jumped = core.branchneg(tuple_instr)
-                    elif opcode == '42':  # branchzero
-                        jumped = core.branchzero(tuple_instr)
-                    elif opcode == '43':  # halt
-                        self.write_system("Program halted normally")
-                        break
-                    else:
-                        self.write_system(f"Warning: Unknown opcode '{opcode}' at line {core._programCounter:03d}")
-
-                except Exception as e:
-                    self.write_system(f"Runtime Error at line {core._programCounter:03d}: {str(e)}")
-                    self.write_system("Program halted")
-                    return
-
-                if not jumped:
-                    core._programCounter += 1
-
-                self.root.after(0, self.update_vars)
-                self.update_memory(core._programMemory)
-                time.sleep(0.01)
-
-            self.write_system("Program finished")
+            while True:
+                kind, data = self.events.get_nowait()
+                if kind in (core.OUTPUT, core.MESSAGE):
+                    self.write_system(data)
+                elif kind == core.STATE:
+                    state = data
+                    dirty |= data[2]
+                elif kind == core.ERROR:
+                    self.write_system(f"Fatal Error: {data}")
+                    self.write_system("Program terminated")
+                elif kind == core.HALTED:
+                    halted = True
+                elif kind == "input":
+                    self._set_input_enabled(data)
+        except queue.Empty:
+            pass
 
-        except Exception as e:
-            self.write_system(f"Fatal Error: {str(e)}")
-            self.write_system("Program terminated")
+        # Only draw runs of the machine shown in the selected tab
+        if state is not None and self.run_machine is self.machine:
+            acc, pc, _ = state
+            self.varsState.config(text=f"Accumulator: {acc}\nProgram Counter: {pc:03d}")
+            self.update_memory(self.machine.memory, dirty=dirty)
+            if halted and self.machine.profile is not None:
+                self.show_profile()
+
+        self.root.after(FRAME_MS, self._drain_events)
+
+    def _make_step_hook(self, publisher, mode, rate):
+        """Return the per-instruction callback for the given run mode and rate."""
+        count = 0
+
+        if mode == "Turbo":
+            # no delay, the view is refreshed at most TURBO_REFRESH_HZ times a second
+            interval = 1 / TURBO_REFRESH_HZ
+            next_refresh = time.perf_counter() + interval
+
+            def on_step():
+                nonlocal count, next_refresh
+                count += 1
+                if count & 255 == 0:
+                    if self.stop_event.is_set():
+                        raise core.RunStopped()
+                    if time.perf_counter() >= next_refresh:
+                        publisher.state()
+                        next_refresh = time.perf_counter() + interval
+
+        elif mode == "Step":
+            # pause after every `rate` instructions until Step is clicked
+            def on_step():
+                nonlocal count
+                count += 1
+                if count >= rate:
+                    count = 0
+                    publisher.state()
+                    self.paused = True
+                    self.step_event.wait()
+                    self.step_event.clear()
+                    self.paused = False
+                if self.stop_event.is_set():
+                    raise core.RunStopped()
 
+        else:
+            # Throttled: `rate` instructions per second
+            delay = 1 / rate
+
+            def on_step():
+                publisher.state()
+                if self.stop_event.wait(delay):
+                    raise core.RunStopped()
+
+        return on_step
+
+    def _run_program_thread(self, mode, rate):
+        """Runs all instructions/code in memory on this worker thread. Everything shown in the window goes through self.events."""
+        self.events.put((core.MESSAGE, "Running program..."))
+        publisher = core.EventPublisher(self.run_machine, self.events)
+        on_step = self._make_step_hook(publisher, mode, rate)
+        budget = core.Budget(detect_loops=True)  # loop detection spans the pauses at breakpoints
+        reason = publisher.run(self.get_input, on_step, budget=budget)
+        # A breakpoint pauses the run until Step is clicked
+        while reason == "break":
+            self.paused = True
+            self.step_event.wait()
+            self.step_event.clear()
+            self.paused = False
+            if self.stop_event.is_set():
+                self.events.put((core.MESSAGE, "Program stopped"))
+                break
+            reason = publisher.run(self.get_input, on_step, start=self.run_machine.program_counter, budget=budget)
@@ -1,6 +1,18 @@
+import os
 import sys
 import re
-import interface as face
+import csv
+import json
+import time
+import mmap
+import zlib
+import struct
+import heapq
+import operator
+import threading
+from array import array
+from collections import namedtuple, deque
+from functools import lru_cache
 
 _accumulator = "+0000"
 _programCounter = 0
@@ -9,16 +21,19 @@ _programMemory = {}
 # --- Class to facilitate the management of Memory ---
 class MemoryManager:
     def __init__(self, parent):
-        self.mem_dict = {}   # key: tab widget, value: memory dict
+        self.mem_dict = {}   # key: tab widget, value: Machine for that tab
+        self.initial_dict = {}   # key: tab widget, value: Snapshot of the machine as loaded
         self.parent = parent
 
-    def add_mem_helper(self, tab_widget, program_memory):
-        """Store memory keyed by the tab's widget ID."""
-        self.mem_dict[tab_widget] = program_memory.copy()
+    def add_mem_helper(self, tab_widget, machine):
+        """Store the tab's machine (and a snapshot of it as loaded) keyed by the tab's widget ID."""
+        self.mem_dict[tab_widget] = machine
+        self.initial_dict[tab_widget] = machine.checkpoint()
 
     def remove_mem_helper(self, tab_widget):
         """Remove memory for a closed tab."""
         self.mem_dict.pop(tab_widget, None)
+        self.initial_dict.pop(tab_widget, None)
 
     def switch_mem(self, event):
         """Load memory for the newly selected tab."""
@@ -26,7 +41,11 @@ class MemoryManager:
             tab_widget = self.parent.notebook.nametowidget(
                 self.parent.notebook.select()
             )
-            self.parent.initial_memory = self.mem_dict.get(tab_widget, {})
+            if tab_widget not in self.mem_dict:
+                return
+            self.parent.machine = self.mem_dict[tab_widget]
+            self.parent.memoryState = self.parent.tree_for_tab(tab_widget)
+            self.parent.initial_snapshot = self.initial_dict.get(tab_widget)
             self.parent.reset_memory()
         except Exception as e:
             print("Memory switch error:", e)
@@ -38,6 +57,13 @@ def _overflow_value(value: int) -> str:
     digits = str(abs(value))[-4:]  # take last 4 digits only
     return f"{sign}{digits.zfill(4)}"
 
+def _overflow(value: int):
+    """Integer form of _overflow_value: returns (value, flags) of the four-digit result."""
+    digits = abs(value) % 10000  # keep last 4 digits only
+    if value >= 0:
+        return digits, 0
+    return -digits, 0 if digits else NEG_ZERO
+
 def parse(word):
     """
     Parse instruction - supports both 4-digit and 6-digit formats:
@@ -120,12 +146,8 @@ def convert_4_to_6_digit(instruction):
     first_two = digits[:2]
     last_two = digits[2:]
 
-    valid_opcodes = {
-        '10','11','20','21','30','31','32','33','40','41','42','43'
-    }
-
     # FUNCTION INSTRUCTION
-    if first_two in valid_opcodes:
+    if int(first_two) in OPCODES:
         opcode_3 = '0' + first_two
         operand_3 = '0' + last_two
         return f"{sign}{opcode_3}{operand_3}"
@@ -135,227 +157,1890 @@ def convert_4_to_6_digit(instruction):
 
 
 
-def read(tuple, input):
-    """Read input and store in memory at given address."""
-    if input is None:
-        raise ValueError("No input provided for READ instruction")
+_BUDGET_CHECK_STEPS = 1024  # how often execute() looks at the clock or checks for loops
+_LOOP_STATES = 4096  # states loop detection remembers between memory writes
+HISTORY_STEPS = 1000000  # steps a History keeps by default (18 bytes each)
+
+# --- Memory model: integer words, formatted as signed strings only for display/save ---
+WIDE = 1       # word is written with six digits (otherwise four)
+NEG_ZERO = 2   # zero written with a '-' sign ("-0000")
+
+MEMORY_SIZE = 250  # cells in a machine's memory by default
+PAGED_MEMORY = 1 << 16  # memories with more cells than this are stored in pages
+PAGE_BITS = 12  # a page holds 1 << PAGE_BITS cells
+
+WORD_CACHE_SIZE = 1 << 16  # word strings the decoder remembers (least recently used ones are dropped)
+
+_WORD_PATTERN = re.compile(r'[+-]?(\d{4}|\d{6})')
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _decode_text(word):
+    """
+    Decode word once for encode_word: (value, flags, None), or (0, WIDE,
+    (exception class, message)) when it is not a word. Errors are kept as
+    class and message, so each raise gets a fresh exception.
+    """
+    text = word.strip() if isinstance(word, str) else ""
+    if not _WORD_PATTERN.fullmatch(text):
+        try:
+            parse(word)  # the raw word, so the message is exactly parse's
+            raise ValueError(f"Invalid word: '{text}'")
+        except Exception as e:
+            return 0, WIDE, (type(e), str(e))
+    value = int(text)
+    flags = WIDE if len(text.lstrip('+-')) == 6 else 0
+    if value == 0 and text[0] == '-':
+        flags |= NEG_ZERO
+    return value, flags, None
+
+
+def encode_word(word):
+    """
+    Convert a signed word string into (value, flags).
+    The flags remember the 4-/6-digit width and a '-' on zero so that
+    format_word gives back the same text. Raises the same errors as parse.
+
+    Results are cached by the raw string (see word_cache_info), so loading,
+    editing and validating the same words again skips the parsing.
+    """
+    value, flags, error = _decode_text(word)
+    if error is not None:
+        raise error[0](error[1])
+    return value, flags
+
+
+def word_cache_info():
+    """Hits, misses, maxsize and currsize of encode_word's cache."""
+    return _decode_text.cache_info()
+
 
+def format_word(value, flags):
+    """Convert (value, flags) back into a signed word string such as +010007."""
+    sign = '-' if value < 0 or flags & NEG_ZERO else '+'
+    if flags & WIDE:
+        return f"{sign}{abs(value):06d}"
+    return f"{sign}{abs(value):04d}"
+
+
+def _value_page(count):
+    return array('i', bytes(4 * count))
+
+
+def _flag_page(count):
+    return bytearray([WIDE]) * count
+
+
+def _entry_page(count):
+    return [None] * count
+
+
+def _count_page(count):
+    return array('q', bytes(8 * count))
+
+
+class PagedArray:
+    """
+    Sequence of size items kept in pages of 1 << PAGE_BITS items; a page is
+    only allocated when one of its items is written, the others read as
+    default. make_page(count) returns a page of count default items (an
+    array, bytearray or list). Indexing, len() and slices work like on the
+    page type, so Memory can use it in place of one big array.
+    """
+
+    def __init__(self, size, default, make_page):
+        self.size = size
+        self.default = default
+        self.make_page = make_page
+        self.pages = {}  # page number -> page
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self.size)
+            items = self.make_page(max(0, stop - start))
+            for number, page in self.pages.items():
+                first = max(start, number << PAGE_BITS)
+                last = min(stop, (number + 1) << PAGE_BITS)
+                if first < last:
+                    offset = number << PAGE_BITS
+                    items[first - start:last - start] = page[first - offset:last - offset]
+            return items
+        if not 0 <= index < self.size:
+            raise IndexError("Memory address out of range")
+        page = self.pages.get(index >> PAGE_BITS)
+        return self.default if page is None else page[index & ((1 << PAGE_BITS) - 1)]
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            for i, value in zip(range(*index.indices(self.size)), item):
+                self[i] = value
+            return
+        if not 0 <= index < self.size:
+            raise IndexError("Memory address out of range")
+        page = self.pages.get(index >> PAGE_BITS)
+        if page is None:
+            if item == self.default:
+                return
+            page = self.pages[index >> PAGE_BITS] = self.make_page(1 << PAGE_BITS)
+        page[index & ((1 << PAGE_BITS) - 1)] = item
+
+    def touched(self, index):
+        """Whether the page holding index has been allocated."""
+        return index >> PAGE_BITS in self.pages
+
+    def end(self):
+        """Index just past the last allocated page (0 if none)."""
+        return min(self.size, (max(self.pages) + 1) << PAGE_BITS) if self.pages else 0
+
+    def copy(self):
+        paged = PagedArray(self.size, self.default, self.make_page)
+        paged.pages = {number: page[:] for number, page in self.pages.items()}
+        return paged
+
+
+class Memory:
+    """
+    Memory cells stored as an array('i') of values plus a bytearray of format
+    flags. Indexing with an address gives or takes the word as a string;
+    the interpreter works on .values/.flags directly.
+
+    Text that is not a valid word (e.g. typed into the editor) is kept in
+    .invalid (address -> text) and the cell's value reads as zero.
+
+    .decoded caches the (opcode, operand, handler) of each cell for the
+    interpreter; any write to a cell drops its entry. .dirty collects the
+    addresses written since the last take_dirty() so views can redraw
+    just those cells. .version is bumped by every write, so an unchanged
+    version means unchanged contents.
+
+    checkpoint() starts a journal: the first write to a cell after it saves
+    the cell's old contents in .journal, so restore() only has to put back
+    the cells written since.
+
+    Memories of more than PAGED_MEMORY cells keep .values, .flags and
+    .decoded in PagedArrays, so only the pages that were written take up
+    space; work that would visit every cell (clear, saving, running off
+    the end) skips the untouched pages.
+    """
+
+    def __init__(self, size=MEMORY_SIZE):
+        if size > PAGED_MEMORY:
+            self.values = PagedArray(size, 0, _value_page)
+            self.flags = PagedArray(size, WIDE, _flag_page)
+            self.decoded = PagedArray(size, None, _entry_page)
+        else:
+            self.values = _value_page(size)
+            self.flags = _flag_page(size)
+            self.decoded = _entry_page(size)
+        self.invalid = {}
+        self.dirty = set()
+        self.version = 0
+        self.journal = None  # address -> (value, flags, invalid text) saved since the last checkpoint
+        self._journals = []
+
+    @classmethod
+    def from_dict(cls, words):
+        """Build a memory from a {"000": "+000000", ...} dict."""
+        addresses = [int(key) for key in words if key.isdigit()]
+        memory = cls(max(addresses) + 1 if addresses else 0)
+        for key, word in words.items():
+            if key.isdigit():
+                memory[int(key)] = word
+        return memory
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def paged(self):
+        return isinstance(self.values, PagedArray)
+
+    @property
+    def address_width(self):
+        """Digits needed to show every address, at least 3 (000-249)."""
+        return max(3, len(str(len(self.values) - 1)))
+
+    def __contains__(self, address):
+        return 0 <= address < len(self.values)
+
+    def __getitem__(self, address):
+        if address in self.invalid:
+            return self.invalid[address]
+        return format_word(self.values[address], self.flags[address])
+
+    def __setitem__(self, address, word):
+        if not 0 <= address < len(self.values):
+            raise IndexError(f"Memory address out of range: {address}")
+        if self.journal is not None:
+            self.save(address)
+        try:
+            value, flags = encode_word(word)
+        except Exception:
+            self.invalid[address] = word
+            value, flags = 0, WIDE
+        else:
+            self.invalid.pop(address, None)
+        self.values[address] = value
+        self.flags[address] = flags
+        self.decoded[address] = None
+        self.dirty.add(address)
+        self.version += 1
+
+    def used(self):
+        """Addresses of every cell that may not be +000000 (all of them unless paged)."""
+        if not self.paged:
+            return range(len(self.values))
+        pages = self.values.pages.keys() | self.flags.pages.keys()
+        used = [address for number in sorted(pages)
+                for address in range(number << PAGE_BITS, min(len(self.values), (number + 1) << PAGE_BITS))]
+        return used + [address for address in self.invalid if address >> PAGE_BITS not in pages]
+
+    def used_length(self):
+        """Number of cells up to and including the last one that is not +000000."""
+        values, flags, invalid = self.values, self.flags, self.invalid
+        length = len(values)
+        if self.paged:
+            length = max(values.end(), flags.end(), max(invalid, default=-1) + 1)
+        while length and values[length - 1] == 0 and flags[length - 1] == WIDE and length - 1 not in invalid:
+            length -= 1
+        return length
+
+    def skip_empty(self, address):
+        """The first address from address on whose cell is not +000000, or len(self) if there is none."""
+        values, flags, invalid = self.values, self.flags, self.invalid
+        size = len(values)
+        paged = self.paged
+        while address < size:
+            if paged and not values.touched(address) and not flags.touched(address):
+                end = min(size, (address >> PAGE_BITS) + 1 << PAGE_BITS)
+                if not any(address <= marked < end for marked in invalid):
+                    address = end  # nothing was written to this page
+                    continue
+            if values[address] or flags[address] != WIDE or address in invalid:
+                break
+            address += 1
+        return address
+
+    def clear(self):
+        """Reset every cell to +000000."""
+        size = len(self.values)
+        used = self.used()
+        if self.journal is not None:
+            for address in used:
+                self.save(address)
+        if self.paged:
+            for store in (self.values, self.flags, self.decoded):
+                store.pages.clear()
+        else:
+            self.values[:] = _value_page(size)
+            self.flags[:] = _flag_page(size)
+            self.decoded[:] = _entry_page(size)
+        self.invalid.clear()
+        self.dirty.update(used)
+        self.version += 1
+
+    def copy(self):
+        memory = Memory(0)
+        if self.paged:
+            memory.values, memory.flags, memory.decoded = self.values.copy(), self.flags.copy(), self.decoded.copy()
+        else:
+            memory.values = array('i', self.values)
+            memory.flags = bytearray(self.flags)
+            memory.decoded = list(self.decoded)
+        memory.invalid = dict(self.invalid)
+        return memory
+
+    def save(self, address):
+        """Journal the cell's contents unless it was already saved since the last checkpoint."""
+        if address not in self.journal:
+            self.journal[address] = (self.values[address], self.flags[address], self.invalid.get(address))
+
+    def checkpoint(self):
+        """Mark the current contents so restore() can return to them. O(1); returns the checkpoint."""
+        self.journal = {}
+        self._journals.append(self.journal)
+        return self.journal
+
+    def restore(self, checkpoint):
+        """
+        Put back every cell written since checkpoint was taken and return their
+        addresses (also added to .dirty). Checkpoints taken after it are
+        discarded; it stays valid for another restore.
+        """
+        for index in range(len(self._journals) - 1, -1, -1):
+            if self._journals[index] is checkpoint:
+                break
+        else:
+            raise ValueError("Checkpoint is no longer valid")
+
+        restored = set()
+        for journal in reversed(self._journals[index:]):  # newest first, so older saves win
+            for address, (value, flags, text) in journal.items():
+                self.values[address] = value
+                self.flags[address] = flags
+                if text is None:
+                    self.invalid.pop(address, None)
+                else:
+                    self.invalid[address] = text
+                self.decoded[address] = None
+                restored.add(address)
+        del self._journals[index + 1:]
+        checkpoint.clear()
+        self.journal = checkpoint
+        self.dirty |= restored
+        self.version += 1
+        return restored
+
+    def take_dirty(self):
+        """Return the addresses written since the last call and start a new set."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def errors(self):
+        """
+        Return "NNN: error" for every cell holding text that is not a word, by
+        address. Writes keep .invalid up to date, so this only looks at those
+        cells.
+        """
+        errors = []
+        for address in sorted(self.invalid):
+            try:
+                encode_word(self.invalid[address])
+            except Exception as e:
+                errors.append(f"{address:03d}: {str(e)}")
+        return errors
+
+    def to_dict(self):
+        """Return the memory as a {"000": "+000000", ...} dict of strings."""
+        return {f"{i:03d}": self[i] for i in range(len(self.values))}
+
+
+def _input_word(input):
+    """Turn READ input text into the signed four-digit word it stores (last 4 digits kept)."""
     input = input.strip()  # Remove whitespace
 
     if not input:  # Check for empty string
         raise ValueError("Empty input for READ instruction")
 
-    address = tuple[1].zfill(3)  # Normalize to 3 digits for 250 memory locations
-
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in READ: {tuple[1]}")
-
     length = len(input)
 
     if input[0] == "+" or input[0] == "-":
         if length > 5:
             input = input[0] + input[length - 4:]
-            _programMemory[address] = input
-        elif length == 5:
-            _programMemory[address] = input
-        else:
+        elif length < 5:
             input = input[0] + ("0" * (5 - length)) + input[1:]
-            _programMemory[address] = input
     else:
         if length > 4:
             input = "+" + input[length - 4:]
-            _programMemory[address] = input
-        elif length == 4:
-            input = "+" + input
-            _programMemory[address] = input
         else:
             input = "+" + ("0" * (4 - length)) + input
-            _programMemory[address] = input
 
+    return input
 
-def write(tuple):
-    """Write value from memory at given address."""
-    _, address, _ = tuple
 
-    # Normalize address to 3 digits
-    address = address.zfill(3)
+def _bad_address(name, operand, quoted=True):
+    """Error raised when an instruction's operand is not a memory address."""
+    if quoted:
+        return ValueError(f"Invalid memory address in {name}: '{operand}'")
+    return ValueError(f"Invalid memory address in {name}: {operand}")
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in WRITE: {tuple[1]}")
 
-    # Executes write instruction
-    return _programMemory[address]
+# --- Execution budgets ---
+class _ReadLimit(Exception):
+    """Raised by a read_input wrapped with _limit_reads once its READs are used up."""
 
 
-def load(tuple):
-    """Load value from memory into accumulator."""
-    global _accumulator
-    global _programMemory
+class Budget:
+    """
+    The limits of one run, kept across the execute() calls that continue it
+    (e.g. after a breakpoint): max_steps and max_reads count every
+    instruction and READ of the run, the timeout runs from when the Budget
+    was made and the loop detector keeps the states it has seen.
+    """
 
-    # Normalize address to 3 digits
-    address = tuple[1].zfill(3)
+    def __init__(self, max_steps=None, timeout=None, max_reads=None, detect_loops=False):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_reads = max_reads
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+        self.loops = _LoopDetector() if detect_loops else None
+        self.steps = 0  # instructions run so far
+        self.reads = 0  # READs so far
+        self.next_check = _BUDGET_CHECK_STEPS  # step count at which the clock and loops are checked next
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in LOAD: '{tuple[1]}'")
 
-    _accumulator = _programMemory[address]
-    return
+def _limit_reads(read_input, budget):
+    """Wrap read_input so that READ number budget.max_reads + 1 raises _ReadLimit."""
+    def limited():
+        if budget.reads >= budget.max_reads:
+            raise _ReadLimit()
+        budget.reads += 1
+        return read_input()
+    return limited
 
 
-def store(tuple):
-    """Store accumulator value into memory."""
-    global _accumulator
-    global _programMemory
+class _LoopDetector:
+    """
+    Spots a run that can never end. The machine has no other state than its
+    registers and memory, so if it comes back to the same program counter
+    and accumulator with no memory write in between (same write version), it
+    will repeat the same steps forever. States are hashed into a set that is
+    emptied whenever memory was written.
+    """
 
-    # Normalize address to 3 digits
-    address = tuple[1].zfill(3)
+    def __init__(self):
+        self.version = None
+        self.seen = set()
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in STORE: '{tuple[1]}'")
+    def stuck(self, pc, acc, acc_flags, version):
+        """Record the state; True if it was already seen at the same memory version."""
+        if version != self.version or len(self.seen) >= _LOOP_STATES:
+            self.version = version
+            self.seen.clear()
+        state = (pc, acc, acc_flags)
+        if state in self.seen:
+            return True
+        self.seen.add(state)
+        return False
 
-    _programMemory[address] = _accumulator
-    return
 
+# A machine's state at a checkpoint: the memory checkpoint plus the registers
+# and, optionally, how many READ inputs had been consumed.
+Snapshot = namedtuple("Snapshot", "checkpoint acc acc_flags program_counter input_position")
 
-def add(tuple):
-    """
-    Add the value stored in memory at the given address to the accumulator.
-    Result is stored back in the accumulator.
-    """
-    global _accumulator
-    _, address, _ = tuple
 
-    # Normalize address to 3 digits
-    address = address.zfill(3)
+# --- Breakpoints, watchpoints and accumulator conditions ---
+# A stop in a run: kind is "break" (before the instruction at line runs),
+# "read"/"write" (line accessed the watched cell address) or "accumulator"
+# (line made the condition, kept in address, come true).
+Hit = namedtuple("Hit", "kind line address")
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in ADD: '{tuple[1]}'")
+_CONDITION_PATTERN = re.compile(r'\s*(==|!=|<=|>=|<|>)\s*([+-]?\d+)\s*')
+_COMPARE = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+            ">": operator.gt, ">=": operator.ge}
 
-    acc_val = int(_accumulator)
-    mem_val = int(_programMemory[address])
 
-    result = acc_val + mem_val
+class Breakpoints:
+    """
+    What a run should stop at: program counter breakpoints, memory watchpoints
+    on reads or writes of a cell, and accumulator conditions such as "< 0"
+    that stop the run when a step makes them come true.
 
-    _accumulator = _overflow_value(result)
-    return
+    A Breakpoints is false while nothing is armed, and execute() only looks
+    at machine.breakpoints when it is true, so an empty one costs nothing.
+    The last stop is kept in .hit.
+    """
 
+    def __init__(self):
+        self.pcs = set()
+        self.reads = set()
+        self.writes = set()
+        self.conditions = []  # (operator text, value)
+        self.hit = None
+
+    def __bool__(self):
+        return bool(self.pcs or self.reads or self.writes or self.conditions)
+
+    def toggle(self, address):
+        """Set or clear the breakpoint at address; returns whether it is now set."""
+        if address in self.pcs:
+            self.pcs.discard(address)
+            return False
+        self.pcs.add(address)
+        return True
+
+    def watch(self, address, read=False, write=True):
+        """Stop after an instruction reads and/or writes the cell at address."""
+        (self.reads.add if read else self.reads.discard)(address)
+        (self.writes.add if write else self.writes.discard)(address)
+
+    def add_condition(self, text):
+        """Add an accumulator condition written like "< 0" or "== +0100"; returns it as (operator, value)."""
+        match = _CONDITION_PATTERN.fullmatch(text)
+        if not match:
+            raise ValueError(f"Invalid accumulator condition: '{text.strip()}'")
+        condition = (match.group(1), int(match.group(2)))
+        if condition not in self.conditions:
+            self.conditions.append(condition)
+        return condition
+
+    def clear(self):
+        self.pcs.clear()
+        self.reads.clear()
+        self.writes.clear()
+        self.conditions.clear()
+
+    def check(self, machine, line, opcode, operand, acc):
+        """
+        Look at the step machine just ran from line (the accumulator was acc
+        before it); returns the Hit it triggers, or None.
+        """
+        if opcode in _CELL_WRITES:
+            if operand in self.writes:
+                return Hit("write", line, operand)
+        elif opcode in _CELL_READS:
+            if operand in self.reads:
+                return Hit("read", line, operand)
+        if self.conditions and machine.acc != acc:
+            for condition in self.conditions:
+                compare = _COMPARE[condition[0]]
+                if compare(machine.acc, condition[1]) and not compare(acc, condition[1]):
+                    return Hit("accumulator", line, f"{condition[0]} {condition[1]}")
+        return None
+
+
+def describe_hit(hit):
+    """Status line for a Hit."""
+    if hit.kind == "break":
+        return f"Breakpoint at line {hit.line:03d}"
+    if hit.kind == "accumulator":
+        return f"Accumulator condition {hit.address} met at line {hit.line:03d}"
+    return f"Watchpoint: line {hit.line:03d} {'wrote' if hit.kind == 'write' else 'read'} cell {hit.address:03d}"
+
+
+# --- Execution profile ---
+PROFILE_FIELDS = ["address", "word", "executions", "taken", "not_taken", "reads", "writes"]
+
+
+class Profile:
+    """
+    Where runs spend their time, counted in flat integer arrays indexed by
+    address: how often each instruction ran, how often each branch was taken
+    or not, and how often instructions read or wrote each cell; .opcodes
+    counts executions per opcode. Set machine.profile to collect one; the
+    counts add up over runs.
+
+    Like Memory, profiles of more than PAGED_MEMORY addresses keep their
+    counts in PagedArrays, so only the pages of addresses that were counted
+    take up space.
+    """
 
-def subtract(tuple):
+    def __init__(self, size=MEMORY_SIZE):
+        def counts():
+            return PagedArray(size, 0, _count_page) if size > PAGED_MEMORY else _count_page(size)
+        self.executions = counts()
+        self.taken = counts()
+        self.not_taken = counts()
+        self.reads = counts()
+        self.writes = counts()
+        self.opcodes = _count_page(1000)  # six-digit words have three-digit opcodes
+
+    def record(self, machine, pc, opcode, operand):
+        """Count the instruction at pc, which machine is about to execute."""
+        self.executions[pc] += 1
+        self.opcodes[opcode] += 1
+        if opcode in _CELL_READS:
+            if type(operand) is int:
+                self.reads[operand] += 1
+        elif opcode in _CELL_WRITES:
+            if type(operand) is int:
+                self.writes[operand] += 1
+        elif opcode == BRANCH:
+            self.taken[pc] += 1
+        elif opcode in (BRANCHNEG, BRANCHZERO):
+            if machine.acc < 0 if opcode == BRANCHNEG else machine.acc == 0:
+                self.taken[pc] += 1
+            else:
+                self.not_taken[pc] += 1
+
+    @property
+    def steps(self):
+        return sum(self.opcodes)  # every execution is counted once per opcode as well
+
+    def used(self):
+        """Addresses whose counts may not all be zero (all of them unless paged)."""
+        size = len(self.executions)
+        if not isinstance(self.executions, PagedArray):
+            return range(size)
+        pages = set().union(*(counts.pages for counts in (self.executions, self.taken, self.not_taken,
+                                                          self.reads, self.writes)))
+        return [address for number in sorted(pages)
+                for address in range(number << PAGE_BITS, min(size, (number + 1) << PAGE_BITS))]
+
+    def hottest(self, count):
+        """The count addresses that ran most often, as (address, runs) pairs with the most runs first."""
+        executions = self.executions
+        hottest = heapq.nlargest(count, self.used(), key=executions.__getitem__)
+        return [(address, executions[address]) for address in hottest if executions[address]]
+
+    def rows(self, memory=None):
+        """One dict (PROFILE_FIELDS keys) per address that ran or was accessed, with its word if memory is given."""
+        rows = []
+        for address in self.used():
+            counts = (self.executions[address], self.taken[address], self.not_taken[address],
+                      self.reads[address], self.writes[address])
+            if any(counts):
+                word = memory[address] if memory is not None and address in memory else ""
+                rows.append(dict(zip(PROFILE_FIELDS, (f"{address:03d}", word) + counts)))
+        return rows
+
+    def opcode_counts(self):
+        """Executions per opcode, by mnemonic (unknown opcodes by number)."""
+        return {OPCODES[code].mnemonic if code in OPCODES else f"{code:02d}": count
+                for code, count in enumerate(self.opcodes) if count}
+
+    def to_dict(self, memory=None):
+        return {"steps": self.steps, "opcodes": self.opcode_counts(), "addresses": self.rows(memory)}
+
+
+def write_profile(profile, path, memory=None):
+    """Write a Profile as JSON, or as CSV (one row per address) when path ends in .csv."""
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS)
+            writer.writeheader()
+            writer.writerows(profile.rows(memory))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(memory), f, indent=2)
+
+
+# --- Undo log for reverse execution ---
+class History:
     """
-    Subtract the value stored in memory from the accumulator.
-    Result is stored back in the accumulator.
+    Bounded undo log of the steps a machine executed, for stepping backwards.
+    Each step is one fixed-size record in a ring buffer of flat arrays: the
+    program counter and accumulator before the step and the old contents of
+    the one cell a READ or STORE overwrote (address -1 if none). Once
+    capacity steps are logged the oldest ones are overwritten, so a long run
+    costs at most capacity * 18 bytes.
+
+    Step numbers count from the start of logging: end is the current step
+    and start the oldest one that can still be returned to. The rare cell
+    that held invalid text, and the input position before each READ when
+    inputs (an InputChannel) is given, are kept in dicts keyed by step.
     """
-    global _accumulator
-    _, address, _ = tuple
 
-    # Normalize address to 3 digits
-    address = address.zfill(3)
+    def __init__(self, capacity=HISTORY_STEPS, inputs=None):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.inputs = inputs
+        self.pcs = array('i')
+        self.accs = array('i')
+        self.acc_flags = bytearray()
+        self.addresses = array('i')
+        self.values = array('i')
+        self.flags = bytearray()
+        self.texts = {}  # step -> invalid text of the overwritten cell
+        self.reads = {}  # step -> input position before the READ
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def record(self, machine, pc, opcode, operand):
+        """Log the state before machine executes the instruction at pc."""
+        step = self.end
+        if step - self.start == self.capacity:  # full: drop the oldest record
+            if self.texts:
+                self.texts.pop(self.start, None)
+            if self.reads:
+                self.reads.pop(self.start, None)
+            self.start += 1
+        memory = machine.memory
+        if opcode in _CELL_WRITES and type(operand) is int:
+            address, value, flags = operand, memory.values[operand], memory.flags[operand]
+        else:
+            address, value, flags = -1, 0, 0
+        slot = step % self.capacity
+        if slot == len(self.pcs):
+            self.pcs.append(pc)
+            self.accs.append(machine.acc)
+            self.acc_flags.append(machine.acc_flags)
+            self.addresses.append(address)
+            self.values.append(value)
+            self.flags.append(flags)
+        else:
+            self.pcs[slot] = pc
+            self.accs[slot] = machine.acc
+            self.acc_flags[slot] = machine.acc_flags
+            self.addresses[slot] = address
+            self.values[slot] = value
+            self.flags[slot] = flags
+        if memory.invalid and address in memory.invalid:
+            self.texts[step] = memory.invalid[address]
+        if opcode == READ and self.inputs is not None:
+            self.reads[step] = self.inputs.position
+        self.end = step + 1
+
+    def discard(self):
+        """Forget the newest record (its instruction failed without changing anything)."""
+        self.end -= 1
+        self.texts.pop(self.end, None)
+        self.reads.pop(self.end, None)
+
+    def undo(self, machine):
+        """Undo the newest step on machine; returns the address of the cell put back, or None."""
+        machine.memory.version += 1  # the run went back: states after this are not repeats
+        self.end = step = self.end - 1
+        slot = step % self.capacity
+        machine.acc, machine.acc_flags = self.accs[slot], self.acc_flags[slot]
+        machine.program_counter = self.pcs[slot]
+        if self.reads and step in self.reads:
+            self.inputs.seek(self.reads.pop(step))
+        address = self.addresses[slot]
+        if address < 0:
+            return None
+
+        memory = machine.memory
+        if memory.journal is not None:
+            memory.save(address)
+        memory.values[address] = self.values[slot]
+        memory.flags[address] = self.flags[slot]
+        text = self.texts.pop(step, None) if self.texts else None
+        if text is None:
+            memory.invalid.pop(address, None)
+        else:
+            memory.invalid[address] = text
+        memory.decoded[address] = None
+        memory.dirty.add(address)
+        return address
+
+    def last_write(self, address):
+        """Number of the newest logged step that wrote address, or None."""
+        addresses = self.addresses
+        for step in range(self.end - 1, self.start - 1, -1):
+            if addresses[step % self.capacity] == address:
+                return step
+        return None
+
+
+# --- Machine: registers and memory of one running program ---
+class Machine:
+    """
+    A self-contained UVSim machine. Each instance owns its accumulator,
+    program counter and memory, so several programs can run side by side
+    (threads, tabs, worker processes). The module-level functions below
+    operate on a Machine wrapped around the legacy globals.
+
+    Registers are plain integers: acc/acc_flags hold the accumulator value
+    and its format flags, program_counter the address of the next word.
+    A new memory has memory_size cells (see Memory for large sizes).
+    """
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in SUBTRACT: '{tuple[1]}'")
+    def __init__(self, memory=None, accumulator="+000000", program_counter=0, memory_size=MEMORY_SIZE):
+        self.memory = memory if memory is not None else Memory(memory_size)
+        self.accumulator = accumulator
+        self.program_counter = program_counter
+        self.steps = 0  # instructions executed by the last execute()
+        self.history = None  # History logging every executed step, for step_back()
+        self.breakpoints = None  # Breakpoints the run stops at
+        self.profile = None  # Profile counting every executed step
+
+    @property
+    def accumulator(self):
+        """The accumulator as a signed word string."""
+        return format_word(self.acc, self.acc_flags)
+
+    @accumulator.setter
+    def accumulator(self, word):
+        self.acc, self.acc_flags = encode_word(word)
+
+    def load_program(self, program):
+        """
+        Clear memory and registers and place the words of program from address
+        000. program may also be the bytes of a binary image (see load_image).
+        """
+        if isinstance(program, (bytes, bytearray, memoryview)):
+            self.load_image(program)
+            return
+        self.memory.clear()
+        for i, line in enumerate(program):
+            self.memory[i] = line
+        for i in range(len(program)):
+            self._decode(i)
+        self.accumulator = "+000000"
+        self.program_counter = 0
+
+    def checkpoint(self, inputs=None):
+        """
+        Take a Snapshot of the machine in O(1): memory is journaled from here
+        on rather than copied. inputs is an optional InputChannel whose read
+        position is saved too.
+        """
+        return Snapshot(self.memory.checkpoint(), self.acc, self.acc_flags, self.program_counter,
+                        inputs.position if inputs is not None else None)
+
+    def restore(self, snapshot, inputs=None):
+        """
+        Return to a Snapshot; the work is proportional to the memory cells
+        written since it was taken. Returns the restored addresses.
+        """
+        restored = self.memory.restore(snapshot.checkpoint)
+        self.acc, self.acc_flags = snapshot.acc, snapshot.acc_flags
+        self.program_counter = snapshot.program_counter
+        if inputs is not None and snapshot.input_position is not None:
+            inputs.seek(snapshot.input_position)
+        return restored
+
+    def _logged_history(self):
+        if self.history is None:
+            raise ValueError("No history is being recorded")
+        return self.history
+
+    def step_back(self, count=1):
+        """Undo the last count executed steps. Returns the addresses of the cells put back."""
+        history = self._logged_history()
+        if count > len(history):
+            raise ValueError(f"Only {len(history)} step(s) can be undone")
+        restored = set()
+        for _ in range(count):
+            address = history.undo(self)
+            if address is not None:
+                restored.add(address)
+        return restored
+
+    def goto_step(self, step):
+        """Go back to the state after step steps (see History for the numbering)."""
+        history = self._logged_history()
+        if not history.start <= step <= history.end:
+            raise ValueError(f"Step {step} is not in the history (steps {history.start}-{history.end})")
+        return self.step_back(history.end - step)
+
+    def rewind_to_write(self, address):
+        """Go back to just before the last logged READ or STORE into address."""
+        step = self._logged_history().last_write(address)
+        if step is None:
+            raise ValueError(f"No write to cell {address:03d} in the history")
+        return self.goto_step(step)
+
+    def load_image(self, source):
+        """Clear the registers and load a binary program image (path or bytes, see load_image)."""
+        load_image(source, self.memory)
+        self.accumulator = "+000000"
+        self.program_counter = 0
+
+    def _address(self, operand):
+        """Memory address named by an operand string, or None if it is not one."""
+        address = operand.zfill(3)  # Normalize to 3 digits
+        if not address.isdigit() or int(address) not in self.memory:
+            return None
+        return int(address)
+
+    # Instruction API: each method takes a parsed (opcode, operand, word) tuple.
+    def read(self, tuple, input):
+        """Read input and store in memory at given address."""
+        if input is None:
+            raise ValueError("No input provided for READ instruction")
+
+        address = self._address(tuple[1])
+        if input.strip() and address is None:
+            raise _bad_address("READ", tuple[1], quoted=False)
+        self._read(address, input)
+
+    def write(self, tuple):
+        """Write value from memory at given address."""
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("WRITE", tuple[1], quoted=False)
+        return self.memory[address]
+
+    def load(self, tuple):
+        """Load value from memory into accumulator."""
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("LOAD", tuple[1])
+        self._load(address)
+
+    def store(self, tuple):
+        """Store accumulator value into memory."""
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("STORE", tuple[1])
+        self._store(address)
+
+    def add(self, tuple):
+        """
+        Add the value stored in memory at the given address to the accumulator.
+        Result is stored back in the accumulator.
+        """
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("ADD", tuple[1])
+        self._add(address)
+
+    def subtract(self, tuple):
+        """
+        Subtract the value stored in memory from the accumulator.
+        Result is stored back in the accumulator.
+        """
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("SUBTRACT", tuple[1])
+        self._subtract(address)
+
+    def multiply(self, tuple):
+        """
+        Multiply the value in the accumulator by the value stored in memory.
+        Result is stored back in the accumulator.
+        """
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("MULTIPLY", tuple[1])
+        self._multiply(address)
+
+    def divide(self, tuple):
+        """
+        Divide the value in the accumulator by the value stored in memory.
+        Result is stored back in the accumulator.
+        This currently uses floor division.
+        """
+        address = self._address(tuple[1])
+        if address is None:
+            raise _bad_address("DIVIDE", tuple[1])
+        self._divide(address)
+
+    def branch(self, tuple):
+        """Unconditional branch: always set PC to operand."""
+        address = tuple[1]
 
-    acc_val = int(_accumulator)
-    mem_val = int(_programMemory[address])
+        # Validate address range (0-249 for 250 memory locations)
+        if not address.isdigit() or int(address) not in self.memory:
+            raise ValueError(f"Invalid branch address: '{address}'")
 
-    result = acc_val - mem_val
+        self.program_counter = int(address)
 
-    _accumulator = _overflow_value(result)
-    return
+    def branchneg(self, tuple):
+        """Branch if accumulator is negative."""
+        old_pc = self.program_counter
+        try:
+            if self.acc < 0:
+                address = tuple[1]
+                if not address.isdigit() or int(address) not in self.memory:
+                    raise ValueError(f"Invalid branch address: '{address}'")
+                self.program_counter = int(address)
+        except ValueError:
+            raise ValueError(f"Invalid accumulator value: {self.accumulator}")
+        return self.program_counter != old_pc
+
+    def branchzero(self, tuple):
+        """Branch if accumulator is zero."""
+        old_pc = self.program_counter
+
+        if self.acc == 0:
+            address = tuple[1]
+            if not address.isdigit() or int(address) not in self.memory:
+                raise ValueError(f"Invalid branch address: '{address}'")
+            self.program_counter = int(address)
+        return self.program_counter != old_pc
+
+    # Integer operations: the address has already been checked against memory.
+    def _read(self, address, input):
+        self.memory[address] = _input_word(input)
+
+    def _load(self, address):
+        self.acc = self.memory.values[address]
+        self.acc_flags = self.memory.flags[address]
+
+    def _store(self, address):
+        memory = self.memory
+        if memory.journal is not None:
+            memory.save(address)
+        memory.values[address] = self.acc
+        memory.flags[address] = self.acc_flags
+        memory.decoded[address] = None
+        memory.dirty.add(address)
+        memory.version += 1
+        if memory.invalid:
+            memory.invalid.pop(address, None)
+
+    def _add(self, address):
+        self.acc, self.acc_flags = _overflow(self.acc + self.memory.values[address])
+
+    def _subtract(self, address):
+        self.acc, self.acc_flags = _overflow(self.acc - self.memory.values[address])
+
+    def _multiply(self, address):
+        self.acc, self.acc_flags = _overflow(self.acc * self.memory.values[address])
+
+    def _divide(self, address):
+        mem_val = self.memory.values[address]
+        if mem_val == 0:  # Prevents a division by 0 error
+            raise ValueError("Division by zero error")
+        self.acc, self.acc_flags = _overflow(self.acc // mem_val)
+
+    # Handlers used by execute: called as handler(machine, operand), a true
+    # result means the handler moved the program counter itself.
+    def _op_read(self, operand):
+        self._message("Please enter a number...: ")
+        text = self._read_input()
+        if text is None:
+            raise ValueError("No input provided for READ instruction")
+        if isinstance(operand, str) and text.strip():
+            raise ValueError(operand)  # address outside memory
+        self._read(operand, text)
+
+    def _op_write(self, operand):
+        self._write_output(self.memory[operand])
+
+    def _op_branch(self, operand):
+        if operand >= len(self.memory.values):
+            raise ValueError(f"Invalid branch address: '{operand:03d}'")
+        self.program_counter = operand
+        return True
+
+    def _op_branchneg(self, operand):
+        if self.acc < 0:
+            if operand >= len(self.memory.values):
+                raise ValueError(f"Invalid accumulator value: {self.accumulator}")
+            jumped = operand != self.program_counter
+            self.program_counter = operand
+            return jumped
+
+    def _op_branchzero(self, operand):
+        if self.acc == 0:
+            if operand >= len(self.memory.values):
+                raise ValueError(f"Invalid branch address: '{operand:03d}'")
+            jumped = operand != self.program_counter
+            self.program_counter = operand
+            return jumped
+
+    def _op_halt(self, operand):
+        """HALT is handled by the run loop itself."""
+
+    def _op_unknown(self, operand):
+        self._message(f"Warning: Unknown opcode '{operand}' at line {self.program_counter:03d}")
+
+    def _op_raise(self, operand):
+        raise ValueError(operand)
+
+    def _decode(self, address):
+        """
+        Decode the word at address into an (opcode, operand, handler) entry and
+        cache it in memory.decoded. Empty cells get handler None; text that is
+        not a word gets opcode None and the parse error as operand.
+        """
+        memory = self.memory
+        if address in memory.invalid:
+            try:
+                encode_word(memory.invalid[address])
+            except Exception as e:
+                entry = (None, str(e), None)
+        else:
+            entry = decode_word(memory.values[address], memory.flags[address], len(memory))
+        memory.decoded[address] = entry
+        return entry
+
+    def execute(self, read_input, write_output, message=print, on_step=None, max_steps=None, timeout=None,
+                start=None, max_reads=None, detect_loops=False, budget=None):
+        """
+        Run the program in memory starting at address 000, or at start to
+        continue a run that stopped (if a breakpoint at start stopped it, it
+        does not fire again right away).
+
+        read_input() returns the raw text for a READ (or None when no input is left),
+        write_output(word) receives every WRITE and message(text) receives status
+        lines. on_step, if given, is called after every executed instruction
+        and may move the machine, e.g. with step_back(); the run goes on from
+        the program counter it leaves. Every step is logged in self.history
+        and counted in self.profile if they are set. self.breakpoints is
+        looked at again after every on_step call, so breakpoints set while
+        on_step pauses the run stop it from the next step on; without
+        on_step they are read once when the run starts.
+
+        Budgets: max_steps caps the number of instructions executed (the
+        count is left in self.steps), timeout the wall time in seconds and
+        max_reads the number of READs. detect_loops stops a run that has
+        provably entered an endless loop (see _LoopDetector); it is checked
+        every _BUDGET_CHECK_STEPS steps, so it costs nothing per step. To
+        continue a run under the same limits, pass the Budget it started with
+        as budget instead (the other budget arguments are then ignored);
+        self.steps counts the steps of this call only.
+
+        Returns the halt reason: "halted" (HALT), "finished" (ran off the end of
+        memory), "error" (parse or runtime error), "limit" (max_steps or
+        max_reads reached), "timeout", "loop" (endless loop detected) or
+        "break" (stopped by self.breakpoints, see its .hit).
+        """
+        memory = self.memory
+        decoded = memory.decoded
+        size = len(memory)
+        history = self.history
+        profile = self.profile
+        breaks = self.breakpoints or None  # nothing armed: no checks at all
+        # Continuing from the breakpoint that stopped the last run passes it
+        resume_at = start if breaks is not None and breaks.hit == ("break", start, None) else None
+        if budget is None:
+            budget = Budget(max_steps, timeout, max_reads, detect_loops)
+        if budget.max_reads is not None:
+            read_input = _limit_reads(read_input, budget)
+        self._read_input, self._write_output, self._message = read_input, write_output, message
+        self.program_counter = pc = start or 0
+        reason = "finished"
+
+        # Budgets are checked every _BUDGET_CHECK_STEPS steps at most; steps counts the whole run
+        steps = first_step = budget.steps
+        limit = budget.max_steps if budget.max_steps is not None else float("inf")
+        deadline = budget.deadline
+        loops = budget.loops
+        check_at = min(limit, budget.next_check) if deadline is not None or loops is not None else limit
 
+        try:
+            while pc < size:
+                opcode, operand, handler = decoded[pc] or self._decode(pc)
+
+                if handler is None:
+                    if opcode is None:
+                        message(f"Parse Error at line {pc:03d}: {operand}")
+                        message("Program halted")
+                        return "error"
+                    # Skip empty memory
+                    self.program_counter = pc = memory.skip_empty(pc + 1)
+                    continue
+
+                if steps >= check_at:
+                    if steps >= limit:
+                        message(f"Program stopped: instruction limit of {budget.max_steps} reached at line {pc:03d}")
+                        return "limit"
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        message(f"Program stopped: time limit of {budget.timeout}s reached at line {pc:03d}")
+                        return "timeout"
+                    if loops is not None and loops.stuck(pc, self.acc, self.acc_flags, memory.version):
+                        message(f"Program stopped: endless loop detected at line {pc:03d}")
+                        return "loop"
+                    budget.next_check = steps + _BUDGET_CHECK_STEPS
+                    check_at = min(limit, budget.next_check)
+
+                if breaks is not None:
+                    if pc in breaks.pcs and pc != resume_at:
+                        breaks.hit = Hit("break", pc, None)
+                        message(describe_hit(breaks.hit))
+                        return "break"
+                    resume_at = None
+                    acc = self.acc
+
+                steps += 1
+                if history is not None:
+                    history.record(self, pc, opcode, operand)
+                if profile is not None:
+                    profile.record(self, pc, opcode, operand)
+
+                if opcode == HALT:
+                    message("Program halted normally")
+                    reason = "halted"
+                    break
+
+                # Execute instruction with error handling
+                try:
+                    if not handler(self, operand):
+                        self.program_counter += 1
+                except RunStopped:
+                    if history is not None:
+                        history.discard()
+                    raise
+                except _ReadLimit:
+                    if history is not None:
+                        history.discard()
+                    message(f"Program stopped: input limit of {budget.max_reads} READs reached at line {pc:03d}")
+                    return "limit"
+                except Exception as e:
+                    if history is not None:
+                        history.discard()
+                    message(f"Runtime Error at line {pc:03d}: {str(e)}")
+                    message("Program halted")
+                    return "error"
+
+                if on_step:
+                    on_step()
+
+                if breaks is not None:
+                    hit = breaks.check(self, pc, opcode, operand, acc)
+                    if hit is not None:
+                        breaks.hit = hit
+                        message(describe_hit(hit))
+                        return "break"
+                if on_step:
+                    breaks = self.breakpoints or None  # may have been set while on_step paused the run
+
+                pc = self.program_counter
+        finally:
+            self._read_input = self._write_output = self._message = None
+            self.steps = steps - first_step
+            budget.steps = steps
+
+        message("Program finished")
+        return reason
+
+
+# --- Opcode registry: the one place that defines the instruction set ---
+# operand is "address" (a memory cell), "target" (a branch destination) or
+# None; branches tells whether the instruction can change the program counter.
+Opcode = namedtuple("Opcode", "code mnemonic handler operand branches")
+
+READ, WRITE, LOAD, STORE = 10, 11, 20, 21
+ADD, SUBTRACT, DIVIDE, MULTIPLY = 30, 31, 32, 33
+BRANCH, BRANCHNEG, BRANCHZERO, HALT = 40, 41, 42, 43
+
+OPCODES = {op.code: op for op in (
+    Opcode(READ, "READ", Machine._op_read, "address", False),
+    Opcode(WRITE, "WRITE", Machine._op_write, "address", False),
+    Opcode(LOAD, "LOAD", Machine._load, "address", False),
+    Opcode(STORE, "STORE", Machine._store, "address", False),
+    Opcode(ADD, "ADD", Machine._add, "address", False),
+    Opcode(SUBTRACT, "SUBTRACT", Machine._subtract, "address", False),
+    Opcode(DIVIDE, "DIVIDE", Machine._divide, "address", False),
+    Opcode(MULTIPLY, "MULTIPLY", Machine._multiply, "address", False),
+    Opcode(BRANCH, "BRANCH", Machine._op_branch, "target", True),
+    Opcode(BRANCHNEG, "BRANCHNEG", Machine._op_branchneg, "target", True),
+    Opcode(BRANCHZERO, "BRANCHZERO", Machine._op_branchzero, "target", True),
+    Opcode(HALT, "HALT", Machine._op_halt, None, True),
+)}
+
+_CELL_READS = (WRITE, LOAD, ADD, SUBTRACT, DIVIDE, MULTIPLY)  # instructions that read their cell
+_CELL_WRITES = (READ, STORE)  # and those that write it
+
+
+def decode_word(value, flags, size=MEMORY_SIZE):
+    """
+    Decode a word into the (opcode, operand, handler) entry Machine caches
+    for it, checking address operands against a memory of size cells.
+    """
+    if value == 0 and flags == WIDE:  # +000000
+        return (0, 0, None)
+    # [sign]XXYY or [sign]0XXYYY
+    opcode, operand = divmod(abs(value), 1000 if flags & WIDE else 100)
+    op = OPCODES.get(opcode)
+    if op is None:
+        return (opcode, f"{opcode:02d}", Machine._op_unknown)
+    if op.operand == "address" and operand >= size:
+        text = f"{operand:03d}" if flags & WIDE else f"{operand:02d}"
+        error = str(_bad_address(op.mnemonic, text, quoted=opcode not in (READ, WRITE)))
+        # READ still prompts for its input before failing
+        return (opcode, error, op.handler if opcode == READ else Machine._op_raise)
+    return (opcode, operand, op.handler)
+
+
+# --- READ input shared between threads ---
+class RunStopped(Exception):
+    """Raised inside a run when it has been cancelled (e.g. the Stop button)."""
+
+
+class InputChannel:
+    """
+    Blocking source of READ input. Values can be queued ahead of time by any
+    thread; get() waits on a condition instead of polling and wakes up as
+    soon as a value arrives, the timeout expires or the channel is cancelled.
+    Consumed values are kept and position counts them.
+    """
 
-def multiply(tuple):
+    def __init__(self, values=()):
+        self._values = list(values)
+        self.position = 0
+        self._cancelled = False
+        self._ready = threading.Condition()
+
+    def put(self, *values):
+        """Queue one or more input values."""
+        with self._ready:
+            self._values.extend(values)
+            self._ready.notify_all()
+
+    def pending(self):
+        """Number of queued values not read yet."""
+        return len(self._values) - self.position
+
+    def get(self, timeout=None):
+        """
+        Return the next value, waiting up to timeout seconds (None waits
+        forever, 0 never waits). Returns None when nothing arrived in time
+        and raises RunStopped once the channel is cancelled.
+        """
+        with self._ready:
+            self._ready.wait_for(lambda: self._cancelled or self.position < len(self._values), timeout)
+            if self._cancelled:
+                raise RunStopped("Run stopped")
+            if self.position >= len(self._values):
+                return None
+            value = self._values[self.position]
+            self.position += 1
+            return value
+
+    def seek(self, position):
+        """Move the read position, e.g. back to where a snapshot was taken; values are kept."""
+        with self._ready:
+            self.position = position
+            self._ready.notify_all()
+
+    def cancel(self):
+        """Wake up any waiting get() and make it raise RunStopped."""
+        with self._ready:
+            self._cancelled = True
+            self._ready.notify_all()
+
+    def clear(self):
+        """Drop all values and undo a cancel, ready for a new run."""
+        with self._ready:
+            self._values = []
+            self.position = 0
+            self._cancelled = False
+
+
+# --- Events: lets a front end run a machine on a worker thread ---
+OUTPUT, MESSAGE, STATE, HALTED, ERROR = "output", "message", "state", "halted", "error"
+
+
+class EventPublisher:
     """
-    Multiply the value in the accumulator by the value stored in memory.
-    Result is stored back in the accumulator.
+    Runs a machine and publishes what happens as (kind, data) tuples on a
+    queue.Queue, so the thread that owns the display never shares callbacks
+    with the worker:
+
+    - (OUTPUT, word) for every WRITE and (MESSAGE, text) for status lines
+    - (STATE, (accumulator, program_counter, dirty_addresses)) whenever
+      state() is called, e.g. from the on_step hook
+    - (ERROR, text) if execution itself fails, then always (HALTED, reason);
+      a run cancelled with RunStopped ends with reason "stopped"
     """
-    global _accumulator
-    _, address, _ = tuple
 
-    # Normalize address to 3 digits
-    address = address.zfill(3)
+    def __init__(self, machine, events):
+        self.machine = machine
+        self.events = events
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in MULTIPLY: '{tuple[1]}'")
+    def output(self, word):
+        self.events.put((OUTPUT, word))
 
-    acc_val = int(_accumulator)
-    mem_val = int(_programMemory[address])
+    def message(self, text):
+        self.events.put((MESSAGE, text))
 
-    result = acc_val * mem_val
+    def state(self):
+        """Publish the registers and the memory cells written since the last state()."""
+        machine = self.machine
+        self.events.put((STATE, (machine.accumulator, machine.program_counter, machine.memory.take_dirty())))
 
-    _accumulator = _overflow_value(result)
-    return
+    def run(self, read_input, on_step=None, start=None, **budgets):
+        """
+        Execute the machine's program (from start, with the max_steps, timeout,
+        max_reads and detect_loops budgets or the budget of Machine.execute);
+        returns the halt reason.
+        """
+        try:
+            reason = self.machine.execute(read_input, self.output, self.message, on_step, start=start, **budgets)
+        except RunStopped:
+            self.message("Program stopped")
+            reason = "stopped"
+        except Exception as e:
+            self.events.put((ERROR, str(e)))
+            reason = "error"
+        self.state()
+        self.events.put((HALTED, reason))
+        return reason
 
 
-def divide(tuple):
+# --- System Messages log ---
+LOG_LINES = 5000  # lines a MessageLog keeps by default
+
+
+class MessageLog:
     """
-    Divide the value in the accumulator by the value stored in memory.
-    Result is stored back in the accumulator.
-    This currently uses floor division.
+    Bounded log of status and output lines for a front end. Only the last
+    cap lines are kept; lines appended since the last take_pending() wait
+    there so a view can add them in one batch. With spill_to(path) every
+    line is also written to a file, so nothing is lost past the cap.
     """
-    global _accumulator
-    _, address, _ = tuple
 
-    # Normalize address to 3 digits
-    address = address.zfill(3)
+    def __init__(self, cap=LOG_LINES):
+        self.cap = max(1, cap)
+        self.lines = deque(maxlen=self.cap)
+        self._pending = deque(maxlen=self.cap)
+        self._shown = 0  # lines the view holds
+        self.spill = None  # open file every line is copied to
+        self.total = 0  # lines appended since the last clear()
+
+    def append(self, line):
+        self.lines.append(line)
+        self._pending.append(line)
+        self.total += 1
+        if self.spill is not None:
+            self.spill.write(line + "\n")
+
+    def take_pending(self):
+        """
+        Return (lines, drop): the lines the view should append and how many
+        lines it should first remove from its top to stay within cap.
+        """
+        lines = list(self._pending)
+        self._pending.clear()
+        drop = max(0, self._shown + len(lines) - self.cap)
+        self._shown = min(self.cap, self._shown + len(lines))
+        return lines, drop
+
+    def clear(self):
+        self.lines.clear()
+        self._pending.clear()
+        self._shown = 0
+        self.total = 0
+
+    def spill_to(self, path):
+        """Copy the kept lines and every later one to the file at path (None stops spilling)."""
+        self.close()
+        if path is not None:
+            self.spill = open(path, "w", encoding="utf-8")
+            self.spill.writelines(line + "\n" for line in self.lines)
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+# --- Module-level API (operates on the _accumulator/_programCounter/_programMemory globals) ---
+def _on_globals(method, *args):
+    """Call a Machine method on a machine wrapped around the module globals."""
+    global _accumulator, _programCounter
+    memory = Memory.from_dict(_programMemory)
+    before = memory.copy()
+    machine = Machine(memory, _accumulator, _programCounter)
+    result = method(machine, *args)
+    for address in range(len(memory)):
+        if memory[address] != before[address]:
+            _programMemory[f"{address:03d}"] = memory[address]
+    _accumulator = machine.accumulator
+    _programCounter = machine.program_counter
+    return result
 
-    if address not in _programMemory:
-        raise ValueError(f"Invalid memory address in DIVIDE: '{tuple[1]}'")
 
-    acc_val = int(_accumulator)
-    mem_val = int(_programMemory[address])
+def read(tuple, input):
+    """Read input and store in memory at given address."""
+    return _on_globals(Machine.read, tuple, input)
 
-    if mem_val == 0:  # Prevents a division by 0 error
-        raise ValueError("Division by zero error")
 
-    result = acc_val // mem_val
+def write(tuple):
+    """Write value from memory at given address."""
+    return _on_globals(Machine.write, tuple)
 
-    _accumulator = _overflow_value(result)
-    return
 
+def load(tuple):
+    """Load value from memory into accumulator."""
+    return _on_globals(Machine.load, tuple)
 
-def branch(tuple):
-    """Unconditional branch: always set PC to operand."""
-    global _programCounter
-    address = tuple[1]
 
-    # Validate address range (0-249 for 250 memory locations)
-    if not address.isdigit() or not (0 <= int(address) <= 249):
-        raise ValueError(f"Invalid branch address: '{address}'")
+def store(tuple):
+    """Store accumulator value into memory."""
+    return _on_globals(Machine.store, tuple)
+
+
+def add(tuple):
+    """Add the value stored in memory at the given address to the accumulator."""
+    return _on_globals(Machine.add, tuple)
+
+
+def subtract(tuple):
+    """Subtract the value stored in memory from the accumulator."""
+    return _on_globals(Machine.subtract, tuple)
+
+
+def multiply(tuple):
+    """Multiply the value in the accumulator by the value stored in memory."""
+    return _on_globals(Machine.multiply, tuple)
+
+
+def divide(tuple):
+    """Divide the value in the accumulator by the value stored in memory."""
+    return _on_globals(Machine.divide, tuple)
+
 
-    _programCounter = int(address)
+def branch(tuple):
+    """Unconditional branch: always set PC to operand."""
+    return _on_globals(Machine.branch, tuple)
 
 
 def branchneg(tuple):
     """Branch if accumulator is negative."""
-    global _accumulator, _programCounter
-    old_pc = _programCounter
-    try:
-        if int(_accumulator) < 0:
-            address = tuple[1]
-            if not address.isdigit() or not (0 <= int(address) <= 249):
-                raise ValueError(f"Invalid branch address: '{address}'")
-            _programCounter = int(address)
-    except ValueError:
-        raise ValueError(f"Invalid accumulator value: {_accumulator}")
-    return _programCounter != old_pc
+    return _on_globals(Machine.branchneg, tuple)
 
 
 def branchzero(tuple):
     """Branch if accumulator is zero."""
-    global _accumulator, _programCounter
-    old_pc = _programCounter
+    return _on_globals(Machine.branchzero, tuple)
+
+
+def execute(read_input, write_output, message=print, on_step=None):
+    """Run the program held in _programMemory (see Machine.execute)."""
+    return _on_globals(Machine.execute, read_input, write_output, message, on_step)
+
+
+# --- Program loading / execution (shared by the GUI and the headless runner) ---
+Diagnostic = namedtuple("Diagnostic", "line text message")  # 1-based line number, raw line, problem
 
-    if int(_accumulator) == 0:
-        address = tuple[1]
-        if not address.isdigit() or not (0 <= int(address) <= 249):
-            raise ValueError(f"Invalid branch address: '{address}'")
-        _programCounter = int(address)
-    return _programCounter != old_pc
 
+class LoadResult:
+    """
+    Outcome of loading a program: program is the list of 6-digit words,
+    diagnostics the per-line problems found (those lines load as +000000)
+    and format "4d" or "6d" as detected from the first instruction.
+    """
+
+    def __init__(self):
+        self.program = []
+        self.diagnostics = []
+        self.format = None
+
+    @property
+    def errors(self):
+        """Diagnostics as "Line N: message" strings."""
+        return [f"Line {d.line}: {d.message}" for d in self.diagnostics]
+
+    def _add(self, number, line):
+        """Convert and validate one instruction line and append it to the program."""
+        word = line
+        # Convert 4-digit -> 6-digit
+        if self.format == "4d":
+            try:
+                word = convert_4_to_6_digit(word)
+            except Exception as e:
+                self.diagnostics.append(Diagnostic(number, line, str(e)))
+                word = "+000000"  # Fail-safe
+
+        # Validate instruction format
+        try:
+            encode_word(word)
+        except Exception as e:
+            self.diagnostics.append(Diagnostic(number, line, str(e)))
+            word = "+000000"
+
+        self.program.append(word)
+
+
+def _detect_format(line):
+    """Return "4d" or "6d" if line looks like a 4- or 6-digit word, otherwise None."""
+    test = line if line[0] in "+-" else "+" + line
+    if len(test) == 5:
+        return "4d"
+    if len(test) == 7:
+        return "6d"
+    return None
+
+
+def load_source(source, size=MEMORY_SIZE):
+    """
+    Load a program in a single pass from a file path, an open file or any
+    iterable of lines; lines are read one at a time and reading stops once
+    memory is full. Blank lines and '#' comments are skipped. The 4-/6-digit
+    format is taken from the first line that has the length of either (lines
+    before it wait until it is known), 4-digit words are converted with
+    convert_4_to_6_digit and every word is validated with parse.
+
+    Returns a LoadResult. Raises ValueError if no instruction is found.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r") as f:
+            return load_source(f, size)
+
+    result = LoadResult()
+    pending = []  # (line number, line) read before the format is known
+    overflow = None
+
+    for number, raw in enumerate(source, 1):
+        if overflow is None and len(result.program) + len(pending) >= size:
+            overflow = Diagnostic(number, raw.rstrip("\r\n"), f"Exceeds {size} memory slots.")
+            if result.format is not None:
+                break
+
+        line = raw.split("#")[0].strip()
+        if not line:
+            continue
+
+        if result.format is None:
+            result.format = _detect_format(line)
+            if result.format is None:
+                if overflow is None:
+                    pending.append((number, line))
+                continue
+            for item in pending:
+                result._add(*item)
+            pending = []
+            if overflow is not None:
+                break
+
+        result._add(number, line)
+
+    if result.format is None:
+        raise ValueError("No valid instructions found. Expected +XXXX or +XXXXXX.")
+    if overflow is not None:
+        result.diagnostics.append(overflow)
+    return result
+
+
+def load_program(raw_lines):
+    """
+    Convert the lines of a program file into a list of 6-digit words (see
+    load_source). Returns a tuple (program, errors). Invalid lines are
+    replaced by +000000.
+    """
+    result = load_source(raw_lines)
+    return result.program, result.errors
+
+
+# --- Binary program images: header, then packed words (no text parsing on load) ---
+IMAGE_SUFFIX = ".uvb"
+_IMAGE_MAGIC = b"UVSB"
+_IMAGE_VERSION = 1
+# magic, version, bytes per word value, number of words, CRC32 of everything after the header
+_IMAGE_HEADER = struct.Struct("<4sBBxxII")
+
+
+def program_words(memory):
+    """The memory's words up to the last one that is not +000000, as they are saved to a .txt file."""
+    return [memory[i] for i in range(memory.used_length())]
+
+
+def pack_image(memory):
+    """
+    Pack memory into a binary image: the header, then every word up to the
+    last non-empty one as a little-endian int32 value, then one format-flag
+    byte per word. Raises ValueError if a cell holds text that is not a word.
+    """
+    if memory.invalid:
+        address = min(memory.invalid)
+        raise ValueError(f"Line {address:03d} is not a valid word: '{memory.invalid[address]}'")
+    length = memory.used_length()
+    values = memory.values[:length]
+    if sys.byteorder == "big":
+        values.byteswap()
+    payload = values.tobytes() + bytes(memory.flags[:length])
+    header = _IMAGE_HEADER.pack(_IMAGE_MAGIC, _IMAGE_VERSION, values.itemsize, length, zlib.crc32(payload))
+    return header + payload
+
+
+def unpack_image(image, memory):
+    """
+    Clear memory and fill it from a binary image held in any buffer (bytes,
+    memoryview, mmap). Words and flags that no text word could produce are
+    rejected; the loaded cells are journaled and marked dirty like any write.
+    """
+    with memoryview(image) as view:
+        if len(view) < _IMAGE_HEADER.size:
+            raise ValueError("Not a program image: file is too short")
+        magic, version, width, length, checksum = _IMAGE_HEADER.unpack_from(view)
+        if magic != _IMAGE_MAGIC:
+            raise ValueError("Not a program image: bad header")
+        if version != _IMAGE_VERSION or width != 4:
+            raise ValueError(f"Unsupported image version {version} (word width {width})")
+        if length > len(memory):
+            raise ValueError(f"Image holds {length} words but memory has {len(memory)} slots.")
+        with view[_IMAGE_HEADER.size:] as payload:
+            if len(payload) != length * 5:
+                raise ValueError("Image is truncated or has extra data")
+            if zlib.crc32(payload) != checksum:
+                raise ValueError("Image checksum does not match its contents")
+            values = array('i')
+            with payload[:4 * length] as packed:
+                values.frombytes(packed)
+            if sys.byteorder == "big":
+                values.byteswap()
+            if length and (max(values) > 999999 or min(values) < -999999):
+                raise ValueError("Image holds a word out of range")
+            with payload[4 * length:] as packed:
+                flags = bytes(packed)
+            if flags.translate(None, bytes(range((WIDE | NEG_ZERO) + 1))):
+                raise ValueError("Image holds unknown word flags")
+            memory.clear()  # journals and dirties every cell, or only the used pages of a paged memory
+            if memory.paged:
+                if memory.journal is not None:
+                    for address in range(length):
+                        memory.save(address)
+                memory.dirty.update(range(length))
+            memory.values[:length] = values
+            memory.flags[:length] = flags
+            memory.version += 1
+
+
+def load_image(source, memory):
+    """Load a binary image into memory from a file path (memory-mapped) or a buffer."""
+    if not isinstance(source, (str, os.PathLike)):
+        unpack_image(source, memory)
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        unpack_image(mapped, memory)
+
+
+def convert_program(source_path, target_path):
+    """
+    Convert between a .txt program and a binary image, by the file suffixes.
+    Returns the LoadResult when converting from text (its diagnostics say
+    which lines were stored as +000000), otherwise None.
+    """
+    loaded = None
+    machine = Machine()
+    if str(source_path).lower().endswith(IMAGE_SUFFIX):
+        machine.load_image(source_path)
+    else:
+        loaded = load_source(source_path)
+        machine.load_program(loaded.program)
+
+    if str(target_path).lower().endswith(IMAGE_SUFFIX):
+        with open(target_path, "wb") as f:
+            f.write(pack_image(machine.memory))
+    else:
+        with open(target_path, "w", encoding="utf-8") as f:
+            for word in program_words(machine.memory):
+                f.write(word + "\n")
+    return loaded
+
+
+# --- Headless runner ---
+ENGINES = ("interpreter", "blocks")
+
+
+def _memory_size(text):
+    """argparse type for a memory size: a whole number of cells, at least 1."""
+    size = int(text)
+    if size < 1:
+        raise ValueError(f"Invalid memory size: {text}")
+    return size
+
+
+def machine_class(engine="interpreter"):
+    """Machine class for an engine name: the interpreter or the basic-block translator."""
+    if engine == "blocks":
+        import translator  # compiled blocks are optional
+        return translator.TranslatedMachine
+    return Machine
+
+
+def run_headless(program_path, input_path=None, engine="interpreter", breakpoints=None, profile_path=None,
+                 max_steps=None, timeout=None, max_reads=None, detect_loops=True, memory_size=MEMORY_SIZE):
+    """
+    Load and run a program without the GUI. WRITE output goes to stdout,
+    status messages go to stderr. engine is one of ENGINES. At every stop of
+    breakpoints (a Breakpoints) the registers are printed to stderr and the
+    run goes on. With profile_path the run is profiled and the counts are
+    written there (see write_profile). max_steps, timeout, max_reads and
+    detect_loops are the budgets of Machine.execute; the machine has
+    memory_size cells.
+
+    Returns the process exit status: 0 on a normal finish, 1 on a runtime
+    error or when a budget or loop detection stopped the program and 2 when
+    the program or input file could not be loaded.
+    """
+    machine = machine_class(engine)(memory_size=memory_size)
+    try:
+        if str(program_path).lower().endswith(IMAGE_SUFFIX):
+            machine.load_image(program_path)
+        else:
+            loaded = load_source(program_path, memory_size)
+            if loaded.diagnostics:
+                for error in loaded.errors:
+                    print(f"Validation error: {error}", file=sys.stderr)
+                return 2
+            machine.load_program(loaded.program)
+    except Exception as e:
+        print(f"Load File Error: {str(e)}", file=sys.stderr)
+        return 2
+
+    inputs = InputChannel()
+    if input_path:
+        try:
+            with open(input_path, "r") as f:
+                inputs.put(*[line.strip() for line in f if line.strip()])
+        except Exception as e:
+            print(f"Input File Error: {str(e)}", file=sys.stderr)
+            return 2
+
+    def status(text):
+        print(text, file=sys.stderr)
+
+    def next_input():
+        """Mirror Window.get_input: skip non-integer entries, None once exhausted."""
+        candidate = inputs.get(timeout=0)
+        while candidate is not None and not candidate.lstrip("+-").isdigit():
+            status("Invalid input: please enter an integer.")
+            candidate = inputs.get(timeout=0)
+        return candidate
+
+    machine.breakpoints = breakpoints
+    if profile_path:
+        machine.profile = Profile(len(machine.memory))
+    budget = Budget(max_steps, timeout, max_reads, detect_loops)  # limits cover the whole run, breaks included
+    reason = machine.execute(next_input, print, status, budget=budget)
+    while reason == "break":
+        status(f"Accumulator: {machine.accumulator} Program Counter: {machine.program_counter:03d}")
+        reason = machine.execute(next_input, print, status, start=machine.program_counter, budget=budget)
+
+    if profile_path:
+        try:
+            write_profile(machine.profile, profile_path, machine.memory)
+        except Exception as e:
+            print(f"Profile Error: {str(e)}", file=sys.stderr)
+            return 2
+    return 1 if reason in ("error", "limit", "timeout", "loop") else 0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main", description="UVSim BasicML simulator.")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="run a program without the GUI")
+    run_parser.add_argument("program", help=f"BasicML program file (.txt or {IMAGE_SUFFIX} image)")
+    run_parser.add_argument("--input", help="file with one READ input per line")
+    run_parser.add_argument("--engine", choices=ENGINES, default="interpreter",
+                            help="interpreter, or blocks to run compiled basic blocks")
+    run_parser.add_argument("--max-steps", type=int, default=None, help="stop after this many instructions")
+    run_parser.add_argument("--timeout", type=float, default=None, help="stop after this many seconds")
+    run_parser.add_argument("--max-reads", type=int, default=None, help="stop at READ number MAX_READS + 1")
+    run_parser.add_argument("--no-loop-detection", dest="detect_loops", action="store_false",
+                            help="let a program caught in an endless loop run on")
+    run_parser.add_argument("--memory-size", type=_memory_size, default=MEMORY_SIZE, metavar="CELLS",
+                            help=f"memory cells of the machine (default {MEMORY_SIZE})")
+    run_parser.add_argument("--break", dest="breaks", type=int, action="append", default=[], metavar="ADDRESS",
+                            help="print the registers before the instruction at ADDRESS runs (repeatable)")
+    run_parser.add_argument("--watch", type=int, action="append", default=[], metavar="ADDRESS",
+                            help="print the registers after every write to cell ADDRESS (repeatable)")
+    run_parser.add_argument("--watch-read", type=int, action="append", default=[], metavar="ADDRESS",
+                            help="print the registers after every read of cell ADDRESS (repeatable)")
+    run_parser.add_argument("--break-if", action="append", default=[], metavar="CONDITION",
+                            help='print the registers when the accumulator comes to meet CONDITION, e.g. "< 0"')
+    run_parser.add_argument("--profile", metavar="FILE",
+                            help="count executions, branches and cell accesses per address into FILE (.json or .csv)")
+    # batch and bench parse their own arguments (see below); they are only listed here
+    commands.add_parser("batch", help="run many programs and inputs in parallel")
+    commands.add_parser("bench", help="benchmark the interpreter core")
+    convert_parser = commands.add_parser("convert", help=f"convert between .txt programs and {IMAGE_SUFFIX} images")
+    convert_parser.add_argument("source", help="program to read")
+    convert_parser.add_argument("target", help=f"file to write; a {IMAGE_SUFFIX} suffix writes an image")
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Options of batch and bench may come first, so they get everything after the command
+    if argv and argv[0] == "batch":
+        import batch  # the process pool is only needed for batch runs
+        return batch.main(argv[1:])
+    if argv and argv[0] == "bench":
+        import bench
+        return bench.main(argv[1:])
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        breakpoints = Breakpoints()
+        breakpoints.pcs.update(args.breaks)
+        for address in args.watch:
+            breakpoints.watch(address)
+        breakpoints.reads.update(args.watch_read)
+        try:
+            for condition in args.break_if:
+                breakpoints.add_condition(condition)
+        except ValueError as e:
+            parser.error(str(e))
+        return run_headless(args.program, args.input, args.engine, breakpoints, args.profile,
+                            args.max_steps, args.timeout, args.max_reads, args.detect_loops, args.memory_size)
+    if args.command == "convert":
+        try:
+            loaded = convert_program(args.source, args.target)
+        except Exception as e:
+            print(f"Convert Error: {str(e)}", file=sys.stderr)
+            return 2
+        for error in loaded.errors if loaded else ():
+            print(f"Validation error: {error}", file=sys.stderr)
+        return 0
 
-def main():
+    import interface as face  # Tk is only needed for the GUI
     gui = face.Window()  # Create the GUI
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
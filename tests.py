@@ -1,6 +1,12 @@
 # tests.py
+import csv
+import re
+import json
 import pytest
 import main
+import batch
+import translator
+import bench
 
 class TestThemeManagement:
     """Tests for theme management functions in interface.py"""
@@ -374,5 +380,1205 @@ class TestExtendedMemory:
         main.add(("30", "200", "+030200"))
         assert main._accumulator == "+0150"
 
+class TestMemoryModel:
+    """Tests for the integer-backed Memory and word formatting"""
+
+    def test_cached_decoder_matches_parse(self):
+        for word in ["", "12", "12a4", "+-1234", "+12345", " -0012 ", "1234", "-000000"]:
+            for _ in range(2):  # the second call comes from the cache
+                try:
+                    main.parse(word)
+                except Exception as e:
+                    with pytest.raises(type(e), match=re.escape(str(e))):
+                        main.encode_word(word)
+                else:
+                    assert main.format_word(*main.encode_word(word)) == main.parse(word)[2]
+
+    def test_cached_decoder_errors_for_blank_and_missing_words(self):
+        for word in ["   ", "\t", None]:
+            with pytest.raises(Exception) as expected:
+                main.parse(word)
+            with pytest.raises(expected.type, match=re.escape(str(expected.value))):
+                main.encode_word(word)
+        memory = main.Memory()
+        memory[0] = "   "
+        assert memory.errors() == ["000: Instruction too short: '' (need at least 4 digits)"]
+
+    def test_decoder_cache_statistics(self):
+        main.encode_word("+017123")
+        before = main.word_cache_info()
+        main.encode_word("+017123")
+        after = main.word_cache_info()
+        assert after.hits == before.hits + 1 and after.misses == before.misses
+        assert after.maxsize == main.WORD_CACHE_SIZE
+
+    def test_errors_follow_writes(self):
+        memory = main.Memory()
+        checkpoint = memory.checkpoint()
+        memory[4] = "abcd"
+        memory[1] = ""
+        assert memory.errors() == ["001: Empty word instruction", "004: Word instruction contains invalid characters"]
+        memory[4] = "-0001"
+        memory.restore(checkpoint)
+        assert memory.errors() == []
+
+    def test_word_round_trip(self):
+        for word in ["+010007", "-000015", "+0012", "-0007", "-0000", "+000000"]:
+            assert main.format_word(*main.encode_word(word)) == word
+
+    def test_memory_stores_integers(self):
+        memory = main.Memory()
+        memory[7] = "-0042"
+        assert memory.values[7] == -42
+        assert memory[7] == "-0042"
+        assert len(memory) == 250
+
+    def test_memory_keeps_invalid_text(self):
+        memory = main.Memory()
+        memory[3] = "+12AB"
+        assert memory[3] == "+12AB"
+        assert memory.invalid == {3: "+12AB"}
+        memory[3] = "+1234"
+        assert memory.invalid == {}
+
+    def test_overflow_keeps_last_four_digits(self):
+        assert main._overflow(123456) == (3456, 0)
+        assert main._overflow(-20000) == (0, main.NEG_ZERO)
+        assert main.format_word(*main._overflow(-20000)) == main._overflow_value(-20000)
+
+    def test_execute_invalid_word_is_parse_error(self):
+        machine = main.Machine()
+        machine.memory[0] = "+10XX"
+        messages = []
+        assert machine.execute(lambda: None, print, messages.append) == "error"
+        assert messages[0] == "Parse Error at line 000: Word instruction contains invalid characters"
+
+class TestMachine:
+    """Tests for the self-contained Machine class"""
+
+    def test_machines_are_independent(self):
+        first, second = main.Machine(), main.Machine()
+        first.memory[5] = "+0042"
+        first.load(("20", "005", "+020005"))
+        assert first.accumulator == "+0042"
+        assert second.accumulator == "+000000"
+        assert second.memory[5] == "+000000"
+
+    def test_module_functions_use_globals(self):
+        main._programMemory = {f"{i:03d}": "+000000" for i in range(250)}
+        main._programMemory["010"] = "+0003"
+        main._accumulator = "+0004"
+        main.multiply(("33", "010", "+033010"))
+        assert main._accumulator == "+0012"
+
+    def test_decoded_cache_filled_at_load(self):
+        machine = main.Machine()
+        machine.load_program(["+020005", "+043000"])
+        assert machine.memory.decoded[0] == (20, 5, main.Machine._load)
+        assert machine.memory.decoded[1][0] == 43
+
+    def test_self_modifying_store_invalidates_cache(self):
+        machine = main.Machine()
+        # LOAD 005, STORE 003, BRANCH 003; 003 starts as WRITE 005 but becomes HALT
+        machine.load_program(["+020005", "+021003", "+040003", "+011005", "+043000", "+043000"])
+        output = []
+        assert machine.execute(lambda: None, output.append, lambda text: None) == "halted"
+        assert output == []
+        assert machine.memory.decoded[3][0] == 43
+
+    def test_editing_memory_invalidates_cache(self):
+        machine = main.Machine()
+        machine.load_program(["+011000", "+043000"])
+        machine.memory[0] = "+043000"
+        assert machine.memory.decoded[0] is None
+
+    def test_opcode_registry_drives_convert(self):
+        for code in main.OPCODES:
+            assert main.convert_4_to_6_digit(f"+{code:02d}07") == f"+0{code:02d}007"
+        assert main.convert_4_to_6_digit("+1207") == "+001207"
+
+    def test_opcode_registry_drives_decode(self):
+        machine = main.Machine()
+        machine.load_program(["+033004", "+012004"])
+        assert machine.memory.decoded[0][2] is main.OPCODES[main.MULTIPLY].handler
+        assert machine.memory.decoded[1][2] is main.Machine._op_unknown
+
+    def test_dirty_cells_reported_once(self):
+        machine = main.Machine()
+        machine.load_program(["+010009", "+020009", "+021008", "+043000"])
+        machine.memory.take_dirty()
+        machine.execute(lambda: "5", print, lambda text: None)
+        assert machine.memory.take_dirty() == {8, 9}
+        assert machine.memory.take_dirty() == set()
+
+    def test_event_publisher(self):
+        import queue
+        machine = main.Machine()
+        machine.load_program(["+020003", "+011003", "+043000", "+000042"])
+        events = queue.Queue()
+        publisher = main.EventPublisher(machine, events)
+        assert publisher.run(lambda: None) == "halted"
+        kinds = []
+        while not events.empty():
+            kinds.append(events.get_nowait())
+        assert (main.OUTPUT, "+000042") in kinds
+        assert kinds[-2] == (main.STATE, ("+000042", 2, set(range(250))))
+        assert kinds[-1] == (main.HALTED, "halted")
+
+    def test_machine_pickles(self):
+        import pickle
+        machine = main.Machine()
+        machine.load_program(["+020002", "+043000", "+000007"])
+        copy = pickle.loads(pickle.dumps(machine))
+        assert copy.execute(lambda: None, print, lambda text: None) == "halted"
+        assert copy.accumulator == "+000007"
+        assert machine.accumulator == "+000000"
+
+    def test_machines_run_in_threads(self):
+        import threading
+        program, _ = main.load_program(open("Test1.txt"))
+        results = {}
+
+        def run(n):
+            machine = main.Machine()
+            machine.load_program(program)
+            inputs = [str(n), str(n)]
+            output = []
+            machine.execute(lambda: inputs.pop(), output.append, lambda text: None)
+            results[n] = output
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == {n: [f"+{2 * n:04d}"] for n in range(1, 9)}
+
+class TestInputChannel:
+    """Tests for the blocking READ input channel"""
+
+    def test_prequeued_values_in_order(self):
+        channel = main.InputChannel()
+        channel.put("5", "7", "9")
+        assert [channel.get(), channel.get(), channel.get()] == ["5", "7", "9"]
+        assert channel.position == 3
+
+    def test_timeout_returns_none(self):
+        channel = main.InputChannel(["1"])
+        assert channel.get(timeout=0) == "1"
+        assert channel.get(timeout=0) is None
+        assert channel.get(timeout=0.01) is None
+
+    def test_get_wakes_on_put_from_other_thread(self):
+        import threading
+        channel = main.InputChannel()
+        timer = threading.Timer(0.05, channel.put, args=("42",))
+        timer.start()
+        assert channel.get(timeout=5) == "42"
+
+    def test_cancel_stops_a_waiting_run(self):
+        import threading, queue
+        channel = main.InputChannel()
+        machine = main.Machine()
+        machine.load_program(["+010005", "+043000"])
+        events = queue.Queue()
+        publisher = main.EventPublisher(machine, events)
+        threading.Timer(0.05, channel.cancel).start()
+        assert publisher.run(channel.get) == "stopped"
+
+class TestHeadless:
+    """Tests for the headless loader/runner in main.py"""
+
+    def setup_method(self):
+        main._accumulator = "+000000"
+        main._programMemory = {f"{i:03d}": "+000000" for i in range(250)}
+        main._programCounter = 0
+
+    def test_load_program_converts_4digit(self):
+        program, errors = main.load_program(["+1007 # read", "", "# comment", "+4300"])
+        assert program == ["+010007", "+043000"]
+        assert errors == []
+
+    def test_load_program_reports_bad_lines(self):
+        program, errors = main.load_program(["+1007", "+10XX", "+4300"])
+        assert program == ["+010007", "+000000", "+043000"]
+        assert errors and errors[0].startswith("Line 2:")
+
+    def test_load_program_no_instructions(self):
+        with pytest.raises(ValueError, match="No valid instructions found"):
+            main.load_program(["# nothing here", ""])
+
+    def test_load_source_path_and_file(self):
+        from_path = main.load_source("Test1.txt")
+        with open("Test1.txt") as f:
+            from_file = main.load_source(f)
+        assert from_path.program == from_file.program
+        assert from_path.format == "4d"
+        assert from_path.diagnostics == []
+
+    def test_load_source_diagnostics(self):
+        loaded = main.load_source(["12", "+1007", "+10XX # bad", "+4300"])
+        assert loaded.program == ["+000000", "+010007", "+000000", "+043000"]  # "12" waits for the format
+        assert [d.line for d in loaded.diagnostics] == [1, 3]
+        assert loaded.diagnostics[1].text == "+10XX"
+        assert loaded.errors[0].startswith("Line 1:")
+
+    def test_load_source_stops_reading_when_full(self):
+        read = []
+
+        def lines():
+            for i in range(1000):
+                read.append(i)
+                yield "+4300\n"
+
+        loaded = main.load_source(lines())
+        assert len(loaded.program) == 250
+        assert loaded.errors == ["Line 251: Exceeds 250 memory slots."]
+        assert len(read) == 251
+
+    def test_execute_add_program(self):
+        program, _ = main.load_program(open("Test1.txt"))
+        for i, line in enumerate(program):
+            main._programMemory[f"{i:03d}"] = line
+        inputs = ["5", "7"]
+        output = []
+        reason = main.execute(lambda: inputs.pop(0), output.append, lambda text: None)
+        assert reason == "halted"
+        assert output == ["+0012"]
+
+    def test_execute_runtime_error(self):
+        main._programMemory["000"] = "+020999"  # LOAD from an address outside memory
+        messages = []
+        reason = main.execute(lambda: None, print, messages.append)
+        assert reason == "error"
+        assert messages[0].startswith("Runtime Error at line 000")
+
+    def test_run_headless_exit_status(self, tmp_path, capsys):
+        inputs = tmp_path / "inputs.txt"
+        inputs.write_text("5\n7\n")
+        assert main.main(["run", "Test1.txt", "--input", str(inputs)]) == 0
+        assert capsys.readouterr().out == "+0012\n"
+
+    def test_run_headless_missing_input(self, capsys):
+        assert main.main(["run", "Test1.txt"]) == 1
+        assert "No input provided for READ instruction" in capsys.readouterr().err
+
+
+class TestBatch:
+    """Tests for execution limits and the process-pool batch runner in batch.py"""
+
+    def test_execute_instruction_limit(self):
+        machine = main.Machine()
+        machine.load_program(["+040000"])  # branch to itself forever
+        messages = []
+        assert machine.execute(lambda: None, print, messages.append, max_steps=500) == "limit"
+        assert machine.steps == 500
+        assert "instruction limit of 500" in messages[0]
+
+    def test_execute_timeout(self):
+        machine = main.Machine()
+        machine.load_program(["+040000"])
+        assert machine.execute(lambda: None, print, lambda text: None, timeout=0.05) == "timeout"
+        assert machine.steps > 0
+
+    def test_run_job_result(self):
+        program, _ = main.load_program(open("Test1.txt"))
+        result = batch.run_job(("Test1.txt", program, "in.txt", ["5", "x", "7"], 1000, None, "interpreter", None, True,
+                                main.MEMORY_SIZE))
+        assert result["halt_reason"] == "halted"
+        assert result["outputs"] == ["+0012"]
+        assert result["accumulator"] == "+0012"
+        assert result["steps"] == 7
+        assert result["error"] == ""
+
+    def test_run_batch_pool_matches_in_process(self, tmp_path):
+        (tmp_path / "a.txt").write_text("5\n7\n")
+        (tmp_path / "b.txt").write_text("1\n2\n")
+        inputs = [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+        programs = ["Test1.txt", "Test2.txt"]
+        serial = batch.run_batch(programs, inputs, workers=1)
+        pooled = batch.run_batch(programs, inputs, workers=2)
+        strip = lambda results: [{k: v for k, v in r.items() if k != "wall_time"} for r in results]
+        assert strip(serial) == strip(pooled)
+        assert [r["outputs"] for r in serial] == [["+0012"], ["+0003"], ["+0007"], ["+0002"]]
+
+    def test_run_batch_load_error(self, tmp_path):
+        bad = tmp_path / "bad.txt"
+        bad.write_text("# nothing\n")
+        results = batch.run_batch([str(bad)], workers=1)
+        assert results[0]["halt_reason"] == "load_error"
+        assert "No valid instructions found" in results[0]["error"]
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_load_errors_keep_their_place(self, tmp_path, workers):
+        bad = tmp_path / "bad.txt"
+        bad.write_text("# nothing\n")
+        good = tmp_path / "good.txt"
+        good.write_text("+4300\n")
+        results = batch.run_batch([str(good), str(bad), str(good)], workers=workers)
+        assert [r["halt_reason"] for r in results] == ["halted", "load_error", "halted"]
+
+    def test_write_report_csv_and_json(self, tmp_path):
+        results = batch.run_batch(["Test1.txt"], workers=1, max_steps=3)
+        batch.write_report(results, str(tmp_path / "report.csv"))
+        batch.write_report(results, str(tmp_path / "report.json"))
+        rows = list(csv.DictReader(open(tmp_path / "report.csv")))
+        assert rows[0]["halt_reason"] == "error"  # no input file, so the first READ fails
+        assert json.load(open(tmp_path / "report.json"))[0]["program"] == "Test1.txt"
+
+    def test_main_batch_subcommand(self, tmp_path):
+        report = tmp_path / "out.json"
+        assert main.main(["batch", "Test1.txt", "--workers", "1", "--report", str(report)]) == 1
+        assert json.load(open(report))[0]["halt_reason"] == "error"
+
+    def test_main_batch_options_before_programs(self, tmp_path):
+        report = tmp_path / "out.json"
+        assert main.main(["batch", "--workers", "1", "--max-steps", "3", "--report", str(report), "Test1.txt"]) == 1
+        assert json.load(open(report))[0]["halt_reason"] == "error"
+
+
+class TestTranslator:
+    """Tests for the basic-block translator in translator.py"""
+
+    def run_both(self, words, inputs=(), max_steps=10000):
+        results = []
+        for machine in (main.Machine(), translator.TranslatedMachine()):
+            machine.load_program(words)
+            values = list(inputs)
+            output, messages = [], []
+            reason = machine.execute(lambda: values.pop(0) if values else None, output.append,
+                                     messages.append, max_steps=max_steps)
+            results.append((reason, output, messages, machine.accumulator, machine.program_counter,
+                            machine.steps, machine.memory.to_dict()))
+        return results
+
+    def test_countdown_loop_matches_interpreter(self):
+        # acc = 9; loop: acc -= 1, store, write, branch back while not zero
+        words = ["+020010", "+031011", "+021010", "+011010", "+042006", "+040000", "+043000",
+                 "+000000", "+000000", "+000000", "+000009", "+000001"]
+        interpreted, translated = self.run_both(words)
+        assert translated == interpreted
+        assert translated[0] == "halted"
+        assert translated[1][-1] == "+0000"
+
+    def test_rewritten_blocks_fall_back_to_the_interpreter(self):
+        interpreted, translated = self.run_both(bench.SELF_MODIFYING, max_steps=20000)
+        assert translated == interpreted
+        machine = translator.TranslatedMachine()
+        machine.load_program(bench.SELF_MODIFYING)
+        machine.execute(None, print, lambda text: None, max_steps=20000)
+        start, drops = max(machine._drops.items(), key=lambda item: item[1])
+        assert drops == translator.REBUILD_LIMIT
+        assert machine._compile(start) is None
+
+    def test_machine_pickles_after_a_run(self):
+        import pickle
+        words = ["+020010", "+031011", "+021010", "+042005", "+040000", "+043000",
+                 "+000000", "+000000", "+000000", "+000000", "+000009", "+000001"]
+        machine = translator.TranslatedMachine()
+        machine.load_program(words)
+        assert machine.execute(None, print, lambda text: None) == "halted"
+        copy = pickle.loads(pickle.dumps(machine))
+        copy.load_program(words)
+        assert copy.execute(None, print, lambda text: None) == "halted"
+        assert copy.memory[10] == "+0000" and copy.steps == machine.steps
+
+    def test_overflow_and_negative_zero(self):
+        # 9999 * 9999 keeps the last four digits; -1 // 9999 rounds down to -1; -1 * 0 is "-0000"
+        words = ["+020010", "+033010", "+021012", "+020011", "+032010", "+033013", "+021014", "+043000",
+                 "+000000", "+000000", "+009999", "-000001", "+000000", "+000000"]
+        interpreted, translated = self.run_both(words)
+        assert translated == interpreted
+        assert translated[6]["012"] == "+0001"
+
+    def test_self_modifying_store(self):
+        # STORE at 002 rewrites 003 (an ADD) into a HALT before it runs
+        words = ["+020010", "+000000", "+021003", "+030011", "+043000",
+                 "+000000", "+000000", "+000000", "+000000", "+000000", "+043000", "+000005"]
+        interpreted, translated = self.run_both(words)
+        assert translated == interpreted
+        assert translated[4] == 3
+
+    def test_read_invalidates_compiled_block(self):
+        # First pass runs the loop block, then READ overwrites its STORE with a HALT
+        words = ["+020010", "+021011", "+010003", "+040000", "+000000",
+                 "+000000", "+000000", "+000000", "+000000", "+000000", "+000007", "+000000"]
+        interpreted, translated = self.run_both(words, ["4300"])
+        assert translated == interpreted
+        assert translated[0] == "halted"
+
+    def test_runtime_error_and_limit(self):
+        words = ["+020010", "+032011", "+043000"] + ["+000000"] * 7 + ["+000004", "+000000"]
+        interpreted, translated = self.run_both(words)
+        assert translated == interpreted
+        assert translated[2][0] == "Runtime Error at line 001: Division by zero error"
+        interpreted, translated = self.run_both(["+040000"], max_steps=1500)
+        assert translated == interpreted
+        assert translated[0] == "limit"
+
+    def test_edit_between_runs_recompiles(self):
+        machine = translator.TranslatedMachine()
+        machine.load_program(["+020010", "+011010", "+043000"] + ["+000000"] * 7 + ["+000001"])
+        output = []
+        machine.execute(lambda: None, output.append, lambda text: None)
+        machine.memory[1] = "+030010"  # WRITE -> ADD
+        machine.memory[2] = "+021010"
+        machine.memory[3] = "+011010"
+        machine.memory[4] = "+043000"
+        machine.execute(lambda: None, output.append, lambda text: None)
+        assert output == ["+000001", "+0002"]
+
+    def test_run_headless_blocks_engine(self, tmp_path, capsys):
+        inputs = tmp_path / "inputs.txt"
+        inputs.write_text("5\n7\n")
+        assert main.main(["run", "Test1.txt", "--input", str(inputs), "--engine", "blocks"]) == 0
+        assert capsys.readouterr().out == "+0012\n"
+
+
+class TestVector:
+    """Tests for the NumPy lockstep engine in vector.py (skipped without NumPy)"""
+
+    def setup_method(self):
+        self.vector = pytest.importorskip("vector")
+
+    def scalar_results(self, words, input_sets, max_steps):
+        keys = ["halt_reason", "accumulator", "program_counter", "steps", "outputs", "error"]
+        return [{key: result[key] for key in keys}
+                for result in (batch.run_job(("p", words, "i", inputs, max_steps, None, "interpreter", None, False,
+                                              main.MEMORY_SIZE))
+                               for inputs in input_sets)]
+
+    def test_lanes_match_interpreter(self):
+        program, _ = main.load_program(open("TeamTest.txt"))
+        input_sets = [[str(a), str(b)] for a in range(-12, 13, 3) for b in (-7, 0, 7, 9999)]
+        input_sets += [[], ["5"], ["x", "12", "+-5"]]
+        expected = self.scalar_results(program, input_sets, 1000)
+        assert self.vector.run_lanes(program, input_sets, 1000) == expected
+
+    def test_divergent_branches_and_errors(self, monkeypatch):
+        monkeypatch.setattr(self.vector, "SCALAR_LANES", 0)  # keep every lane on the arrays
+        # acc = input; divide 100 by it, loop down to zero when positive, stop when negative
+        words = ["+010020", "+020021", "+032020", "+011021", "+020020", "+041010", "+042010", "+031022",
+                 "+021020", "+040004", "+043000", "+000000"] + ["+000000"] * 8 + ["+000000", "+000100", "+000001"]
+        input_sets = [["0"], ["3"], ["-4"], ["250"], ["-10000"], []]
+        expected = self.scalar_results(words, input_sets, 200)
+        results = self.vector.run_lanes(words, input_sets, 200)
+        assert results == expected
+        assert results[0]["error"] == "Runtime Error at line 002: Division by zero error"
+        assert results[3]["halt_reason"] == "limit"
+
+    def test_batch_vector_engine(self, tmp_path):
+        for i, values in enumerate([("5", "7"), ("-3", "3"), ("1",)]):
+            (tmp_path / f"in{i}.txt").write_text("\n".join(values))
+        inputs = sorted(str(path) for path in tmp_path.glob("in*.txt"))
+        strip = lambda results: [{k: v for k, v in r.items() if k != "wall_time"} for r in results]
+        expected = batch.run_batch(["Test1.txt", "Test2.txt"], inputs, workers=1)
+        assert strip(batch.run_batch(["Test1.txt", "Test2.txt"], inputs, workers=1, engine="vector")) == strip(expected)
+
+
+class TestImage:
+    """Tests for binary program images in main.py"""
+
+    def loaded_machine(self, path="TeamTest.txt"):
+        machine = main.Machine()
+        machine.load_program(main.load_program(open(path))[0])
+        return machine
+
+    def test_pack_unpack_round_trip(self):
+        machine = self.loaded_machine()
+        machine.memory[30] = "-0000"  # keeps 4-digit width and the sign on zero
+        machine.memory[31] = "+0042"
+        memory = main.Memory()
+        main.unpack_image(main.pack_image(machine.memory), memory)
+        assert memory.to_dict() == machine.memory.to_dict()
+
+    def test_image_header_and_length(self):
+        image = main.pack_image(self.loaded_machine().memory)
+        assert image[:4] == b"UVSB"
+        length = len(main.load_program(open("TeamTest.txt"))[0])
+        assert len(image) == 16 + 5 * length  # trailing +000000 words are not stored
+
+    def test_corrupt_image_rejected(self):
+        image = bytearray(main.pack_image(self.loaded_machine().memory))
+        image[20] ^= 1
+        with pytest.raises(ValueError, match="checksum"):
+            main.unpack_image(image, main.Memory())
+        with pytest.raises(ValueError, match="truncated"):
+            main.unpack_image(bytes(image[:-1]), main.Memory())
+        with pytest.raises(ValueError, match="Not a program image"):
+            main.unpack_image(b"+1007\n+4300\n+0000\n+0000", main.Memory())
+
+    def crafted_image(self, values, flags):
+        import zlib
+        from array import array
+        payload = array("i", values).tobytes() + bytes(flags)  # little-endian hosts only
+        return main._IMAGE_HEADER.pack(main._IMAGE_MAGIC, main._IMAGE_VERSION, 4, len(values),
+                                       zlib.crc32(payload)) + payload
+
+    def test_crafted_image_rejected(self):
+        memory = main.Memory()
+        memory[0] = "+1007"
+        main.unpack_image(self.crafted_image([43000, 7], [main.WIDE, 0]), main.Memory())
+        with pytest.raises(ValueError, match="out of range"):
+            main.unpack_image(self.crafted_image([1000000], [main.WIDE]), memory)
+        with pytest.raises(ValueError, match="flags"):
+            main.unpack_image(self.crafted_image([7], [4]), memory)
+        assert memory[0] == "+1007"
+
+    def test_image_load_is_journaled(self):
+        memory = main.Memory(main.PAGED_MEMORY * 2)
+        memory[100000] = "+000001"
+        checkpoint = memory.checkpoint()
+        memory.take_dirty()
+        main.unpack_image(self.crafted_image([43000, 7], [main.WIDE, main.WIDE]), memory)
+        assert {0, 1, 100000} <= memory.take_dirty()
+        assert (memory[0], memory[100000]) == ("+043000", "+000000")
+        memory.restore(checkpoint)
+        assert (memory[0], memory[1], memory[100000]) == ("+000000", "+000000", "+000001")
+
+    def test_invalid_text_cannot_be_packed(self):
+        machine = self.loaded_machine()
+        machine.memory[5] = "abc"
+        with pytest.raises(ValueError, match="Line 005"):
+            main.pack_image(machine.memory)
+
+    def test_convert_and_run_image(self, tmp_path, capsys):
+        image = tmp_path / "test1.uvb"
+        text = tmp_path / "test1.txt"
+        main.main(["convert", "Test1.txt", str(image)])
+        main.main(["convert", str(image), str(text)])
+        converted = main.Machine()
+        converted.load_program(main.load_program(open(text))[0])
+        assert converted.memory.to_dict() == self.loaded_machine("Test1.txt").memory.to_dict()
+        inputs = tmp_path / "inputs.txt"
+        inputs.write_text("5\n7\n")
+        assert main.main(["run", str(image), "--input", str(inputs)]) == 0
+        assert capsys.readouterr().out == "+0012\n"
+
+    def test_batch_runs_images(self, tmp_path):
+        image = tmp_path / "test1.uvb"
+        main.convert_program("Test1.txt", image)
+        (tmp_path / "in.txt").write_text("5\n7\n")
+        results = batch.run_batch([str(image)], [str(tmp_path / "in.txt")], workers=1)
+        assert results[0]["outputs"] == ["+0012"]
+
+
+class TestSnapshot:
+    """Tests for machine checkpoints and journaled memory restore"""
+
+    def test_restore_puts_back_only_written_cells(self):
+        machine = main.Machine()
+        machine.load_program(main.load_program(open("Test1.txt"))[0])
+        before = machine.memory.to_dict()
+        snapshot = machine.checkpoint()
+        assert machine.memory.journal == {}  # O(1): nothing copied yet
+
+        machine.execute(iter(["5", "7"]).__next__, lambda word: None, lambda text: None)
+        machine.memory[40] = "abc"
+        written = set(machine.memory.journal)
+        machine.memory.take_dirty()
+
+        assert machine.restore(snapshot) == written
+        assert machine.memory.take_dirty() == written
+        assert machine.memory.to_dict() == before
+        assert (machine.accumulator, machine.program_counter) == ("+000000", 0)
+
+    def test_nested_checkpoints(self):
+        machine = main.Machine()
+        machine.memory[1] = "+0001"
+        first = machine.checkpoint()
+        machine.memory[1] = "+0002"
+        machine.accumulator = "+0005"
+        second = machine.checkpoint()
+        machine.memory[1] = "+0003"
+        machine.memory[2] = "+0004"
+
+        machine.restore(second)
+        assert (machine.memory[1], machine.memory[2], machine.accumulator) == ("+0002", "+000000", "+0005")
+        machine.memory[2] = "+0009"
+        machine.restore(first)
+        assert (machine.memory[1], machine.memory[2], machine.accumulator) == ("+0001", "+000000", "+000000")
+        with pytest.raises(ValueError, match="no longer valid"):
+            machine.restore(second)
+
+    def test_snapshot_rewinds_input_position(self):
+        channel = main.InputChannel(["1", "2", "3"])
+        machine = main.Machine()
+        snapshot = machine.checkpoint(channel)
+        channel.get(timeout=0)
+        channel.get(timeout=0)
+        machine.restore(snapshot, channel)
+        assert channel.get(timeout=0) == "1"
+
+    def test_translated_store_is_journaled(self):
+        machine = translator.TranslatedMachine()
+        machine.load_program(["+020010", "+021011", "+043000"] + ["+000000"] * 7 + ["+000007"])
+        snapshot = machine.checkpoint()
+        machine.execute(lambda: None, print, lambda text: None)
+        assert machine.memory[11] == "+000007"
+        machine.restore(snapshot)
+        assert machine.memory[11] == "+000000"
+
+
+class TestHistory:
+    """Tests for the undo log and reverse execution"""
+
+    # acc = mem[10] + 1 is stored back into 10 forever
+    COUNTER = ["+020010", "+030011", "+021010", "+040000"] + ["+000000"] * 7 + ["+000001"]
+
+    def run(self, program, capacity=main.HISTORY_STEPS, inputs=(), max_steps=None):
+        machine = main.Machine()
+        machine.load_program(program)
+        channel = main.InputChannel(inputs)
+        machine.history = main.History(capacity, channel)
+        outputs = []
+        reason = machine.execute(lambda: channel.get(timeout=0), outputs.append, lambda text: None,
+                                 max_steps=max_steps)
+        return machine, channel, outputs, reason
+
+    def test_step_back_and_goto_step(self):
+        machine, _, _, _ = self.run(self.COUNTER, max_steps=40)
+        assert machine.history.end == 40 and machine.memory[10] == "+0010"
+        assert machine.step_back() == set()  # undoing the BRANCH touches no cell
+        assert machine.program_counter == 3
+        assert machine.step_back() == {10}
+        assert (machine.memory[10], machine.accumulator, machine.program_counter) == ("+0009", "+0010", 2)
+        machine.goto_step(10)
+        assert (machine.memory[10], machine.accumulator, machine.program_counter) == ("+0002", "+0003", 2)
+        machine.goto_step(0)
+        assert (machine.memory[10], machine.accumulator, machine.program_counter) == ("+000000", "+000000", 0)
+        with pytest.raises(ValueError, match="not in the history"):
+            machine.goto_step(1)
+
+    def test_ring_buffer_is_bounded(self):
+        machine, _, _, _ = self.run(self.COUNTER, capacity=8, max_steps=1000)
+        history = machine.history
+        assert len(history.pcs) == 8 and (history.start, history.end) == (992, 1000)
+        machine.goto_step(992)
+        assert machine.memory[10] == "+0248"
+        with pytest.raises(ValueError, match="can be undone"):
+            machine.step_back()
+
+    def test_rewind_to_write_and_inputs(self):
+        program = ["+1020", "+1021", "+2020", "+3021", "+2122", "+1122", "+4300"]
+        machine, channel, outputs, reason = self.run(program, inputs=["4", "5"])
+        assert outputs == ["+0009"] and reason == "halted"
+        machine.rewind_to_write(21)
+        assert (machine.program_counter, machine.memory[21]) == (1, "+000000")
+        assert channel.get(timeout=0) == "5"  # the second READ's input is read again
+        with pytest.raises(ValueError, match="No write to cell 030"):
+            machine.rewind_to_write(30)
+
+    def test_invalid_text_is_restored(self):
+        machine = main.Machine()
+        machine.load_program(["+020010", "+021005", "+043000"])
+        machine.memory[5] = "abc"
+        machine.history = main.History()
+        machine.execute(lambda: None, print, lambda text: None)
+        assert machine.memory[5] == "+000000"
+        machine.rewind_to_write(5)
+        assert machine.memory[5] == "abc"
+
+    def test_resume_after_step_back_gives_same_run(self):
+        expected = self.run(self.COUNTER, max_steps=200)[0].memory.to_dict()
+        rewound = False
+
+        def on_step():
+            nonlocal rewound
+            if machine.history.end == 50 and not rewound:
+                rewound = True
+                machine.step_back(7)
+
+        machine = main.Machine()
+        machine.load_program(self.COUNTER)
+        machine.history = main.History()
+        machine.execute(lambda: None, print, lambda text: None, on_step, max_steps=207)
+        assert machine.memory.to_dict() == expected
+
+    def test_failed_step_is_not_logged(self):
+        machine, _, _, reason = self.run(["+020010", "+032011"])
+        assert reason == "error" and machine.history.end == 1
+
+    def test_translator_logs_through_interpreter(self):
+        machine = translator.TranslatedMachine()
+        machine.load_program(self.COUNTER)
+        machine.history = main.History()
+        machine.execute(lambda: None, print, lambda text: None, max_steps=12)
+        assert machine.history.end == 12
+        machine.goto_step(4)
+        assert machine.memory[10] == "+0001"
+
+
+class TestBreakpoints:
+    """Tests for breakpoints, watchpoints and accumulator conditions"""
+
+    # Reads two numbers, adds them into 22, writes 22 and halts
+    PROGRAM = ["+1020", "+1021", "+2020", "+3021", "+2122", "+1122", "+4300"]
+
+    def start(self, breakpoints, engine="interpreter", inputs=("4", "5")):
+        machine = main.machine_class(engine)()
+        machine.load_program(self.PROGRAM)
+        machine.breakpoints = breakpoints
+        channel = main.InputChannel(inputs)
+        messages = []
+        outputs = []
+
+        def run(start=None):
+            return machine.execute(lambda: channel.get(timeout=0), outputs.append, messages.append, start=start)
+        return machine, run, outputs, messages
+
+    def test_breakpoint_stops_before_instruction_and_continues(self):
+        breakpoints = main.Breakpoints()
+        breakpoints.toggle(4)
+        machine, run, outputs, messages = self.start(breakpoints)
+        assert run() == "break"
+        assert breakpoints.hit == main.Hit("break", 4, None)
+        assert (machine.program_counter, machine.accumulator, machine.memory[22]) == (4, "+0009", "+000000")
+        assert "Breakpoint at line 004" in messages
+        assert run(start=machine.program_counter) == "halted"
+        assert outputs == ["+0009"]
+
+    def test_breakpoint_set_during_a_run(self):
+        machine = main.Machine()
+        machine.load_program(self.PROGRAM)
+        channel = main.InputChannel(["4", "5"])
+
+        def on_step():  # like the GUI: the user sets a breakpoint while the run is paused
+            if machine.program_counter == 2:
+                machine.breakpoints = main.Breakpoints()
+                machine.breakpoints.toggle(4)
+        assert machine.execute(lambda: channel.get(timeout=0), print, lambda text: None, on_step) == "break"
+        assert machine.program_counter == 4
+
+    def test_watchpoints(self):
+        breakpoints = main.Breakpoints()
+        breakpoints.watch(21, read=True, write=True)
+        machine, run, _, messages = self.start(breakpoints)
+        assert run() == "break" and breakpoints.hit == main.Hit("write", 1, 21)
+        assert machine.program_counter == 2 and machine.memory[21] == "+0005"
+        assert run(start=machine.program_counter) == "break" and breakpoints.hit == main.Hit("read", 3, 21)
+        assert messages[-1] == "Watchpoint: line 003 read cell 021"
+        assert run(start=machine.program_counter) == "halted"
+
+    def test_accumulator_condition(self):
+        breakpoints = main.Breakpoints()
+        assert breakpoints.add_condition(" > 8") == (">", 8)
+        machine, run, _, _ = self.start(breakpoints)
+        assert run() == "break"
+        assert breakpoints.hit == main.Hit("accumulator", 3, "> 8") and machine.accumulator == "+0009"
+        with pytest.raises(ValueError, match="Invalid accumulator condition"):
+            breakpoints.add_condition("acc is big")
+
+    def test_empty_breakpoints_are_not_armed(self):
+        breakpoints = main.Breakpoints()
+        assert not breakpoints
+        breakpoints.toggle(2)
+        assert breakpoints
+        breakpoints.toggle(2)
+        machine, run, outputs, _ = self.start(breakpoints, engine="blocks")
+        assert run() == "halted" and outputs == ["+0009"]
+
+    def test_blocks_engine_stops_like_interpreter(self):
+        breakpoints = main.Breakpoints()
+        breakpoints.toggle(5)
+        machine, run, _, _ = self.start(breakpoints, engine="blocks")
+        assert run() == "break" and machine.program_counter == 5 and machine.memory[22] == "+0009"
+
+    def test_headless_break_prints_registers(self, tmp_path, capsys):
+        program = tmp_path / "program.txt"
+        program.write_text("\n".join(["+2005", "+3005", "+2105", "+4300", "+0000", "+0002"]))
+        assert main.main(["run", str(program), "--break", "3", "--watch", "5"]) == 0
+        err = capsys.readouterr().err
+        assert "Watchpoint: line 002 wrote cell 005" in err
+        assert "Breakpoint at line 003" in err
+        assert "Accumulator: +0004 Program Counter: 003" in err
+
+    def test_headless_read_watch(self, tmp_path, capsys):
+        program = tmp_path / "program.txt"
+        program.write_text("\n".join(["+2005", "+3005", "+2105", "+4300", "+0000", "+0002"]))
+        assert main.main(["run", str(program), "--watch-read", "5"]) == 0
+        err = capsys.readouterr().err
+        assert err.count("read cell 005") == 2 and "wrote" not in err
+
+
+class TestProfile:
+    """Tests for the per-address execution profiler"""
+
+    # Counts cell 20 down from 3 to 0, writing it each time
+    COUNTDOWN = ["+2020", "+3121", "+2120", "+1120", "+4206", "+4000", "+4300"] + ["+0000"] * 13 + ["+0003", "+0001"]
+
+    def profile(self, engine="interpreter"):
+        machine = main.machine_class(engine)()
+        machine.load_program(self.COUNTDOWN)
+        machine.profile = main.Profile()
+        assert machine.execute(lambda: None, lambda word: None, lambda text: None) == "halted"
+        return machine
+
+    def test_counts(self):
+        profile = self.profile().profile
+        assert list(profile.executions[:7]) == [3, 3, 3, 3, 3, 2, 1]
+        assert (profile.taken[4], profile.not_taken[4], profile.taken[5]) == (1, 2, 2)
+        assert (profile.reads[20], profile.writes[20], profile.reads[21]) == (6, 3, 3)
+        assert profile.steps == 18
+        assert profile.opcode_counts() == {"LOAD": 3, "SUBTRACT": 3, "STORE": 3, "WRITE": 3, "BRANCHZERO": 3,
+                                           "BRANCH": 2, "HALT": 1}
+
+    def test_hottest(self):
+        assert self.profile().profile.hottest(3) == [(0, 3), (1, 3), (2, 3)]
+
+    def test_large_memory_profile_is_paged(self):
+        machine = main.Machine(memory_size=10 ** 7)
+        machine.load_program(self.COUNTDOWN)
+        machine.profile = main.Profile(len(machine.memory))
+        assert not machine.profile.executions.pages
+        assert machine.execute(lambda: None, lambda word: None, lambda text: None) == "halted"
+        profile = machine.profile
+        assert len(profile.executions.pages) == 1 and profile.steps == 18
+        assert [row["address"] for row in profile.rows()] == ["000", "001", "002", "003", "004", "005", "006",
+                                                              "020", "021"]
+        assert profile.hottest(1) == [(0, 3)]
+
+    def test_blocks_engine_profiles_through_interpreter(self):
+        assert list(self.profile("blocks").profile.executions) == list(self.profile().profile.executions)
+
+    def test_rows_and_export(self, tmp_path):
+        machine = self.profile()
+        rows = machine.profile.rows(machine.memory)
+        assert [row["address"] for row in rows] == ["000", "001", "002", "003", "004", "005", "006", "020", "021"]
+        assert rows[4] == {"address": "004", "word": "+4206", "executions": 3, "taken": 1, "not_taken": 2,
+                           "reads": 0, "writes": 0}
+
+        main.write_profile(machine.profile, str(tmp_path / "profile.csv"), machine.memory)
+        with open(tmp_path / "profile.csv", newline="") as f:
+            assert list(csv.DictReader(f))[7] == {"address": "020", "word": "+0000", "executions": "0", "taken": "0",
+                                                   "not_taken": "0", "reads": "6", "writes": "3"}
+        main.write_profile(machine.profile, str(tmp_path / "profile.json"))
+        with open(tmp_path / "profile.json") as f:
+            data = json.load(f)
+        assert data["steps"] == 18 and data["opcodes"]["HALT"] == 1 and len(data["addresses"]) == 9
+
+    def test_headless_profile(self, tmp_path, capsys):
+        program = tmp_path / "program.txt"
+        program.write_text("\n".join(self.COUNTDOWN))
+        assert main.main(["run", str(program), "--profile", str(tmp_path / "out.json")]) == 0
+        assert capsys.readouterr().out.split() == ["+0002", "+0001", "+0000"]
+        with open(tmp_path / "out.json") as f:
+            assert json.load(f)["addresses"][0]["executions"] == 3
+
+
+class TestBench:
+    """Tests for the benchmark suite and baseline comparison"""
+
+    def test_slower_engines(self):
+        results = {"run.tight_loop.interpreter": {"rate": 10.0}, "run.tight_loop.blocks": {"rate": 40.0},
+                   "run.self_modifying.interpreter": {"rate": 10.0}, "run.self_modifying.blocks": {"rate": 5.0},
+                   "run.io_heavy.interpreter": {"rate": 10.0}, "run.io_heavy.blocks": {"rate": 5.0}}
+        assert bench.slower_engines(results) == ["self_modifying"]
+        assert bench.slower_engines({"run.self_modifying.blocks": {"rate": 5.0}}) == []
+
+    def test_run_benchmarks(self):
+        results = bench.run_benchmarks(["convert_4_to_6_digit", "run.io_heavy.blocks"], repeat=1)
+        assert list(results) == ["convert_4_to_6_digit", "run.io_heavy.blocks"]
+        assert results["run.io_heavy.blocks"]["units"] == 100000
+        assert results["convert_4_to_6_digit"]["unit"] == "calls"
+        assert all(result["rate"] > 0 and result["peak_bytes"] >= 0 for result in results.values())
+
+    def test_compare_flags_regressions(self):
+        baseline = {"fast": {"rate": 100.0}, "slow": {"rate": 100.0}, "gone": {"rate": 1.0}}
+        rows = bench.compare({"fast": {"rate": 95.0}, "slow": {"rate": 80.0}, "new": {"rate": 5.0}}, baseline)
+        assert [(name, regressed) for name, _, _, _, regressed in rows] == [("fast", False), ("slow", True)]
+        assert rows[1][3] == pytest.approx(-0.2)
+
+    def test_save_and_compare_baseline(self, tmp_path, capsys):
+        path = str(tmp_path / "baseline.json")
+        assert main.main(["bench", "_overflow_value", "--repeat", "1", "--save", path]) == 0
+        assert "_overflow_value" in bench.load_baseline(path)
+        assert bench.main(["_overflow_value", "--repeat", "1", "--compare", path, "--threshold", "0.9"]) == 0
+
+        with open(path) as f:
+            data = json.load(f)
+        data["results"]["_overflow_value"]["rate"] *= 100
+        with open(path, "w") as f:
+            json.dump(data, f)
+        assert bench.main(["_overflow_value", "--repeat", "1", "--compare", path]) == 1
+        assert "REGRESSION" in capsys.readouterr().out
+
+    def test_main_bench_options_first(self, tmp_path):
+        path = str(tmp_path / "baseline.json")
+        assert main.main(["bench", "--save", path, "--repeat", "1", "_overflow_value"]) == 0
+        assert main.main(["bench", "--compare", path, "--threshold", "0.9", "--repeat", "1", "_overflow_value"]) == 0
+
+
+class TestBudgets:
+    """Tests for the READ budget and endless loop detection"""
+
+    def run(self, program, engine="interpreter", inputs=(), **budgets):
+        machine = main.machine_class(engine)()
+        machine.load_program(program)
+        channel = main.InputChannel(inputs)
+        messages = []
+        reason = machine.execute(lambda: channel.get(timeout=0), lambda word: None, messages.append, **budgets)
+        return reason, machine.steps, messages
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_branch_to_itself_is_a_loop(self, engine):
+        reason, steps, messages = self.run(["+1020", "+4001"], engine, ["3"], detect_loops=True)
+        assert reason == "loop" and steps == 2 * main._BUDGET_CHECK_STEPS
+        assert messages[-1] == "Program stopped: endless loop detected at line 001"
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_loop_without_writes_is_found(self, engine):
+        # acc counts 0, 1, 2 ... 9999 and round again without touching memory
+        reason, _, _ = self.run(["+3005", "+4000", "+0000", "+0000", "+0000", "+0001"], engine,
+                                detect_loops=True, max_steps=2000000)
+        assert reason == "loop"
+
+    def test_counting_loop_is_not_a_loop(self):
+        counter = ["+020010", "+030011", "+021010", "+040000"] + ["+000000"] * 7 + ["+000001"]
+        assert self.run(counter, detect_loops=True, max_steps=50000)[0] == "limit"
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_read_budget(self, engine):
+        reason, steps, messages = self.run(["+1020", "+4000"], engine, ["1"] * 10, max_reads=3)
+        assert reason == "limit" and steps == 7
+        assert messages[-1] == "Program stopped: input limit of 3 READs reached at line 000"
+
+    def test_batch_reports_loops(self, tmp_path):
+        (tmp_path / "spin.txt").write_text("+4000\n")
+        results = batch.run_batch([str(tmp_path / "spin.txt")], workers=1)
+        assert results[0]["halt_reason"] == "loop"
+        results = batch.run_batch([str(tmp_path / "spin.txt")], workers=1, max_steps=5000, detect_loops=False)
+        assert results[0]["halt_reason"] == "limit"
+
+    def test_headless_budgets(self, tmp_path, capsys):
+        program = tmp_path / "spin.txt"
+        program.write_text("+4000\n")
+        assert main.main(["run", str(program)]) == 1
+        assert "endless loop detected at line 000" in capsys.readouterr().err
+        assert main.main(["run", str(program), "--no-loop-detection", "--max-steps", "100"]) == 1
+        assert "instruction limit of 100" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_budget_spans_breakpoints(self, engine):
+        # READ 20, WRITE 20, BRANCH 00 with a breakpoint on the WRITE: every pass stops once
+        machine = main.machine_class(engine)()
+        machine.load_program(["+1020", "+1120", "+4000"])
+        machine.breakpoints = main.Breakpoints()
+        machine.breakpoints.pcs.add(1)
+        budget = main.Budget(max_steps=100, max_reads=20)
+        messages = []
+        reason = machine.execute(lambda: "5", lambda word: None, messages.append, budget=budget)
+        while reason == "break":
+            reason = machine.execute(lambda: "5", lambda word: None, messages.append,
+                                     start=machine.program_counter, budget=budget)
+        assert reason == "limit" and budget.steps == 61 and budget.reads == 20
+        assert messages[-1] == "Program stopped: input limit of 20 READs reached at line 000"
+
+    def test_headless_limits_span_breakpoints(self, tmp_path, capsys):
+        program = tmp_path / "spin.txt"
+        program.write_text("+4000\n")
+        assert main.main(["run", str(program), "--break", "0", "--no-loop-detection", "--max-steps", "50"]) == 1
+        assert "instruction limit of 50 reached" in capsys.readouterr().err
+        assert main.main(["run", str(program), "--break", "0"]) == 1
+        assert "endless loop detected at line 000" in capsys.readouterr().err
+
+
+class TestMessageLog:
+    """Tests for the bounded System Messages log"""
+
+    def test_batches_pending_lines(self):
+        log = main.MessageLog(cap=5)
+        for i in range(3):
+            log.append(f"line {i}")
+        assert log.take_pending() == (["line 0", "line 1", "line 2"], 0)
+        assert log.take_pending() == ([], 0)
+
+    def test_keeps_only_the_last_cap_lines(self):
+        log = main.MessageLog(cap=5)
+        for i in range(3):
+            log.append(f"line {i}")
+        log.take_pending()
+        for i in range(3, 10):
+            log.append(f"line {i}")
+        lines, drop = log.take_pending()
+        assert lines == [f"line {i}" for i in range(5, 10)]
+        assert drop == 3  # the view held 3 lines and gets 5 more
+        assert list(log.lines) == lines and log.total == 10
+
+    def test_large_output_stays_bounded(self):
+        log = main.MessageLog(cap=100)
+        for i in range(100000):
+            log.append(str(i))
+            if i % 1000 == 0:
+                log.take_pending()
+        assert len(log.lines) == 100 and log.lines[-1] == "99999"
+
+    def test_clear(self):
+        log = main.MessageLog(cap=3)
+        log.append("a")
+        log.take_pending()
+        log.clear()
+        log.append("b")
+        assert log.take_pending() == (["b"], 0) and log.total == 1
+
+    def test_spill_to_file(self, tmp_path):
+        path = tmp_path / "messages.log"
+        log = main.MessageLog(cap=2)
+        log.append("kept")
+        log.spill_to(str(path))
+        for i in range(5):
+            log.append(str(i))
+        log.spill_to(None)
+        log.append("not spilled")
+        assert path.read_text().splitlines() == ["kept", "0", "1", "2", "3", "4"]
+        assert log.spill is None
+
+
+class TestMemoryTable:
+    """Rows of the memory table in interface.py are drawn from the machine's memory"""
+
+    def window(self):
+        import interface as face
+        window = face.Window.__new__(face.Window)
+        window.heat_peak = 0
+        return window
+
+    def test_row_values_and_stripes(self):
+        machine = main.Machine()
+        machine.load_program(["+1007", "+4300"])
+        window = self.window()
+        assert window._memory_row(machine, 0) == (("000", "+1007", ""), ("even",))
+        assert window._memory_row(machine, 1) == (("001", "+4300", ""), ("odd",))
+
+    def test_invalid_and_marked_rows(self):
+        machine = main.Machine()
+        machine.memory[3] = "abc"
+        machine.breakpoints = main.Breakpoints()
+        machine.breakpoints.toggle(3)
+        machine.profile = main.Profile(len(machine.memory))
+        machine.profile.executions[3] = 5
+        values, tags = self.window()._memory_row(machine, 3)
+        assert values == ("003", "abc", 5)
+        assert tags[0] == "invalid" and "breakpoint" in tags and tags[1].startswith("heat")
+
+    def test_copy_and_cut_read_the_memory_model(self):
+        class Table:  # the rows of addresses 1 and 3 are selected
+            def __init__(self, machine):
+                self.machine = machine
+                self.redrawn = set()
+
+            def selection(self):
+                return ("row3", "row1")
+
+            def address(self, item):
+                return int(item[3:])
+
+            def redraw(self, addresses):
+                self.redrawn |= set(addresses)
+
+        window = self.window()
+        window.machine = main.Machine()
+        window.machine.load_program(["+1007", "+2008", "+4300", "+1109"])
+        window.memoryState = Table(window.machine)
+        messages = []
+        window.write_system = messages.append
+        window.copy_selection()
+        assert window.clipboard == ["+2008", "+1109"]
+        window.machine.memory.take_dirty()
+        window.cut_selection()
+        assert window.clipboard == ["+2008", "+1109"] and messages[-1] == "Cut 2 item(s)"
+        assert window.machine.memory[1] == window.machine.memory[3] == "+000000"
+        assert window.memoryState.redrawn == {1, 3}
+
+    def test_validation_uses_the_memory_model(self):
+        window = self.window()
+        window.machine = main.Machine()
+        window.memoryState = None
+        window.machine.memory[7] = "12x4"
+        window.machine.memory[2] = "+12345"
+        assert window.validate_memory_from_editor() == [
+            "002: Invalid instruction length: '+12345' (must be 4 or 6 digits plus sign)",
+            "007: Word instruction contains invalid characters"]
+        window.machine.memory[2] = "+1234"
+        assert window.validate_memory_from_editor() == ["007: Word instruction contains invalid characters"]
+
+
+class TestMemorySize:
+    """Tests for configurable memory sizes and paged memory"""
+
+    def test_default_size(self):
+        assert len(main.Machine().memory) == main.MEMORY_SIZE == 250
+        assert not main.Machine().memory.paged
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_branch_limit_follows_size(self, engine):
+        messages = []
+        machine = main.machine_class(engine)()
+        machine.load_program(["+040600"])
+        assert machine.execute(lambda: None, print, messages.append) == "error"
+        machine = main.machine_class(engine)(memory_size=1000)
+        machine.load_program(["+040600"])
+        machine.memory[600] = "+043000"
+        assert machine.execute(lambda: None, print, messages.append) == "halted"
+        assert machine.program_counter == 600
+
+    def test_out_of_range_write(self):
+        with pytest.raises(IndexError):
+            main.Machine().memory[250] = "+000001"
+
+    def test_paged_memory_allocates_written_pages_only(self):
+        memory = main.Memory(main.PAGED_MEMORY * 4)
+        assert memory.paged and memory.address_width == 6
+        memory[200000] = "+001234"
+        assert memory[200000] == "+001234" and memory[200001] == "+000000"
+        assert len(memory.values.pages) == 1 and not memory.flags.pages
+        assert memory.used_length() == 200001
+        assert memory.skip_empty(0) == 200000 and memory.skip_empty(200001) == len(memory)
+
+    def test_paged_memory_clear_and_restore(self):
+        memory = main.Memory(main.PAGED_MEMORY * 2)
+        memory[70000] = "-0005"
+        checkpoint = memory.checkpoint()
+        memory.clear()
+        assert memory[70000] == "+000000" and not memory.values.pages
+        memory.restore(checkpoint)
+        assert memory[70000] == "-0005"
+
+    def test_paged_image_round_trip(self):
+        machine = main.Machine(memory_size=main.PAGED_MEMORY * 2)
+        machine.load_program(["+010005", "+043000"])
+        machine.memory[100000] = "+000042"
+        image = main.pack_image(machine.memory)
+        memory = main.Memory(main.PAGED_MEMORY * 2)
+        main.unpack_image(image, memory)
+        assert main.program_words(memory) == main.program_words(machine.memory)
+        assert memory[100000] == "+000042"
+        with pytest.raises(ValueError, match="memory has 250 slots"):
+            main.unpack_image(image, main.Memory())
+
+    @pytest.mark.parametrize("engine", main.ENGINES)
+    def test_runs_off_the_end_of_a_large_memory(self, engine):
+        machine = main.machine_class(engine)(memory_size=10 ** 7)
+        machine.load_program(["+020100", "+030100", "+021100"])
+        machine.memory[100] = "+000007"
+        assert machine.execute(lambda: None, print, lambda text: None) == "finished"
+        assert machine.program_counter == 10 ** 7 and machine.steps == 4  # the data word runs too
+        assert machine.memory[100] == "+0014"
+
+    def test_load_source_size(self):
+        lines = ["+1000"] * 300
+        assert main.load_source(lines).errors == ["Line 251: Exceeds 250 memory slots."]
+        assert main.load_source(lines, 300).errors == []
+
+    def test_headless_and_batch_memory_size(self, tmp_path, capsys):
+        program = tmp_path / "long.txt"
+        program.write_text("+000000\n" * 300 + "+011300\n+043000\n")
+        assert main.main(["run", str(program)]) == 2
+        assert main.main(["run", str(program), "--memory-size", "400"]) == 0
+        assert capsys.readouterr().out == "+011300\n"
+        results = batch.run_batch([str(program)], workers=1, memory_size=400)
+        assert results[0]["halt_reason"] == "halted" and results[0]["program_counter"] == 301
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])  # Verbose output
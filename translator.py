@@ -0,0 +1,284 @@
+import time
+from collections import namedtuple
+import main as core
+from main import READ, WRITE, LOAD, STORE, ADD, SUBTRACT, DIVIDE, MULTIPLY, BRANCH, BRANCHNEG, BRANCHZERO
+
+# A compiled basic block: run() executes it and returns the next program
+# counter; count is the number of instructions in it, addresses their
+# addresses and entries the memory.decoded entries of every cell it covers,
+# used to spot cells changed since compiling.
+Block = namedtuple("Block", "run start end count addresses entries")
+
+_ARITHMETIC = {ADD: "+", SUBTRACT: "-", MULTIPLY: "*", DIVIDE: "//"}
+REBUILD_LIMIT = 4  # times a block is dropped by writes before its start address is left to the interpreter
+
+
+class _Fault(Exception):
+    """Raised by a block when instruction number index in it fails with error."""
+
+    def __init__(self, index, error):
+        super().__init__(index, error)
+        self.index = index
+        self.error = error
+
+
+# --- Machine that runs compiled basic blocks ---
+class TranslatedMachine(core.Machine):
+    """
+    Machine whose execute() translates straight-line runs of instructions
+    (basic blocks) into Python functions working on integer registers, so a
+    whole block runs as one call instead of one handler call per word.
+
+    A block starts at any address and ends after a branch, or before a READ,
+    HALT, empty cell or any word the translator leaves to the interpreter
+    (bad operands, unknown opcodes, invalid text). Compiled blocks are cached
+    per start address and dropped as soon as a STORE or READ writes one of
+    their cells; execute() also drops blocks whose cells were edited between
+    runs. The caches are dicts, so large memories cost nothing until their
+    cells run. Self-modifying code would otherwise recompile the same block
+    over and over: a start address whose block was dropped REBUILD_LIMIT
+    times is no longer compiled and runs through the interpreter.
+
+    Results are the same as Machine.execute, including step counts, limits,
+    loop detection and error messages. A run with an on_step hook, a
+    History, a Profile or armed Breakpoints needs per-instruction control
+    and uses the interpreter.
+    """
+
+    def __init__(self, memory=None, accumulator="+000000", program_counter=0, memory_size=core.MEMORY_SIZE):
+        super().__init__(memory, accumulator, program_counter, memory_size)
+        self._cache_memory = None
+
+    def __getstate__(self):
+        """Pickle without the block caches: compiled blocks are exec-built functions."""
+        state = self.__dict__.copy()
+        for name in ("_cache_memory", "_blocks", "_covering", "_drops"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_memory = None  # the caches are rebuilt on the next run
+
+    def _reset_cache(self):
+        self._cache_memory = self.memory
+        self._blocks = {}  # start address -> Block
+        self._covering = {}  # cell -> start addresses of blocks using it
+        self._drops = {}  # start address -> times its block was dropped
+
+    def _drop_stale(self):
+        """Drop blocks whose cells were written since they were compiled."""
+        decoded = self.memory.decoded
+        for block in list(self._blocks.values()):
+            if any(decoded[i] is not entry for i, entry in zip(range(block.start, block.end), block.entries)):
+                self._drop(block)
+
+    def _drop(self, block):
+        del self._blocks[block.start]
+        self._drops[block.start] = self._drops.get(block.start, 0) + 1
+        for i in range(block.start, block.end):
+            starts = self._covering[i]
+            starts.discard(block.start)
+            if not starts:
+                del self._covering[i]
+
+    def _invalidate(self, address):
+        """Drop every compiled block that contains address."""
+        for start in list(self._covering.get(address, ())):
+            self._drop(self._blocks[start])
+
+    def _compile(self, start):
+        """Translate the block starting at start; None if its first word must be interpreted."""
+        if self._drops.get(start, 0) >= REBUILD_LIMIT:
+            return None  # keeps being rewritten
+        memory = self.memory
+        decoded = memory.decoded
+        end = len(memory)
+        lines = []
+        addresses = []
+        next_pc = None
+        address = start
+
+        # Find the words of the block
+        while address < end:
+            opcode, operand, handler = decoded[address] or self._decode(address)
+            if handler is None:
+                break  # empty cell or invalid text
+            if handler not in (core.Machine._load, core.Machine._store, core.Machine._add, core.Machine._subtract,
+                               core.Machine._multiply, core.Machine._divide, core.Machine._op_write,
+                               core.Machine._op_branch, core.Machine._op_branchneg, core.Machine._op_branchzero):
+                break  # READ, HALT, unknown opcodes and bad operands
+            if opcode in (BRANCH, BRANCHNEG, BRANCHZERO) and operand >= end:
+                break
+            addresses.append(address)
+            address += 1
+            if opcode in (BRANCH, BRANCHNEG, BRANCHZERO):
+                break
+        if not addresses:
+            return None
+        stop = address
+
+        # A STORE into the block itself ends it, so the new word is decoded before it runs
+        for i, address in enumerate(addresses):
+            opcode, operand, _ = decoded[address]
+            if opcode == STORE and start <= operand < stop:
+                addresses = addresses[:i + 1]
+                stop = address + 1
+                break
+
+        for i, address in enumerate(addresses):
+            opcode, operand, _ = decoded[address]
+            if opcode == LOAD:
+                lines += [f"acc = values[{operand}]", f"accf = flags[{operand}]"]
+            elif opcode == STORE:
+                lines += [f"if memory.journal is not None: memory.save({operand})",
+                          f"values[{operand}] = acc", f"flags[{operand}] = accf",
+                          f"decoded[{operand}] = None", f"memory.dirty.add({operand})", "memory.version += 1",
+                          f"if invalid: invalid.pop({operand}, None)",
+                          f"if {operand} in covering: invalidate({operand})"]
+            elif opcode in _ARITHMETIC:
+                if opcode == DIVIDE:
+                    lines += [f"k = {i}", f"if values[{operand}] == 0: raise ValueError('Division by zero error')"]
+                # Same result as core._overflow
+                lines += [f"v = acc {_ARITHMETIC[opcode]} values[{operand}]",
+                          "if v >= 0: acc = v % 10000; accf = 0",
+                          "else: acc = -(-v % 10000); accf = 0 if acc else NEG_ZERO"]
+            elif opcode == WRITE:
+                lines += [f"k = {i}", f"m._write_output(memory[{operand}])"]
+            elif opcode == BRANCH:
+                next_pc = f"{operand}"
+            elif operand == address:
+                next_pc = f"{address + 1}"  # a conditional branch to itself never counts as a jump
+            else:
+                test = "acc < 0" if opcode == BRANCHNEG else "acc == 0"
+                next_pc = f"{operand} if {test} else {address + 1}"
+
+        body = "\n".join("        " + line for line in lines)
+        source = (
+            "def block():\n"
+            "    acc = m.acc; accf = m.acc_flags; k = 0\n"
+            "    try:\n"
+            f"{body or '        pass'}\n"
+            "    except Exception as e:\n"
+            "        m.acc = acc; m.acc_flags = accf\n"
+            "        raise Fault(k, e)\n"
+            "    m.acc = acc; m.acc_flags = accf\n"
+            f"    return {next_pc or stop}\n"
+        )
+        namespace = {
+            "m": self, "memory": memory, "values": memory.values, "flags": memory.flags,
+            "decoded": decoded, "invalid": memory.invalid,
+            "covering": self._covering, "invalidate": self._invalidate,
+            "NEG_ZERO": core.NEG_ZERO, "Fault": _Fault,
+        }
+        exec(compile(source, f"<block {start:03d}>", "exec"), namespace)
+
+        block = Block(namespace["block"], start, stop, len(addresses), addresses, decoded[start:stop])
+        self._blocks[start] = block
+        for i in range(start, stop):
+            self._covering.setdefault(i, set()).add(start)
+        return block
+
+    def execute(self, read_input, write_output, message=print, on_step=None, max_steps=None, timeout=None,
+                start=None, max_reads=None, detect_loops=False, budget=None):
+        """Run the program in memory starting at address 000 or start (see Machine.execute)."""
+        if on_step is not None or self.history is not None or self.profile is not None or self.breakpoints:
+            return super().execute(read_input, write_output, message, on_step, max_steps, timeout, start,
+                                   max_reads, detect_loops, budget)
+
+        memory = self.memory
+        if self._cache_memory is not memory:
+            self._reset_cache()
+        else:
+            self._drop_stale()
+        decoded = memory.decoded
+        size = len(memory)
+        blocks = self._blocks
+        covering = self._covering
+        if budget is None:
+            budget = core.Budget(max_steps, timeout, max_reads, detect_loops)
+        if budget.max_reads is not None:
+            read_input = core._limit_reads(read_input, budget)
+        self._read_input, self._write_output, self._message = read_input, write_output, message
+        self.program_counter = pc = start or 0
+        reason = "finished"
+
+        # Budgets are checked like Machine.execute; a block only runs if it
+        # ends before the next check is due
+        steps = first_step = budget.steps
+        limit = budget.max_steps if budget.max_steps is not None else float("inf")
+        deadline = budget.deadline
+        loops = budget.loops
+        check_at = min(limit, budget.next_check) if deadline is not None or loops is not None else limit
+
+        try:
+            while pc < size:
+                block = blocks.get(pc) or self._compile(pc)
+                if block is not None and steps + block.count <= check_at:
+                    try:
+                        pc = block.run()
+                    except _Fault as fault:
+                        steps += fault.index + 1
+                        self.program_counter = pc = block.addresses[fault.index]
+                        if isinstance(fault.error, core.RunStopped):
+                            raise fault.error
+                        message(f"Runtime Error at line {pc:03d}: {str(fault.error)}")
+                        message("Program halted")
+                        return "error"
+                    steps += block.count
+                    self.program_counter = pc
+                    continue
+
+                # One instruction through the interpreter
+                opcode, operand, handler = decoded[pc] or self._decode(pc)
+
+                if handler is None:
+                    if opcode is None:
+                        message(f"Parse Error at line {pc:03d}: {operand}")
+                        message("Program halted")
+                        return "error"
+                    self.program_counter = pc = memory.skip_empty(pc + 1)
+                    continue
+
+                if steps >= check_at:
+                    if steps >= limit:
+                        message(f"Program stopped: instruction limit of {budget.max_steps} reached at line {pc:03d}")
+                        return "limit"
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        message(f"Program stopped: time limit of {budget.timeout}s reached at line {pc:03d}")
+                        return "timeout"
+                    if loops is not None and loops.stuck(pc, self.acc, self.acc_flags, memory.version):
+                        message(f"Program stopped: endless loop detected at line {pc:03d}")
+                        return "loop"
+                    budget.next_check = steps + core._BUDGET_CHECK_STEPS
+                    check_at = min(limit, budget.next_check)
+                steps += 1
+
+                if opcode == core.HALT:
+                    message("Program halted normally")
+                    reason = "halted"
+                    break
+
+                try:
+                    if not handler(self, operand):
+                        self.program_counter += 1
+                except core.RunStopped:
+                    raise
+                except core._ReadLimit:
+                    message(f"Program stopped: input limit of {budget.max_reads} READs reached at line {pc:03d}")
+                    return "limit"
+                except Exception as e:
+                    message(f"Runtime Error at line {pc:03d}: {str(e)}")
+                    message("Program halted")
+                    return "error"
+
+                if opcode in (READ, STORE) and operand in covering:
+                    self._invalidate(operand)
+                pc = self.program_counter
+        finally:
+            self._read_input = self._write_output = self._message = None
+            self.steps = steps - first_step
+            budget.steps = steps
+
+        message("Program finished")
+        return reason
@@ -0,0 +1,343 @@
+import time
+import numpy as np
+import main as core
+from main import (READ, WRITE, LOAD, STORE, ADD, SUBTRACT, DIVIDE, MULTIPLY,
+                  BRANCH, BRANCHNEG, HALT, WIDE, NEG_ZERO, format_word)
+
+RUNNING, HALTED, FINISHED, ERROR, LIMIT, TIMEOUT, LOOP = range(7)
+REASONS = ["running", "halted", "finished", "error", "limit", "timeout", "loop"]
+SCALAR_LANES = 8  # this few lanes left running are rerun on the scalar engine
+
+_ARITHMETIC = {ADD: np.add, SUBTRACT: np.subtract, MULTIPLY: np.multiply}
+
+
+# --- One program over many input sets in lockstep ---
+class LaneMachine:
+    """
+    Runs one program once per input set ("lane") with NumPy arrays holding
+    every lane's accumulator, program counter and memory. Each round, lanes
+    are grouped by program counter (and by word, in case a lane rewrote its
+    code) and every group executes its instruction as one array operation,
+    so diverging branches simply split a group and re-merged lanes run
+    together again.
+
+    Results match running each input set on Machine.execute: outputs, final
+    accumulator and program counter, steps, halt reason and the first error
+    message. READ input values that are not integers are skipped, like the
+    batch runner does. timeout covers the whole lockstep run; max_reads and
+    loop detection work per lane like in Machine.execute.
+
+    A round costs about the same however few lanes take part, so once no
+    more than SCALAR_LANES are left running (e.g. a few inputs that loop
+    much longer) they are run again from the start on the basic-block
+    engine, which gives the same results.
+
+    Every lane has its own memory_size cells in one dense array, also for
+    sizes that Memory would store in pages.
+    """
+
+    def __init__(self, words, input_sets, memory_size=core.MEMORY_SIZE):
+        """words is the program as a list of words or as binary image bytes."""
+        self.words = words
+        template = core.Machine(memory_size=memory_size)
+        template.load_program(words)
+        lanes = len(input_sets)
+        self.size = len(template.memory)
+        # Memory is indexed [address, lane] so a word's lanes sit side by side
+        self.values = np.repeat(np.array(template.memory.values[:], dtype=np.int64)[:, None], lanes, axis=1)
+        self.flags = np.repeat(np.frombuffer(bytes(template.memory.flags[:]), dtype=np.uint8)[:, None], lanes, axis=1)
+        self.acc = np.zeros(lanes, dtype=np.int64)
+        self.acc_flags = np.full(lanes, WIDE, dtype=np.uint8)
+        self.pc = np.zeros(lanes, dtype=np.int64)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self.status = np.zeros(lanes, dtype=np.uint8)
+        self.version = np.zeros(lanes, dtype=np.int64)  # memory write version, for loop detection
+        self._loops = {}  # lane -> core._LoopDetector
+        self.max_reads = None
+        self.detect_loops = False
+
+        # READ input, encoded once per distinct text into (lanes x inputs) arrays
+        self.inputs = inputs = [[value for value in values if value.lstrip("+-").isdigit()]
+                                for values in input_sets]
+        width = max(map(len, inputs), default=0)
+        self.input_values = np.zeros((lanes, width), dtype=np.int64)
+        self.input_flags = np.zeros((lanes, width), dtype=np.uint8)
+        self.input_count = np.array([len(values) for values in inputs], dtype=np.int64)
+        self.input_position = np.zeros(lanes, dtype=np.int64)
+        self.input_text = {}  # (lane, index) -> input that does not make a valid word
+        encoded = {}
+        for lane, values in enumerate(inputs):
+            for index, text in enumerate(values):
+                if text not in encoded:
+                    word = core._input_word(text)
+                    try:
+                        encoded[text] = core.encode_word(word) + (None,)
+                    except Exception:
+                        encoded[text] = (0, WIDE, word)
+                value, flags, invalid = encoded[text]
+                self.input_values[lane, index] = value
+                self.input_flags[lane, index] = flags
+                if invalid is not None:
+                    self.input_text[(lane, index)] = invalid
+        self.errors = [""] * lanes
+        # (lane, address) -> text that is not a word, as in Memory.invalid
+        self.invalid = {(lane, address): text for address, text in template.memory.invalid.items()
+                        for lane in range(lanes)}
+        self._writes = []  # (lanes, values, flags, invalid texts) for every WRITE, in order
+        self._scalar_outputs = {}  # lane -> outputs of lanes rerun on the scalar engine
+        self._entries = {}  # (value, flags) -> decoded entry
+
+    def _decode(self, value, flags):
+        key = (value, flags)
+        if key not in self._entries:
+            self._entries[key] = core.decode_word(value, flags, self.size)
+        return self._entries[key]
+
+    def _stop(self, lanes, status, message=None):
+        self.status[lanes] = status
+        if message is not None:
+            for lane in lanes.tolist():
+                self.errors[lane] = message
+
+    def _fail(self, lanes, address, error):
+        self._stop(lanes, ERROR, f"Runtime Error at line {address:03d}: {error}")
+
+    def _set_acc(self, lanes, value):
+        """Store the four-digit result of an arithmetic operation like core._overflow."""
+        digits = np.abs(value) % 10000
+        negative = value < 0
+        self.acc[lanes] = np.where(negative, -digits, digits)
+        self.acc_flags[lanes] = np.where(negative & (digits == 0), NEG_ZERO, 0)
+
+    def _read(self, lanes, address, operand):
+        if self.max_reads is not None:
+            over = self.input_position[lanes] >= self.max_reads
+            if over.any():
+                self._stop(lanes[over], LIMIT,
+                           f"Program stopped: input limit of {self.max_reads} READs reached at line {address:03d}")
+                lanes = lanes[~over]
+        position = self.input_position[lanes]
+        missing = position >= self.input_count[lanes]
+        if missing.any():
+            self._fail(lanes[missing], address, "No input provided for READ instruction")
+            lanes, position = lanes[~missing], position[~missing]
+        self.input_position[lanes] += 1
+        if isinstance(operand, str):
+            self._fail(lanes, address, operand)  # address outside memory
+            return
+        self.version[lanes] += 1
+        self.values[operand, lanes] = self.input_values[lanes, position]
+        self.flags[operand, lanes] = self.input_flags[lanes, position]
+        if self.invalid or self.input_text:
+            for lane, index in zip(lanes.tolist(), position.tolist()):
+                if (lane, index) in self.input_text:
+                    self.invalid[(lane, operand)] = self.input_text[(lane, index)]
+                else:
+                    self.invalid.pop((lane, operand), None)
+        self.pc[lanes] = address + 1
+
+    def _step_group(self, lanes, address, entry, max_steps):
+        """Execute the word at address for lanes (all holding the same word there)."""
+        opcode, operand, handler = entry
+        pc = self.pc
+        if self.invalid:
+            bad = np.array([(lane, address) in self.invalid for lane in lanes.tolist()], dtype=bool)
+            for lane in lanes[bad].tolist():
+                try:
+                    core.encode_word(self.invalid[(lane, address)])
+                except Exception as e:
+                    self._stop(np.array([lane]), ERROR, f"Parse Error at line {address:03d}: {e}")
+            lanes = lanes[~bad]
+            if not lanes.size:
+                return
+
+        if handler is None:  # Skip empty memory
+            pc[lanes] = address + 1
+            return
+
+        if max_steps is not None:
+            over = self.steps[lanes] >= max_steps
+            if over.any():
+                self._stop(lanes[over], LIMIT,
+                           f"Program stopped: instruction limit of {max_steps} reached at line {address:03d}")
+                lanes = lanes[~over]
+                if not lanes.size:
+                    return
+        if self.detect_loops:
+            # Checked every core._BUDGET_CHECK_STEPS steps, like Machine.execute
+            steps = self.steps[lanes]
+            due = lanes[(steps > 0) & (steps % core._BUDGET_CHECK_STEPS == 0)]
+            if due.size:
+                stuck = [lane for lane in due.tolist() if self._loops.setdefault(lane, core._LoopDetector()).stuck(
+                    address, int(self.acc[lane]), int(self.acc_flags[lane]), int(self.version[lane]))]
+                if stuck:
+                    self._stop(np.array(stuck), LOOP, f"Program stopped: endless loop detected at line {address:03d}")
+                    lanes = lanes[self.status[lanes] == RUNNING]
+                    if not lanes.size:
+                        return
+        self.steps[lanes] += 1
+
+        if opcode == HALT:
+            self._stop(lanes, HALTED)
+        elif opcode == READ:
+            self._read(lanes, address, operand)
+        elif handler is core.Machine._op_raise:
+            self._fail(lanes, address, operand)
+        elif handler is core.Machine._op_unknown:
+            pc[lanes] = address + 1
+        elif opcode == LOAD:
+            self.acc[lanes] = self.values[operand, lanes]
+            self.acc_flags[lanes] = self.flags[operand, lanes]
+            pc[lanes] = address + 1
+        elif opcode == STORE:
+            self.version[lanes] += 1
+            self.values[operand, lanes] = self.acc[lanes]
+            self.flags[operand, lanes] = self.acc_flags[lanes]
+            for lane in lanes.tolist() if self.invalid else ():
+                self.invalid.pop((lane, operand), None)
+            pc[lanes] = address + 1
+        elif opcode == WRITE:
+            texts = {lane: self.invalid[(lane, operand)] for lane in lanes.tolist()
+                     if (lane, operand) in self.invalid} if self.invalid else {}
+            self._writes.append((lanes, self.values[operand, lanes], self.flags[operand, lanes], texts))
+            pc[lanes] = address + 1
+        elif opcode in _ARITHMETIC:
+            self._set_acc(lanes, _ARITHMETIC[opcode](self.acc[lanes], self.values[operand, lanes]))
+            pc[lanes] = address + 1
+        elif opcode == DIVIDE:
+            divisor = self.values[operand, lanes]
+            zero = divisor == 0
+            if zero.any():
+                self._fail(lanes[zero], address, "Division by zero error")
+                lanes, divisor = lanes[~zero], divisor[~zero]
+            self._set_acc(lanes, np.floor_divide(self.acc[lanes], divisor))
+            pc[lanes] = address + 1
+        elif opcode == BRANCH:
+            if operand >= self.size:
+                self._fail(lanes, address, f"Invalid branch address: '{operand:03d}'")
+            else:
+                pc[lanes] = operand
+        else:  # BRANCHNEG / BRANCHZERO
+            taken = self.acc[lanes] < 0 if opcode == BRANCHNEG else self.acc[lanes] == 0
+            if operand >= self.size:
+                for lane in lanes[taken].tolist():
+                    if opcode == BRANCHNEG:
+                        error = f"Invalid accumulator value: {format_word(self.acc[lane], self.acc_flags[lane])}"
+                    else:
+                        error = f"Invalid branch address: '{operand:03d}'"
+                    self._fail(np.array([lane]), address, error)
+                pc[lanes[~taken]] = address + 1
+            else:
+                # a conditional branch to itself never counts as a jump
+                target = operand if operand != address else address + 1
+                pc[lanes] = np.where(taken, target, address + 1)
+
+    def _run_scalar(self, lanes, max_steps, timeout, deadline):
+        """Run lanes from the start on the basic-block engine and copy back their final state."""
+        for lane in lanes.tolist():
+            machine = core.machine_class("blocks")(memory_size=self.size)
+            machine.load_program(self.words)
+            inputs = iter(self.inputs[lane])
+            outputs = []
+            errors = []
+
+            def message(text):
+                if text.startswith(("Runtime Error", "Parse Error", "Program stopped")):
+                    errors.append(text)
+
+            remaining = max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+            reason = machine.execute(lambda: next(inputs, None), outputs.append, message, max_steps=max_steps,
+                                     timeout=remaining, max_reads=self.max_reads, detect_loops=self.detect_loops)
+            self.status[lane] = REASONS.index(reason)
+            self.acc[lane], self.acc_flags[lane] = machine.acc, machine.acc_flags
+            self.pc[lane] = machine.program_counter
+            self.steps[lane] = machine.steps
+            self.values[:, lane] = machine.memory.values[:]
+            self.flags[:, lane] = np.frombuffer(bytes(machine.memory.flags[:]), dtype=np.uint8)
+            for key in [key for key in self.invalid if key[0] == lane]:
+                del self.invalid[key]
+            self.invalid.update({(lane, address): text for address, text in machine.memory.invalid.items()})
+            self._scalar_outputs[lane] = outputs
+            self.errors[lane] = errors[0] if errors else ""
+            if reason == "timeout":
+                self.errors[lane] = (f"Program stopped: time limit of {timeout}s reached "
+                                     f"at line {machine.program_counter:03d}")
+
+    def execute(self, max_steps=None, timeout=None, max_reads=None, detect_loops=False):
+        """Run every lane to the end; returns the list of per-lane halt reasons."""
+        self.max_reads, self.detect_loops = max_reads, detect_loops
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        values, flags, pc = self.values, self.flags, self.pc
+
+        while True:
+            running = np.flatnonzero(self.status == RUNNING)
+            if not running.size:
+                break
+            if running.size <= SCALAR_LANES:
+                self._run_scalar(running, max_steps, timeout, deadline)
+                break
+            finished = pc[running] >= self.size
+            if finished.any():
+                self._stop(running[finished], FINISHED)
+                running = running[~finished]
+                if not running.size:
+                    break
+            if deadline is not None and time.perf_counter() >= deadline:
+                for lane in running.tolist():
+                    self.errors[lane] = f"Program stopped: time limit of {timeout}s reached at line {pc[lane]:03d}"
+                self.status[running] = TIMEOUT
+                break
+
+            # Group lanes by program counter, then by the word found there
+            addresses = pc[running]
+            if addresses.min() == addresses.max():
+                groups = [running]
+            else:
+                order = np.argsort(addresses, kind="stable")
+                groups = np.split(running[order], np.flatnonzero(np.diff(addresses[order])) + 1)
+            for group in groups:
+                address = int(pc[group[0]])
+                words = values[address, group]
+                word_flags = flags[address, group]
+                if (words == words[0]).all() and (word_flags == word_flags[0]).all():
+                    self._step_group(group, address, self._decode(int(words[0]), int(word_flags[0])), max_steps)
+                    continue
+                keys = words * 4 + word_flags
+                for key in np.unique(keys):
+                    lanes = group[keys == key]
+                    self._step_group(lanes, address,
+                                     self._decode(int(values[address, lanes[0]]), int(flags[address, lanes[0]])),
+                                     max_steps)
+
+        return [REASONS[status] for status in self.status.tolist()]
+
+    def outputs(self):
+        """The WRITE output of every lane as lists of word strings."""
+        outputs = [[] for _ in self.status]
+        for lanes, words, word_flags, texts in self._writes:
+            for lane, value, flag in zip(lanes.tolist(), words.tolist(), word_flags.tolist()):
+                outputs[lane].append(texts[lane] if lane in texts else format_word(value, flag))
+        for lane, scalar_outputs in self._scalar_outputs.items():
+            outputs[lane] = scalar_outputs
+        return outputs
+
+    def results(self):
+        """Per-lane dicts with halt_reason, accumulator, program_counter, steps, outputs and error."""
+        return [{
+            "halt_reason": REASONS[status],
+            "accumulator": format_word(acc, acc_flags),
+            "program_counter": pc,
+            "steps": steps,
+            "outputs": outputs,
+            "error": error,
+        } for status, acc, acc_flags, pc, steps, outputs, error in zip(
+            self.status.tolist(), self.acc.tolist(), self.acc_flags.tolist(), self.pc.tolist(),
+            self.steps.tolist(), self.outputs(), self.errors)]
+
+
+def run_lanes(words, input_sets, max_steps=None, timeout=None, max_reads=None, detect_loops=False,
+              memory_size=core.MEMORY_SIZE):
+    """Run words once per input set in lockstep and return LaneMachine.results()."""
+    machine = LaneMachine(words, input_sets, memory_size)
+    machine.execute(max_steps, timeout, max_reads, detect_loops)
+    return machine.results()